@@ -0,0 +1,48 @@
+-- Single-flight lease for token refreshes in the authorizer.
+-- Exposed through PostgREST as /rpc/acquire_token_lease and /rpc/release_token_lease.
+
+CREATE TABLE IF NOT EXISTS token_refresh_leases (
+  lease_name TEXT PRIMARY KEY,
+  lease_holder TEXT NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION acquire_token_lease (
+  lease_name TEXT,
+  lease_holder TEXT,
+  lease_seconds INTEGER DEFAULT 200
+) RETURNS BOOLEAN LANGUAGE sql AS $$
+    WITH
+        acquired AS (
+            INSERT INTO
+                token_refresh_leases (lease_name, lease_holder, expires_at)
+            VALUES
+                (
+                    acquire_token_lease.lease_name,
+                    acquire_token_lease.lease_holder,
+                    NOW() + MAKE_INTERVAL(secs => lease_seconds)
+                )
+            ON CONFLICT (lease_name) DO UPDATE
+            SET
+                lease_holder = EXCLUDED.lease_holder,
+                expires_at = EXCLUDED.expires_at
+            WHERE
+                token_refresh_leases.expires_at < NOW()
+            RETURNING
+                1
+        )
+    SELECT
+        EXISTS (
+            SELECT
+                1
+            FROM
+                acquired
+        );
+$$;
+
+CREATE OR REPLACE FUNCTION release_token_lease (lease_name TEXT, lease_holder TEXT) RETURNS VOID LANGUAGE sql AS $$
+    DELETE FROM token_refresh_leases
+    WHERE
+        token_refresh_leases.lease_name = release_token_lease.lease_name
+        AND token_refresh_leases.lease_holder = release_token_lease.lease_holder;
+$$;
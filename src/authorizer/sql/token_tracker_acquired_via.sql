@@ -0,0 +1,5 @@
+-- Records which cookie acquisition tier served each token.
+-- One of 'direct', 'zyte_http' or 'zyte_browser'.
+
+ALTER TABLE token_tracker
+ADD COLUMN IF NOT EXISTS acquired_via TEXT;
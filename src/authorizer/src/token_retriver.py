@@ -1,19 +1,113 @@
 """Handles retrival of an Auth Token"""
 
 import os
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from typing import Callable
 import httpx
 from dotenv import load_dotenv
+from pydantic import BaseModel
 from rich import print
 import json
 
+try:
+    from .proxy_pool import ProxyPool, ProxyListCache
+    from .metrics import Metrics
+except ImportError:  # flat layout inside the lambda zip
+    from proxy_pool import ProxyPool, ProxyListCache
+    from metrics import Metrics
+
 load_dotenv()
 
 
-def get_cookies() -> list[dict]:
+SEARCH_URL = "https://www.upwork.com/nx/search/jobs/"
+TOKEN_COOKIE = "UniversalSearchNuxt_vt"
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+DIRECT_TIMEOUT = 10
+ZYTE_TIMEOUT = 60
+
+
+def download_proxies() -> list[str]:
+    res = httpx.get(os.getenv("PROXY_URL"), timeout=5)
+    res.raise_for_status()
+    return res.text.split()
+
+
+PROXY_POOL = ProxyPool()
+PROXY_LIST = ProxyListCache(download_proxies)
+METRICS = Metrics("UpworkScraper", "authorizer")
+
+
+def get_cookies_direct() -> list[dict]:
+    """
+    ### Description:
+        - Loads the search page with a plain http request through one of
+          our proxies and collects the cookies Upwork sets on the way.
+        - Cheapest tier. Skipped when `PROXY_URL` isn't configured.
+        - Session cookies carry no expiry, so they are given one
+          `DEFAULT_TOKEN_TTL` seconds (1800 by default) from now.
+
+    ### Returns:
+        - `cookies`: list[dict]
+            The cookies set by Upwork, in the same shape Zyte returns.
+    """
+
+    if not os.getenv("PROXY_URL"):
+        print("No PROXY_URL configured. Skipping direct fetch")
+        return []
+
+    PROXY_POOL.update(PROXY_LIST.get())
+    proxy = PROXY_POOL.get()
+    session_expiry = int(time.time() + float(os.getenv("DEFAULT_TOKEN_TTL", "1800")))
+    start = time.monotonic()
+    try:
+        with httpx.Client(
+            proxy=proxy,
+            headers=BROWSER_HEADERS,
+            follow_redirects=True,
+            timeout=DIRECT_TIMEOUT,
+        ) as client:
+            response = client.get(SEARCH_URL)
+            cookies = [
+                {
+                    "name": x.name,
+                    "value": x.value,
+                    "expires": x.expires if x.expires is not None else session_expiry,
+                }
+                for x in client.cookies.jar
+            ]
+    except (httpx.ProxyError, httpx.ConnectError, httpx.TimeoutException):
+        PROXY_POOL.report_failure(proxy)
+        raise
+
+    if response.status_code != 200:
+        PROXY_POOL.report_failure(proxy)
+        print("Direct fetch blocked: ", response.status_code)
+    else:
+        PROXY_POOL.report_success(proxy, time.monotonic() - start)
+
+    return cookies
+
+
+def get_cookies_zyte(browser: bool) -> list[dict]:
     """
     ### Description:
         - Retrieves cookies from a specific API endpoint.
         - Calls the Zyte API to extract response cookies from the given URL.
+        - Without `browser` Zyte only makes an http request, which is
+          faster and cheaper than rendering the page.
+
+    ### Args:
+        - `browser`: bool
+            Whether Zyte should render the page in a browser.
 
     ### Returns:
         - `cookies`: list[dict]
@@ -23,26 +117,35 @@ def get_cookies() -> list[dict]:
         - `httpx.HTTPStatusError`:
             If the API response indicates an error status code.
     """
-    print("Calling Zyte")
+
+    print("Calling Zyte", "with browser" if browser else "without browser")
+    payload = {"url": SEARCH_URL, "responseCookies": True}
+    if browser:
+        payload["browserHtml"] = True
+    else:
+        payload["httpResponseBody"] = True
+
     api_response = httpx.post(
         "https://api.zyte.com/v1/extract",
         auth=(os.getenv("ZYTE_KEY"), ""),
-        json={
-            "url": "https://www.upwork.com/nx/search/jobs/",
-            "browserHtml": True,
-            "responseCookies": True,
-        },
-        timeout=60,
+        json=payload,
+        timeout=ZYTE_TIMEOUT,
     )
 
     if api_response.status_code != 200:
         print("Failure on Zyte: ", api_response.status_code, api_response.text)
     parsed_res = api_response.json()
-    cookies: list[dict] = parsed_res["responseCookies"]
+    cookies: list[dict] = parsed_res.get("responseCookies") or []
     return cookies
 
 
-def extract_search_token(cookies: list[dict]) -> tuple[str, int]:
+def get_cookies() -> list[dict]:
+    """Renders the search page through Zyte's browser"""
+
+    return get_cookies_zyte(browser=True)
+
+
+def extract_search_token(cookies: list[dict]) -> tuple[str, int] | None:
     """
     ### Description:
         - Extracts the search token and its expiration from the cookies list.
@@ -61,50 +164,123 @@ def extract_search_token(cookies: list[dict]) -> tuple[str, int]:
 
     print("Extracting Auth Cookie")
     for i in cookies:
-        if i["name"] == "UniversalSearchNuxt_vt":
+        if i["name"] == TOKEN_COOKIE:
             return i["value"], i["expires"]
 
 
-def cookie_handler() -> tuple[str, int]:
+class TierStats(BaseModel):
+    """
+    ### Description:
+    - Counts attempts of one cookie acquisition tier across warm invocations.
+    """
+
+    attempts: int = 0
+    successes: int = 0
+    total_latency: float = 0
+
+    def record(self, success: bool, latency: float):
+        """Adds the outcome of one attempt"""
+
+        self.attempts += 1
+        self.successes += success
+        self.total_latency += latency
+
+    def summary(self) -> dict:
+        """Success rate and mean latency of the tier"""
+
+        return {
+            **self.model_dump(exclude={"total_latency"}),
+            "success_rate": (
+                round(self.successes / self.attempts, 3) if self.attempts else None
+            ),
+            "avg_latency": (
+                round(self.total_latency / self.attempts, 3) if self.attempts else None
+            ),
+        }
+
+
+# cheapest first. (tier name, cookie getter, attempts, timeout per attempt)
+COOKIE_TIERS: list[tuple[str, Callable[[], list[dict]], int, float]] = [
+    ("direct", get_cookies_direct, 2, DIRECT_TIMEOUT),
+    ("zyte_http", lambda: get_cookies_zyte(browser=False), 1, ZYTE_TIMEOUT),
+    ("zyte_browser", get_cookies, 3, ZYTE_TIMEOUT),
+]
+TIER_STATS: dict[str, TierStats] = {}
+
+
+def refresh_lease_seconds() -> int:
+    """
+    ### Description:
+        - How long the refresh lease is taken for. Unless
+          `TOKEN_LEASE_SECONDS` is set, it covers the worst case of the
+          whole `COOKIE_TIERS` cascade plus `TOKEN_LEASE_MARGIN` seconds
+          (30 by default), so the lease can't run out mid refresh and
+          let a second render start.
+
+    ### Returns:
+        - `int`
+            The lease length in seconds.
+    """
+
+    if os.getenv("TOKEN_LEASE_SECONDS"):
+        return int(os.getenv("TOKEN_LEASE_SECONDS"))
+
+    cascade = sum(x[2] * x[3] for x in COOKIE_TIERS)
+    return int(cascade + float(os.getenv("TOKEN_LEASE_MARGIN", "30")))
+
+
+def cookie_handler() -> tuple[str, int, str] | None:
     """
     ### Description:
-        - Fetches an authentication token with retry logic.
-        - Calls the get_cookies and extract_search_token functions.
+        - Fetches an authentication token, escalating through the
+          acquisition tiers in `COOKIE_TIERS` from cheapest to the
+          Zyte browser render.
+        - Each tier is retried a few times before moving on. Latency
+          and success of every attempt are recorded in `TIER_STATS`.
 
     ### Returns:
         - `search_token`: str
             The retrieved search token.
         - `expires`: int
             The expiration time of the token.
-
-    ### Raises:
-        - `ValueError`:
-            If no token is found after retries.
+        - `tier`: str
+            Name of the tier that served the token.
     """
 
     print("Fetching a token")
-    retries = 0
-    while retries < 3:
-        try:
-            cookies = get_cookies()
-            search_token, expires = extract_search_token(cookies)
-            if not search_token:
-                raise ValueError("No token found. Might try again")
-            return search_token, expires
-        except Exception as e:
-            print("Error fetching a token", type(e).__name__, e)
-            retries += 1
-
-
-def publish_token(token: tuple[str, int]):
+    try:
+        for tier, fetch, attempts, _ in COOKIE_TIERS:
+            stats = TIER_STATS.setdefault(tier, TierStats())
+            for _ in range(attempts):
+                start = time.monotonic()
+                token = None
+                METRICS.count(f"tier_{tier}_attempts")
+                try:
+                    with METRICS.span(f"tier_{tier}"):
+                        token = extract_search_token(fetch())
+                except Exception as e:
+                    print("Error fetching a token", tier, type(e).__name__, e)
+                stats.record(bool(token), time.monotonic() - start)
+                if token:
+                    METRICS.count(f"tier_{tier}_successes")
+                    METRICS.set_property("acquired_via", tier)
+                    print("Token served by", tier)
+                    return token[0], token[1], tier
+            print("No token from", tier, "Escalating")
+    finally:
+        print({x: y.summary() for x, y in TIER_STATS.items()})
+
+
+def publish_token(token: tuple[str, int] | tuple[str, int, str]):
     """
     ### Description:
         - Publishes the retrieved token to a specified URL.
         - Sends a POST request with the token details to an API endpoint.
 
     ### Args:
-        - `token`: tuple[str, int]
-            A tuple containing the token value and its expiration time.
+        - `token`: tuple[str, int] | tuple[str, int, str]
+            A tuple containing the token value, its expiration time and
+            optionally the tier that served it.
 
     """
 
@@ -119,6 +295,8 @@ def publish_token(token: tuple[str, int]):
         "token_value": token[0],
         "expires": token[1],
     }
+    if len(token) > 2:
+        payload["acquired_via"] = token[2]
     headers = {
         "apikey": anon_key,
         "Authorization": "Bearer " + anon_key,
@@ -130,6 +308,223 @@ def publish_token(token: tuple[str, int]):
     print(response.status_code)
 
 
+def get_recent_token(max_age: float) -> tuple[str, int] | None:
+    """
+    ### Description:
+        - Fetches a token that was published within the last `max_age`
+          seconds, e.g. by a concurrent refresh.
+
+    ### Args:
+        - `max_age`: float
+            How old the token may be, in seconds.
+
+    ### Returns:
+        - `tuple[str, int] | None`
+            The token value and its expiry, or None if there isn't one.
+    """
+
+    base_url = os.getenv("POSTGREST_URL")
+    anon_key = os.getenv("SUPABASE_CLIENT_ANON_KEY")
+
+    url = base_url + "token_tracker"
+
+    since = datetime.now(timezone.utc) - timedelta(seconds=max_age)
+    params = {
+        "select": "token_value,expires",
+        "token_name": "eq.UniversalSearch",
+        "created_at": "gte." + since.isoformat(),
+        "order": "created_at.desc",
+        "limit": 1,
+    }
+    headers = {
+        "apikey": anon_key,
+        "Authorization": "Bearer " + anon_key,
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = httpx.get(url, params=params, headers=headers, timeout=5)
+        rows = response.json()
+        if rows:
+            return rows[0]["token_value"], rows[0]["expires"]
+    except Exception as e:
+        print("Error fetching recent token", type(e).__name__, e)
+
+
+def acquire_refresh_lease(holder: str, lease_seconds: int) -> bool:
+    """
+    ### Description:
+        - Tries to take the refresh lease through the
+          `acquire_token_lease` rpc. Only one holder can have an
+          unexpired lease at a time.
+        - If the lease can't be checked, the refresh goes ahead anyway.
+
+    ### Args:
+        - `holder`: str
+            Unique id of this invocation.
+        - `lease_seconds`: int
+            How long the lease is valid for if the holder dies.
+
+    ### Returns:
+        - `bool`
+            True if this invocation should do the refresh.
+    """
+
+    base_url = os.getenv("POSTGREST_URL")
+    anon_key = os.getenv("SUPABASE_CLIENT_ANON_KEY")
+
+    url = base_url + "rpc/acquire_token_lease"
+
+    payload = {
+        "lease_name": "UniversalSearch",
+        "lease_holder": holder,
+        "lease_seconds": lease_seconds,
+    }
+    headers = {
+        "apikey": anon_key,
+        "Authorization": "Bearer " + anon_key,
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = httpx.post(url, json=payload, headers=headers, timeout=5)
+        if response.status_code >= 400:
+            print("Unable to check refresh lease", response.text)
+            return True
+        return response.json() is True
+    except Exception as e:
+        print("Error acquiring refresh lease", type(e).__name__, e)
+        return True
+
+
+def release_refresh_lease(holder: str):
+    """
+    ### Description:
+        - Releases the refresh lease if this invocation still holds it.
+
+    ### Args:
+        - `holder`: str
+            Unique id of this invocation.
+    """
+
+    base_url = os.getenv("POSTGREST_URL")
+    anon_key = os.getenv("SUPABASE_CLIENT_ANON_KEY")
+
+    url = base_url + "rpc/release_token_lease"
+
+    payload = {"lease_name": "UniversalSearch", "lease_holder": holder}
+    headers = {
+        "apikey": anon_key,
+        "Authorization": "Bearer " + anon_key,
+        "Content-Type": "application/json",
+    }
+
+    try:
+        httpx.post(url, json=payload, headers=headers, timeout=5)
+    except Exception as e:
+        print("Error releasing refresh lease", type(e).__name__, e)
+
+
+def wait_for_token(
+    max_wait: float, max_age: float, rejected: str | None = None
+) -> tuple[str, int] | None:
+    """
+    ### Description:
+        - Polls for the token published by the invocation holding the
+          refresh lease.
+
+    ### Args:
+        - `max_wait`: float
+            How long to wait, in seconds.
+        - `max_age`: float
+            How old an acceptable token may be, in seconds.
+        - `rejected`: str | None
+            A token the caller saw rejected, which doesn't count.
+
+    ### Returns:
+        - `tuple[str, int] | None`
+            The new token and its expiry, or None if none showed up.
+    """
+
+    poll_interval = float(os.getenv("TOKEN_POLL_INTERVAL", "2"))
+    started = time.monotonic()
+    while time.monotonic() - started < max_wait:
+        time.sleep(poll_interval)
+        token = get_recent_token(max_age + time.monotonic() - started)
+        if token and token[0] != rejected:
+            return token
+
+
+def refresh_token(
+    rejected: str | None = None,
+) -> tuple[str, int] | tuple[str, int, str] | None:
+    """
+    ### Description:
+        - Gets a new token, making sure only one invocation renders
+          Upwork through Zyte at a time.
+        - A token published in the last `TOKEN_FRESH_SECONDS` is returned
+          as is. Otherwise the invocation that takes the refresh lease
+          fetches and publishes a token, and everyone else waits for it.
+        - The lease holder looks for a recent token once more after
+          taking the lease, since the previous holder may have published
+          one and released the lease in between.
+        - Waiters give up after `TOKEN_WAIT_SECONDS` (45 by default),
+          before the invoker's own 60 second timeout, and return None
+          instead of starting a second render.
+
+    ### Args:
+        - `rejected`: str | None
+            The token the caller saw rejected. It is never handed back,
+            however recently it was published.
+
+    ### Returns:
+        - `tuple[str, int] | tuple[str, int, str] | None`
+            The token value and its expiry, plus the tier that served
+            it when this invocation fetched it. None if no tier found a
+            token, or the wait for the lease holder timed out.
+    """
+
+    fresh_seconds = float(os.getenv("TOKEN_FRESH_SECONDS", "120"))
+    wait_seconds = float(os.getenv("TOKEN_WAIT_SECONDS", "45"))
+
+    with METRICS.span("recent_token"):
+        token = get_recent_token(fresh_seconds)
+    if token and token[0] != rejected:
+        print("Token was refreshed recently. Reusing it")
+        METRICS.set_property("acquired_via", "recent")
+        return token
+
+    holder = str(uuid4())
+    with METRICS.span("lease"):
+        leased = acquire_refresh_lease(holder, refresh_lease_seconds())
+    if not leased:
+        print("Another invocation is refreshing the token. Waiting for it")
+        with METRICS.span("wait"):
+            token = wait_for_token(wait_seconds, fresh_seconds, rejected)
+        if token:
+            METRICS.set_property("acquired_via", "waited")
+            return token
+        print("No token published in time. Leaving the refresh to the holder")
+        METRICS.count("wait_timeouts")
+        return None
+
+    try:
+        with METRICS.span("recent_token"):
+            token = get_recent_token(fresh_seconds)
+        if token and token[0] != rejected:
+            print("Token was refreshed while taking the lease. Reusing it")
+            METRICS.set_property("acquired_via", "recent")
+            return token
+        with METRICS.span("cookies"):
+            token = cookie_handler()
+        if token:
+            with METRICS.span("publish"):
+                publish_token(token)
+        return token
+    finally:
+        release_refresh_lease(holder)
+
+
 def validate_request(event: dict | str):
     """
     ### Description:
@@ -159,11 +554,39 @@ def validate_request(event: dict | str):
     raise RuntimeError("Authentication failed")
 
 
+def get_rejected_token(event: dict | str) -> str | None:
+    """
+    ### Description:
+        - Reads the token the invoker saw rejected, if it sent one as
+          `rejected_token`.
+
+    ### Args:
+        - `event`: dict | str
+            The event data, shaped like in `validate_request`.
+
+    ### Returns:
+        - `str | None`
+            The rejected token, or None.
+    """
+
+    if isinstance(event, str):
+        event = json.loads(event)
+    if event.get("rejected_token"):
+        return event["rejected_token"]
+    if event.get("body"):
+        return json.loads(event["body"]).get("rejected_token")
+
+
+@METRICS.instrument
 def lambda_handler(event: dict, context):
     """
     ### Description:
         - Entry point for AWS Lambda function.
         - Validates the request and retrieves, then publishes the token.
+        - Concurrent invocations share a single refresh. A token the
+          invoker reports as `rejected_token` is never returned.
+        - Stage timings, tier attempts and the tier that served the
+          token are emitted as one EMF line.
 
     ### Args:
         - `event`: dict
@@ -173,22 +596,29 @@ def lambda_handler(event: dict, context):
 
     ### Returns:
         - `str`
-            A JSON string containing status code and the token.
+            A JSON string containing status code, the token, its expiry
+            and the tier that served it.
 
     ### Raises:
         - `ValueError`:
-            If no token is found after processing.
+            If no token is found after processing, or the wait for a
+            concurrent refresh timed out.
     """
     validate_request(event)
-    token = cookie_handler()
+    token = refresh_token(get_rejected_token(event))
     if not token:
         raise ValueError("No token found")
     print("Token retrived sucessfully")
 
-    publish_token(token)
-
     print("All good. Returning token to invoker")
-    return json.dumps({"status_code": 200, "token": token[0]})
+    return json.dumps(
+        {
+            "status_code": 200,
+            "token": token[0],
+            "expires": token[1],
+            "acquired_via": token[2] if len(token) > 2 else None,
+        }
+    )
 
 
 if __name__ == "__main__":
@@ -3,8 +3,12 @@
 # pylint:disable=wrong-import-position
 
 from unittest import TestCase, main
+from unittest.mock import patch, Mock
 import os
 import json
+import time
+
+import httpx
 
 from wrapworks import cwdtoenv
 from dotenv import load_dotenv
@@ -12,7 +16,15 @@ from dotenv import load_dotenv
 load_dotenv()
 cwdtoenv()
 
-from src.token_retriver import lambda_handler
+from src import token_retriver
+from src.token_retriver import (
+    lambda_handler,
+    refresh_token,
+    cookie_handler,
+    get_cookies_direct,
+    get_rejected_token,
+    refresh_lease_seconds,
+)
 
 
 class TestGetToken(TestCase):
@@ -26,5 +38,229 @@ class TestGetToken(TestCase):
         self.assertTrue("oauth2v2" in data["token"])
 
 
+@patch("src.token_retriver.release_refresh_lease")
+@patch("src.token_retriver.publish_token")
+@patch("src.token_retriver.cookie_handler")
+@patch("src.token_retriver.acquire_refresh_lease")
+@patch("src.token_retriver.get_recent_token")
+class TestSingleFlightRefresh(TestCase):
+
+    def setUp(self) -> None:
+        self.token = ("oauth2v2_new", 1725000000)
+
+    def test_recent_token_is_reused(
+        self, mock_recent: Mock, mock_lease: Mock, mock_cookies: Mock, *_
+    ):
+        """No render happens when a token was just published"""
+
+        mock_recent.return_value = self.token
+
+        self.assertEqual(refresh_token(), self.token)
+        mock_lease.assert_not_called()
+        mock_cookies.assert_not_called()
+
+    def test_lease_holder_refreshes(
+        self,
+        mock_recent: Mock,
+        mock_lease: Mock,
+        mock_cookies: Mock,
+        mock_publish: Mock,
+        mock_release: Mock,
+    ):
+        """The lease holder renders, publishes and releases the lease"""
+
+        mock_recent.return_value = None
+        mock_lease.return_value = True
+        mock_cookies.return_value = self.token
+
+        self.assertEqual(refresh_token(), self.token)
+        mock_publish.assert_called_once_with(self.token)
+        mock_release.assert_called_once()
+
+    @patch.dict("os.environ", {"TOKEN_POLL_INTERVAL": "0"})
+    def test_waiters_get_published_token(
+        self, mock_recent: Mock, mock_lease: Mock, mock_cookies: Mock, *_
+    ):
+        """Invocations without the lease wait for the published token"""
+
+        mock_recent.side_effect = [None, None, self.token]
+        mock_lease.return_value = False
+
+        self.assertEqual(refresh_token(), self.token)
+        mock_cookies.assert_not_called()
+
+    def test_lease_holder_checks_again(
+        self,
+        mock_recent: Mock,
+        mock_lease: Mock,
+        mock_cookies: Mock,
+        mock_publish: Mock,
+        mock_release: Mock,
+    ):
+        """A token published while the lease was taken is reused"""
+
+        mock_recent.side_effect = [None, self.token]
+        mock_lease.return_value = True
+
+        self.assertEqual(refresh_token(), self.token)
+        mock_cookies.assert_not_called()
+        mock_publish.assert_not_called()
+        mock_release.assert_called_once()
+
+    def test_rejected_token_is_not_reused(
+        self,
+        mock_recent: Mock,
+        mock_lease: Mock,
+        mock_cookies: Mock,
+        mock_publish: Mock,
+        _,
+    ):
+        """A fresh token the caller saw rejected doesn't short-circuit"""
+
+        new_token = ("oauth2v2_newer", 1725003600, "direct")
+        mock_recent.return_value = self.token
+        mock_lease.return_value = True
+        mock_cookies.return_value = new_token
+
+        self.assertEqual(refresh_token(rejected=self.token[0]), new_token)
+        mock_publish.assert_called_once_with(new_token)
+
+    @patch.dict("os.environ", {"TOKEN_POLL_INTERVAL": "0"})
+    def test_waiters_skip_rejected_token(
+        self, mock_recent: Mock, mock_lease: Mock, mock_cookies: Mock, *_
+    ):
+        """Waiters keep polling while only the rejected token is there"""
+
+        new_token = ("oauth2v2_newer", 1725003600)
+        mock_recent.side_effect = [self.token, self.token, new_token]
+        mock_lease.return_value = False
+
+        self.assertEqual(refresh_token(rejected=self.token[0]), new_token)
+        mock_cookies.assert_not_called()
+
+    @patch.dict(
+        "os.environ", {"TOKEN_POLL_INTERVAL": "0", "TOKEN_WAIT_SECONDS": "0.01"}
+    )
+    def test_lost_wait_does_not_render(
+        self, mock_recent: Mock, mock_lease: Mock, mock_cookies: Mock, *_
+    ):
+        """A waiter that times out errors instead of starting a second render"""
+
+        mock_recent.return_value = None
+        mock_lease.return_value = False
+
+        self.assertIsNone(refresh_token())
+        mock_cookies.assert_not_called()
+
+    def test_lease_outlasts_the_cascade(self, *_):
+        """The lease covers every tier attempt timing out"""
+
+        cascade = sum(x[2] * x[3] for x in token_retriver.COOKIE_TIERS)
+
+        self.assertGreater(refresh_lease_seconds(), cascade)
+        with patch.dict("os.environ", {"TOKEN_LEASE_SECONDS": "500"}):
+            self.assertEqual(refresh_lease_seconds(), 500)
+
+    def test_rejected_token_from_event(self, *_):
+
+        self.assertEqual(get_rejected_token({"rejected_token": "a"}), "a")
+        body = json.dumps({"secret": "s", "rejected_token": "b"})
+        self.assertEqual(get_rejected_token({"body": body}), "b")
+        self.assertIsNone(get_rejected_token({"secret": "s"}))
+
+
+class TestCookieTiers(TestCase):
+
+    def setUp(self) -> None:
+        self.cookie = {
+            "name": "UniversalSearchNuxt_vt",
+            "value": "oauth2v2_x",
+            "expires": 1,
+        }
+        self.direct = Mock(return_value=[])
+        self.zyte_http = Mock(return_value=[])
+        self.zyte_browser = Mock(return_value=[])
+
+        tiers = [
+            ("direct", self.direct, 2, 10),
+            ("zyte_http", self.zyte_http, 1, 60),
+            ("zyte_browser", self.zyte_browser, 3, 60),
+        ]
+        patcher = patch.object(token_retriver, "COOKIE_TIERS", tiers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        stats = patch.object(token_retriver, "TIER_STATS", {})
+        self.stats = stats.start()
+        self.addCleanup(stats.stop)
+
+    def test_cheap_tier_serves_token(self):
+        """No Zyte call happens when the direct fetch finds the cookie"""
+
+        self.direct.return_value = [self.cookie]
+
+        self.assertEqual(cookie_handler(), ("oauth2v2_x", 1, "direct"))
+        self.zyte_http.assert_not_called()
+        self.zyte_browser.assert_not_called()
+        self.assertEqual(self.stats["direct"].summary()["success_rate"], 1)
+
+    def test_escalates_to_browser(self):
+        """Tiers without the cookie are retried, then skipped"""
+
+        self.direct.side_effect = RuntimeError("No proxies available")
+        self.zyte_browser.return_value = [self.cookie]
+
+        self.assertEqual(cookie_handler(), ("oauth2v2_x", 1, "zyte_browser"))
+        self.assertEqual(self.direct.call_count, 2)
+        self.assertEqual(self.zyte_http.call_count, 1)
+        self.assertEqual(self.stats["direct"].attempts, 2)
+        self.assertEqual(self.stats["direct"].successes, 0)
+        self.assertEqual(self.stats["zyte_browser"].successes, 1)
+
+    def test_no_token_anywhere(self):
+
+        self.assertIsNone(cookie_handler())
+        self.assertEqual(self.zyte_browser.call_count, 3)
+
+
+@patch.dict("os.environ", {"PROXY_URL": "http://proxies.test/"})
+@patch.object(token_retriver, "PROXY_LIST", Mock(get=Mock(return_value=[])))
+@patch.object(token_retriver, "PROXY_POOL")
+class TestDirectCookies(TestCase):
+
+    def get_cookies(self, set_cookie: str) -> list[dict]:
+        """Runs the direct fetch against a page setting `set_cookie`"""
+
+        client = httpx.Client
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, headers={"Set-Cookie": set_cookie})
+        )
+
+        def mock_client(proxy=None, **kwargs):
+            return client(transport=transport, **kwargs)
+
+        with patch.object(token_retriver.httpx, "Client", mock_client):
+            return get_cookies_direct()
+
+    def test_session_cookie_gets_default_ttl(self, mock_pool: Mock):
+        """A cookie without an expiry is published with the default TTL"""
+
+        cookies = self.get_cookies("UniversalSearchNuxt_vt=oauth2v2_x; Path=/")
+
+        token = token_retriver.extract_search_token(cookies)
+        self.assertEqual(token[0], "oauth2v2_x")
+        self.assertIsInstance(token[1], int)
+        self.assertAlmostEqual(token[1], time.time() + 1800, delta=5)
+        mock_pool.report_success.assert_called_once()
+
+    def test_persistent_cookie_keeps_expiry(self, _):
+
+        cookies = self.get_cookies(
+            "UniversalSearchNuxt_vt=oauth2v2_x; Path=/; "
+            "Expires=Wed, 01 Jan 2048 00:00:00 GMT"
+        )
+
+        self.assertEqual(cookies[0]["expires"], 2461449600)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+"""
+### Description:
+- Throughput of the async LLM client against the mock OpenAI api,
+  from one completion at a time, like the old executor, up to several
+  in flight.
+- The mock enforces a requests and tokens per window limit, so the
+  report also shows how often the api refused a request (429) and how
+  often the client held one back on its own budget instead.
+
+### Usage (from src/data_enricher/v1):
+    python -m benchmarks.bench_async_llm [--copies 20] [--in-flight 1 4 8 16]
+"""
+
+# pylint: disable=wrong-import-position
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_reduction import PAGES
+from benchmarks.mock_openai import MockConfig, MockOpenAI
+from src.attribute_extractor.async_extract import AsyncLLMClient, RateBudget
+from src.attribute_extractor.get_attributes import build_messages
+from src.attribute_extractor.reduce_page import load_corpus, reduce_page
+from src.models.genai_models import ValidLLMModels
+
+
+async def complete_all(client: AsyncLLMClient, pages: list[str]) -> int:
+    """Completes every page, and returns how many succeeded"""
+
+    async def complete(page: str) -> bool:
+        try:
+            await client.complete(
+                ValidLLMModels.OPENAI_GPT4o_MINI, build_messages(page)
+            )
+            return True
+        except RuntimeError:
+            return False
+
+    results = await asyncio.gather(*[complete(x) for x in pages])
+    return sum(results)
+
+
+def run_level(pages: list[str], in_flight: int, config: MockConfig) -> dict:
+    """Completes the pages with `in_flight` completions at a time"""
+
+    server = MockOpenAI(config)
+    server.start()
+
+    async def main() -> tuple[int, dict]:
+        # the client starts from the limits the mock sends, and a limit
+        # the mock doesn't enforce must not hold it back either
+        budget = RateBudget(rpm=config.rpm or 10**6, tpm=config.tpm or 10**9)
+        async with AsyncLLMClient(
+            in_flight, budget, base_url=server.url, api_key="mock"
+        ) as client:
+            return await complete_all(client, pages), client.summary()
+
+    try:
+        start = time.perf_counter()
+        completed, summary = asyncio.run(main())
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    return {
+        "in_flight": in_flight,
+        "completed": completed,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(completed / elapsed, 2),
+        "requests": summary["requests"],
+        "refused": summary["refused"],
+        "budget_waits": summary["waits"],
+    }
+
+
+def run(
+    folder: str,
+    copies: int = 20,
+    levels: tuple[int, ...] = (1, 4, 8, 16),
+    config: MockConfig | None = None,
+) -> dict:
+    """
+    ### Description:
+        - Completes `copies` of every saved page at each level of
+          concurrency.
+
+    ### Args:
+        - `folder`: str
+            Folder of saved `.html` pages.
+        - `copies`: int
+            How many times each page is completed.
+        - `levels`: tuple[int, ...]
+            Completions in flight to measure.
+        - `config`: MockConfig | None
+            Behaviour of the mock api.
+
+    ### Returns:
+        - `dict`
+            The report.
+    """
+
+    config = config or MockConfig(latency=0.2, rpm=60, window=1)
+    pages = [
+        reduce_page(html)
+        for html in load_corpus(folder).values()
+        for _ in range(copies)
+    ]
+    return {
+        "pages": len(pages),
+        "mock": config.model_dump(),
+        "levels": [run_level(pages, x, config) for x in levels],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", default=PAGES, help="Folder of saved pages")
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rpm", type=int, default=60, help="Requests per window")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per window")
+    parser.add_argument("--window", type=float, default=1)
+    args = parser.parse_args()
+
+    report = run(
+        args.pages,
+        args.copies,
+        tuple(args.in_flight),
+        MockConfig(
+            latency=args.latency, rpm=args.rpm, tpm=args.tpm, window=args.window
+        ),
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,90 @@
+"""
+### Description:
+- Runs the fixture pages through batch extraction against the mock
+  OpenAI api: request file, upload, polling and output parsing.
+- Reports how many pages came back usable and what the batch cost
+  next to the same completions at the regular price.
+
+### Usage (from src/data_enricher/v1):
+    python -m benchmarks.bench_batch [--copies 50] [--error-rate 0.05]
+"""
+
+# pylint: disable=wrong-import-position
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_reduction import PAGES
+from benchmarks.mock_openai import MockConfig, MockOpenAI
+from src.attribute_extractor.batch_extract import BatchClient, run_batch
+from src.attribute_extractor.reduce_page import load_corpus, reduce_page
+from src.models.genai_models import BATCH_COST_DISCOUNT, ValidLLMModels
+
+
+def run(folder: str, copies: int = 50, config: MockConfig | None = None) -> dict:
+    """
+    ### Description:
+        - Submits `copies` of every saved page as one batch.
+
+    ### Args:
+        - `folder`: str
+            Folder of saved `.html` pages.
+        - `copies`: int
+            How many times each page is submitted.
+        - `config`: MockConfig | None
+            Behaviour of the mock api.
+
+    ### Returns:
+        - `dict`
+            The report.
+    """
+
+    pages = {
+        f"{name}-{i}": reduce_page(html)
+        for name, html in load_corpus(folder).items()
+        for i in range(copies)
+    }
+    model = ValidLLMModels.OPENAI_GPT4o_MINI.value
+
+    server = MockOpenAI(config or MockConfig(polls=2))
+    server.start()
+    client = BatchClient(base_url=server.url, api_key="mock")
+    try:
+        start = time.perf_counter()
+        results = run_batch(pages, client, model, poll_interval=0, timeout=60)
+        elapsed = time.perf_counter() - start
+    finally:
+        client.close()
+        server.stop()
+
+    usable = [x for x in results.values() if x]
+    cost = sum(x[0].cost for x in usable)
+    return {
+        "pages": len(pages),
+        "usable": len(usable),
+        "failed": len(pages) - len(usable),
+        "cost_batch": round(cost, 6),
+        "cost_regular": round(cost / BATCH_COST_DISCOUNT, 6),
+        "seconds": round(elapsed, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", default=PAGES, help="Folder of saved pages")
+    parser.add_argument("--copies", type=int, default=50)
+    parser.add_argument("--polls", type=int, default=2)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    report = run(
+        args.pages,
+        args.copies,
+        MockConfig(polls=args.polls, error_rate=args.error_rate),
+    )
+    print(json.dumps(report, indent=2))
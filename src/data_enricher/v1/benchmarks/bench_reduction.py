@@ -0,0 +1,94 @@
+"""
+### Description:
+- Benchmark of the page text reduction that runs before LLM
+  extraction, over a folder of saved job pages.
+- Reports estimated tokens per page for the full page text that used
+  to be sent, the job and client sections only, and the sections with
+  boilerplate learned from the same corpus removed.
+- `benchmarks/fixtures/pages` holds synthetic pages. Point `--pages` at
+  a corpus saved with `PAGE_CORPUS_DIR` to measure real ones.
+
+### Usage (from src/data_enricher/v1):
+    python -m benchmarks.bench_reduction [--pages folder] [--output report.json]
+"""
+
+# pylint: disable=wrong-import-position
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.attribute_extractor.reduce_page import (
+    Boilerplate,
+    count_tokens,
+    full_text,
+    load_corpus,
+    reduce_page,
+)
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+
+def run(folder: str, min_share: float = 0.5, min_length: int = 40) -> dict:
+    """
+    ### Description:
+        - Reduces every saved page and counts tokens before and after.
+
+    ### Args:
+        - `folder`: str
+            Folder of saved `.html` pages.
+        - `min_share`: float
+            Share of pages a boilerplate line must appear on.
+        - `min_length`: int
+            Shortest line that can be boilerplate.
+
+    ### Returns:
+        - `dict`
+            The report.
+    """
+
+    pages = load_corpus(folder)
+    boilerplate = Boilerplate.learn(pages.values(), min_share, min_length)
+
+    results = {}
+    elapsed = 0
+    for name, html in pages.items():
+        start = time.perf_counter()
+        reduced = reduce_page(html, boilerplate)
+        elapsed += time.perf_counter() - start
+        results[name] = {
+            "full": count_tokens(full_text(html)),
+            "sections": count_tokens(reduce_page(html)),
+            "reduced": count_tokens(reduced),
+        }
+
+    full = sum(x["full"] for x in results.values())
+    reduced = sum(x["reduced"] for x in results.values())
+    return {
+        "pages": len(pages),
+        "boilerplate_lines": len(boilerplate.lines),
+        "tokens_full": full,
+        "tokens_reduced": reduced,
+        "reduction": round(1 - reduced / full, 4) if full else None,
+        "ms_per_page": round(elapsed / len(pages) * 1000, 2) if pages else None,
+        "by_page": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", default=PAGES, help="Folder of saved pages")
+    parser.add_argument("--min-share", type=float, default=0.5)
+    parser.add_argument("--min-length", type=int, default=40)
+    parser.add_argument("--output", help="Writes the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.pages, args.min_share, args.min_length)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as wf:
+            json.dump(report, wf, indent=2)
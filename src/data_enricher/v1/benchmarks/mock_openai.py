@@ -0,0 +1,356 @@
+"""
+### Description:
+- In-process stand-in for the files and batches endpoints of the
+  OpenAI api, so batch extraction can be exercised without a key or
+  a 24 hour wait.
+- A batch reports `in_progress` for `polls` status checks, then
+  completes. Every request in it is answered with canned attributes,
+  or fails at `error_rate`.
+- Chat completions take `latency` seconds and are rate limited to
+  `rpm` requests and `tpm` tokens per `window` seconds, with the
+  `x-ratelimit-*` headers and 429s of the real api.
+- `bench_batch` and `bench_async_llm` drive it with the fixture pages.
+
+### Usage (from src/data_enricher/v1):
+    python -m benchmarks.mock_openai   # serves until interrupted
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+CANNED_ATTRIBUTES = {
+    "job": {
+        "title": "Build a Shopify inventory sync",
+        "full_description": "Sync stock levels between Shopify and our warehouse.",
+        "is_hourly": True,
+        "hourly_low": 25,
+        "hourly_high": 45,
+        "freelancer_experince_level": "Intermediate",
+        "proposals": 12,
+    },
+    "client": {
+        "client_country": "United States",
+        "client_join_date": "2019-04-02T00:00:00",
+        "client_jobs_posted": 14,
+        "client_hire_rate": 78,
+        "client_total_spent_usd": 12000,
+    },
+}
+
+
+class MockConfig(BaseModel):
+    """
+    ### Description:
+    - Behaviour of the mock api.
+    """
+
+    polls: int = 2
+    error_rate: float = 0
+    input_tokens: int = 1500
+    output_tokens: int = 300
+    latency: float = 0.2
+    rpm: int = 0
+    tpm: int = 0
+    window: float = 60
+    seed: int = 0
+
+
+class MockOpenAI(ThreadingHTTPServer):
+    """
+    ### Description:
+    - Threaded http server holding uploaded files and batches in memory.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig | None = None) -> None:
+
+        super().__init__(("127.0.0.1", 0), MockOpenAIHandler)
+        self.config = config or MockConfig()
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.polls: dict[str, int] = {}
+        self.sent: deque[tuple[float, int]] = deque()
+        self.completions = 0
+        self.limited = 0
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def add_file(self, content: bytes) -> str:
+
+        file_id = f"file-{uuid4().hex[:12]}"
+        with self.lock:
+            self.files[file_id] = content
+        return file_id
+
+    def admit(self, tokens: int) -> tuple[bool, dict]:
+        """
+        ### Description:
+        - Counts a completion against the rate limits of the window.
+
+        ### Returns:
+        - `tuple[bool, dict]`
+            Whether it was admitted, and the rate limit headers.
+        """
+
+        config = self.config
+        with self.lock:
+            now = time.monotonic()
+            while self.sent and now - self.sent[0][0] >= config.window:
+                self.sent.popleft()
+            requests = len(self.sent)
+            used = sum(x[1] for x in self.sent)
+            admitted = (not config.rpm or requests < config.rpm) and (
+                not config.tpm or used + tokens <= config.tpm
+            )
+            if admitted:
+                self.sent.append((now, tokens))
+                self.completions += 1
+                requests, used = requests + 1, used + tokens
+            else:
+                self.limited += 1
+            reset = config.window - (now - self.sent[0][0]) if self.sent else 0
+
+        headers = {}
+        for name, limit, count in (
+            ("requests", config.rpm, requests),
+            ("tokens", config.tpm, used),
+        ):
+            if limit:
+                headers[f"x-ratelimit-limit-{name}"] = str(limit)
+                headers[f"x-ratelimit-remaining-{name}"] = str(max(0, limit - count))
+                headers[f"x-ratelimit-reset-{name}"] = f"{max(reset, 0):.3f}s"
+        return admitted, headers
+
+    def answer(self, line: dict) -> dict:
+        """The output line of one batch request"""
+
+        with self.lock:
+            failed = self.random.random() < self.config.error_rate
+        if failed:
+            return {
+                "id": f"batch_req_{uuid4().hex[:12]}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 500, "body": {}},
+                "error": {"code": "server_error", "message": "mock failure"},
+            }
+        body = {
+            "object": "chat.completion",
+            "model": line["body"]["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": json.dumps(CANNED_ATTRIBUTES),
+                    },
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": self.config.input_tokens,
+                "completion_tokens": self.config.output_tokens,
+            },
+        }
+        return {
+            "id": f"batch_req_{uuid4().hex[:12]}",
+            "custom_id": line["custom_id"],
+            "response": {"status_code": 200, "body": body},
+            "error": None,
+        }
+
+    def create_batch(self, input_file_id: str) -> dict:
+
+        batch = {
+            "id": f"batch_{uuid4().hex[:12]}",
+            "object": "batch",
+            "input_file_id": input_file_id,
+            "status": "validating",
+            "output_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "created_at": int(time.time()),
+        }
+        with self.lock:
+            self.batches[batch["id"]] = batch
+            self.polls[batch["id"]] = 0
+        return batch
+
+    def poll_batch(self, batch_id: str) -> dict | None:
+        """Advances a batch one status check, completing it when due"""
+
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if not batch or batch["status"] == "completed":
+                return batch
+            self.polls[batch_id] += 1
+            if self.polls[batch_id] <= self.config.polls:
+                batch["status"] = "in_progress"
+                return batch
+            content = self.files[batch["input_file_id"]]
+
+        lines = [json.loads(x) for x in content.splitlines() if x.strip()]
+        output = [self.answer(x) for x in lines]
+        failed = sum(1 for x in output if x["error"])
+        output_file_id = self.add_file(
+            "\n".join(json.dumps(x) for x in output).encode()
+        )
+        with self.lock:
+            batch.update(
+                status="completed",
+                output_file_id=output_file_id,
+                request_counts={
+                    "total": len(output),
+                    "completed": len(output) - failed,
+                    "failed": failed,
+                },
+            )
+            return batch
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Routes of the mock api"""
+
+    server: MockOpenAI
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        pass
+
+    def _read(self) -> bytes:
+
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(
+        self,
+        status: int,
+        data: bytes,
+        content_type="application/json",
+        headers: dict | None = None,
+    ):
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, payload, headers: dict | None = None):
+        self._send(status, json.dumps(payload).encode(), headers=headers)
+
+    def _upload(self, body: bytes) -> bytes | None:
+        """The file part of a multipart upload"""
+
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: "
+            + self.headers["Content-Type"].encode()
+            + b"\r\n\r\n"
+            + body
+        )
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                return part.get_payload(decode=True)
+        return None
+
+    def do_POST(self):  # pylint:disable=invalid-name
+
+        body = self._read()
+        path = urlsplit(self.path).path
+
+        if path == "/v1/files":
+            content = self._upload(body)
+            if content is None:
+                self._send_json(400, {"error": {"message": "missing file"}})
+                return
+            file_id = self.server.add_file(content)
+            self._send_json(
+                200,
+                {
+                    "id": file_id,
+                    "object": "file",
+                    "bytes": len(content),
+                    "purpose": "batch",
+                },
+            )
+        elif path == "/v1/chat/completions":
+            self._complete(json.loads(body or b"{}"))
+        elif path == "/v1/batches":
+            payload = json.loads(body or b"{}")
+            if payload.get("input_file_id") not in self.server.files:
+                self._send_json(404, {"error": {"message": "unknown file"}})
+                return
+            self._send_json(200, self.server.create_batch(payload["input_file_id"]))
+        else:
+            self._send_json(404, {"error": {"message": "unknown route"}})
+
+    def _complete(self, payload: dict):
+        """Answers a chat completion like one line of a batch"""
+
+        config = self.server.config
+        tokens = config.input_tokens + payload.get("max_tokens", 0)
+        admitted, headers = self.server.admit(tokens)
+        if not admitted:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                headers,
+            )
+            return
+
+        time.sleep(config.latency)
+        line = self.server.answer({"custom_id": "", "body": payload})
+        if line["error"]:
+            self._send_json(500, {"error": line["error"]}, headers)
+        else:
+            self._send_json(200, line["response"]["body"], headers)
+
+    def do_GET(self):  # pylint:disable=invalid-name
+
+        self._read()
+        parts = urlsplit(self.path).path.strip("/").split("/")
+
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3:
+            batch = self.server.poll_batch(parts[2])
+            if batch:
+                self._send_json(200, batch)
+                return
+        elif parts[:2] == ["v1", "files"] and parts[3:] == ["content"]:
+            content = self.server.files.get(parts[2])
+            if content is not None:
+                self._send(200, content, "application/jsonl")
+                return
+        self._send_json(404, {"error": {"message": "not found"}})
+
+
+if __name__ == "__main__":
+    server = MockOpenAI()
+    print(f"Mock OpenAI api on {server.url}. Set OPENAI_BASE_URL to use it.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,368 @@
+"""
+### Description:
+    - Async LLM extraction client that keeps several completions in
+      flight over one pooled connection, instead of one blocking call
+      and one new connection per page.
+    - Requests and tokens are budgeted per minute. The budgets start
+      from `LLM_RPM` and `LLM_TPM` and follow the `x-ratelimit-*`
+      headers of every response, so the client slows down before the
+      api starts refusing requests.
+    - A 429 pauses every request until the api's retry hint or reset
+      time, and 5xx responses back off exponentially.
+"""
+
+# pylint:disable=wrong-import-position
+
+import asyncio
+import os
+import random
+import re
+import time
+
+import httpx
+from pydantic import ValidationError
+from rich import print
+from wrapworks import cwdtoenv
+from dotenv import load_dotenv
+
+cwdtoenv()
+load_dotenv()
+
+from src.attribute_extractor.extraction_cache import cache_key, get_extraction_cache
+from src.attribute_extractor.get_attributes import (
+    build_messages,
+    convert_response_to_schema,
+)
+from src.attribute_extractor.reduce_page import count_tokens
+from src.models.genai_models import (
+    AIResponse,
+    LLM_COST_PER_TOKEN,
+    LLMMessageLog,
+    ValidLLMModels,
+)
+from src.models.upwork_models import PostingAttributes
+
+MAX_TOKENS = 3000
+RESET_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+RESET_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value: str | None) -> float | None:
+    """
+    ### Description:
+        - Reads a reset duration of the rate limit headers, such as
+          `20ms`, `1.5s` or `6m0s`.
+
+    ### Returns:
+        - `float | None`
+            The duration in seconds, or None if it can't be read.
+    """
+
+    if not value:
+        return None
+    parts = RESET_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(x) * RESET_UNITS[y] for x, y in parts)
+
+
+class RateBudget:
+    """
+    ### Description:
+        - Requests and tokens that may still be sent before the api's
+          limits reset. Each budget refills to its limit at its reset
+          time, and the headers of every response correct it.
+        - Only used from the event loop, so it needs no lock.
+
+    ### Args:
+        - `rpm`: int | None
+            Requests per minute until the headers say otherwise.
+            Defaults to `LLM_RPM` or 500.
+        - `tpm`: int | None
+            Tokens per minute until the headers say otherwise.
+            Defaults to `LLM_TPM` or 200000.
+    """
+
+    def __init__(self, rpm: int | None = None, tpm: int | None = None) -> None:
+
+        now = time.monotonic()
+        self.limits = {
+            "requests": rpm or int(os.getenv("LLM_RPM", "500")),
+            "tokens": tpm or int(os.getenv("LLM_TPM", "200000")),
+        }
+        self.remaining = dict(self.limits)
+        self.reset_at = {"requests": now + 60, "tokens": now + 60}
+        self.paused_until = 0.0
+        self.waits = 0
+
+    def refill(self, now: float):
+
+        for name, reset_at in self.reset_at.items():
+            if now >= reset_at:
+                self.remaining[name] = self.limits[name]
+                self.reset_at[name] = now + 60
+
+    async def acquire(self, tokens: int):
+        """Waits until a request of `tokens` tokens fits both budgets"""
+
+        # a request larger than the whole budget could never be sent
+        tokens = min(tokens, self.limits["tokens"])
+        waited = False
+        while True:
+            now = time.monotonic()
+            self.refill(now)
+            if (
+                now >= self.paused_until
+                and self.remaining["requests"] >= 1
+                and self.remaining["tokens"] >= tokens
+            ):
+                self.remaining["requests"] -= 1
+                self.remaining["tokens"] -= tokens
+                self.waits += waited
+                return
+
+            waited = True
+            if now < self.paused_until:
+                delay = self.paused_until - now
+            elif self.remaining["requests"] < 1:
+                delay = self.reset_at["requests"] - now
+            else:
+                delay = self.reset_at["tokens"] - now
+            # responses still in flight can move the reset time, so
+            # look again at least every second
+            await asyncio.sleep(min(max(delay, 0.05), 1))
+
+    def update(self, headers: httpx.Headers):
+        """Takes the api's view of the limits from a response"""
+
+        now = time.monotonic()
+        for name in ("requests", "tokens"):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{name}")
+                if limit:
+                    self.limits[name] = int(limit)
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining:
+                    self.remaining[name] = int(remaining)
+            except ValueError:
+                continue
+            reset = parse_reset(headers.get(f"x-ratelimit-reset-{name}"))
+            if reset is not None:
+                self.reset_at[name] = now + reset
+
+    def pause(self, seconds: float):
+        """Holds every request back for `seconds`"""
+
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def summary(self) -> dict:
+        return {
+            "limits": dict(self.limits),
+            "remaining": dict(self.remaining),
+            "waits": self.waits,
+        }
+
+
+def retry_delay(response: httpx.Response, attempt: int) -> float:
+    """
+    ### Description:
+        - How long to wait before retrying a refused request: the
+          api's hint if it gave one, else exponential backoff with
+          jitter, capped at a minute.
+    """
+
+    headers = response.headers
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            if headers.get(name):
+                return float(headers[name]) * scale
+        except ValueError:
+            pass
+    reset = parse_reset(headers.get("x-ratelimit-reset-requests"))
+    if response.status_code == 429 and reset:
+        return reset
+    return min(60, 2**attempt) * (0.5 + random.random() / 2)
+
+
+class AsyncLLMClient:
+    """
+    ### Description:
+        - Sends chat completions concurrently over one pooled
+          `httpx.AsyncClient`, within a `RateBudget`.
+
+    ### Args:
+        - `max_in_flight`: int | None
+            Completions awaited at the same time. Defaults to
+            `LLM_MAX_IN_FLIGHT` or 8.
+        - `budget`: RateBudget | None
+            The rate limit budget.
+        - `base_url`: str | None
+            The api root. Defaults to `OPENAI_BASE_URL` or OpenAI.
+        - `api_key`: str | None
+            Defaults to `AZ_OPENAI_API_KEY`, like `invoke_openai`.
+        - `max_retries`: int
+            Attempts per completion on 429, 5xx and network errors.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int | None = None,
+        budget: RateBudget | None = None,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        max_retries: int = 6,
+    ) -> None:
+
+        self.max_in_flight = max_in_flight or int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+        self.budget = budget or RateBudget()
+        self.max_retries = max_retries
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.requests = 0
+        self.refused = 0
+
+        base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        api_key = api_key or os.getenv("AZ_OPENAI_API_KEY")
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=120,
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight,
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncLLMClient":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def complete(
+        self, model: ValidLLMModels | str, messages: LLMMessageLog
+    ) -> AIResponse:
+        """
+        ### Description:
+            - The async counterpart of `invoke_openai`.
+
+        ### Args:
+            - `model`: ValidLLMModels | str
+                The model to be used for the API call.
+            - `messages`: LLMMessageLog
+                The logged messages to be sent in the request.
+
+        ### Returns:
+            - `AIResponse`
+                The response, priced.
+
+        ### Raises:
+            - `RuntimeError`:
+                If the api returns an error, or still refuses the
+                request after `max_retries` attempts.
+        """
+
+        if not isinstance(model, str):
+            model = model.value
+
+        payload = {
+            "model": model,
+            "messages": [x.model_dump() for x in messages.messages],
+            "max_tokens": MAX_TOKENS,
+        }
+        # the api counts max_tokens against the budget up front
+        tokens = sum(count_tokens(x.content) for x in messages.messages) + MAX_TOKENS
+
+        for attempt in range(self.max_retries):
+            try:
+                # spend the budget only once a slot is free, so requests
+                # queued for a slot don't hold it back from the others
+                async with self.semaphore:
+                    await self.budget.acquire(tokens)
+                    self.requests += 1
+                    response = await self.client.post("chat/completions", json=payload)
+            except httpx.TransportError as e:
+                print("LLM request failed", type(e).__name__, e)
+                await asyncio.sleep(min(60, 2**attempt))
+                continue
+
+            self.budget.update(response.headers)
+            if response.status_code == 429 or response.status_code >= 500:
+                self.refused += 1
+                delay = retry_delay(response, attempt)
+                print(
+                    f"LLM api answered {response.status_code}. Retrying in {delay:.1f}s"
+                )
+                if response.status_code == 429:
+                    self.budget.pause(delay)
+                await asyncio.sleep(delay)
+                continue
+
+            data = response.json()
+            if data.get("error"):
+                raise RuntimeError(data["error"]["message"])
+            ai_response = AIResponse(**data)
+            ai_response.calculate_cost(model, LLM_COST_PER_TOKEN)
+            return ai_response
+
+        raise RuntimeError(f"LLM api refused the request {self.max_retries} times")
+
+    async def extract(
+        self, page: str, model: ValidLLMModels = ValidLLMModels.OPENAI_GPT4o_MINI
+    ) -> tuple[AIResponse, PostingAttributes] | None:
+        """
+        ### Description:
+            - The async counterpart of `entry_extract_attributes`:
+              served from the extraction cache when possible, retried
+              when the response doesn't match the schema.
+
+        ### Args:
+            - `page`: str
+                The page text to extract attributes from.
+            - `model`: ValidLLMModels
+                The model to extract with.
+
+        ### Returns:
+            - `tuple[AIResponse, PostingAttributes] | None`
+                The response and the parsed attributes, or None if
+                every attempt failed.
+        """
+
+        # SQLite blocks, so the cache is read and written off the loop
+        cache = await asyncio.to_thread(get_extraction_cache)
+        key = cache_key(page, model.value)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached:
+            print("Attributes served by the extraction cache")
+            return cached
+
+        messages = build_messages(page)
+        running_cost = 0
+        for _ in range(5):
+            try:
+                response = await self.complete(model, messages)
+                running_cost += response.cost
+                parsed_job = convert_response_to_schema(response.text)
+                response.cost = running_cost  # combine cost of failed previous runs
+                await asyncio.to_thread(cache.put, key, response, parsed_job)
+                return response, parsed_job
+            except RuntimeError as e:
+                # the api rejected the request or kept refusing it
+                print("Unable to extract metadata with OpenAI:", e)
+                return None
+            except ValidationError:
+                print("Error extracting metadata with OpenAI. Retrying...")
+            except Exception as e:
+                print(
+                    f"Error extracting metadata with OpenAI: {type(e).__name__}: {e}. Retrying..."
+                )
+        return None
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "refused": self.refused,
+            **self.budget.summary(),
+        }
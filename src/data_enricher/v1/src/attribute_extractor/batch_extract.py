@@ -0,0 +1,571 @@
+"""
+### Description:
+    - Drains a large client data backlog through the OpenAI Batch API,
+      which bills half the regular price and isn't bound by the
+      per-minute rate limits.
+    - Pages that Upwork's JSON or the extraction cache can serve are
+      written straight away. The rest are written to a JSONL request
+      file, submitted as one batch and polled until it completes.
+      The results are then applied row by row.
+    - A submitted batch is saved to the temp folder until its results
+      are applied, so a run that stops waiting picks it up again next
+      time instead of paying for the same pages twice.
+    - Meant for non-urgent backfills: a batch can take up to 24 hours.
+
+### Usage:
+    python -m src.attribute_extractor.batch_extract [--batch-size 200]
+"""
+
+# pylint:disable=wrong-import-position
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+import httpx
+from pydantic import BaseModel
+from rich import print
+from wrapworks import cwdtoenv
+from dotenv import load_dotenv
+
+cwdtoenv()
+load_dotenv()
+
+from src.attribute_extractor.direct_extract import (
+    EXTRACTION_STATS,
+    extract_without_llm,
+    llm_input,
+)
+from src.attribute_extractor.extraction_cache import cache_key, get_extraction_cache
+from src.attribute_extractor.get_attributes import (
+    build_messages,
+    convert_response_to_schema,
+)
+from src.models.genai_models import (
+    AIResponse,
+    BATCH_COST_DISCOUNT,
+    LLM_COST_PER_TOKEN,
+    ValidLLMModels,
+)
+from src.models.upwork_models import PostingAttributes
+from src.postgres.select_functions import get_pending_client_data_rows
+from src.postgres.update_functions import update_row, update_row_as_done
+
+BATCH_FOLDER = Path(Path.cwd(), "src", "attribute_extractor", "temp", "batches")
+OPEN_BATCH_FOLDER = Path(BATCH_FOLDER, "open")
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# error file codes of requests the batch never ran
+UNFINISHED_ERRORS = {"batch_expired", "batch_cancelled"}
+
+
+class BatchJob(BaseModel):
+    """The parts of an OpenAI batch object we act on"""
+
+    id: str
+    status: str
+    input_file_id: str | None = None
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+    request_counts: dict | None = None
+
+
+class BatchClient:
+    """
+    ### Description:
+        - Minimal client for the files and batches endpoints of the
+          OpenAI api.
+
+    ### Args:
+        - `base_url`: str | None
+            The api root. Defaults to `OPENAI_BASE_URL` or OpenAI.
+        - `api_key`: str | None
+            Defaults to `AZ_OPENAI_API_KEY`, like `invoke_openai`.
+    """
+
+    def __init__(self, base_url: str | None = None, api_key: str | None = None):
+
+        base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        api_key = api_key or os.getenv("AZ_OPENAI_API_KEY")
+        self.client = httpx.Client(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=120,
+        )
+
+    def _check(self, response: httpx.Response) -> httpx.Response:
+
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"Batch api error {response.status_code}: {response.text}"
+            )
+        return response
+
+    def upload(self, path: Path) -> str:
+        """Uploads a request file and returns its file id"""
+
+        with open(path, "rb") as rf:
+            response = self.client.post(
+                "files",
+                data={"purpose": "batch"},
+                files={"file": (path.name, rf, "application/jsonl")},
+            )
+        return self._check(response).json()["id"]
+
+    def create(self, file_id: str) -> BatchJob:
+        """Starts a chat completions batch over an uploaded file"""
+
+        payload = {
+            "input_file_id": file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+        }
+        response = self.client.post("batches", json=payload)
+        return BatchJob(**self._check(response).json())
+
+    def get(self, batch_id: str) -> BatchJob:
+        response = self.client.get(f"batches/{batch_id}")
+        return BatchJob(**self._check(response).json())
+
+    def download(self, file_id: str) -> bytes:
+        response = self.client.get(f"files/{file_id}/content")
+        return self._check(response).content
+
+    def close(self):
+        self.client.close()
+
+
+def build_request(custom_id: str, page: str, model: str) -> dict:
+    """One JSONL line of a batch: the same request `invoke_openai` sends"""
+
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [x.model_dump() for x in build_messages(page).messages],
+            "max_tokens": 3000,
+        },
+    }
+
+
+def write_batch_file(pages: dict[str, str], model: str) -> Path:
+    """
+    ### Description:
+        - Writes the request file for a batch.
+
+    ### Args:
+        - `pages`: dict[str, str]
+            Page text by custom id.
+        - `model`: str
+            The model every request uses.
+
+    ### Returns:
+        - `Path`
+            The JSONL file, in the temp folder.
+    """
+
+    BATCH_FOLDER.mkdir(parents=True, exist_ok=True)
+    path = Path(BATCH_FOLDER, f"batch_{uuid4().hex}.jsonl")
+    with open(path, "w", encoding="utf-8") as wf:
+        for custom_id, page in pages.items():
+            wf.write(json.dumps(build_request(custom_id, page, model)) + "\n")
+    return path
+
+
+def wait_for_batch(
+    client: BatchClient,
+    batch_id: str,
+    poll_interval: float,
+    timeout: float,
+    sleep: Callable[[float], None] = time.sleep,
+) -> BatchJob:
+    """
+    ### Description:
+        - Polls a batch until it finishes.
+
+    ### Raises:
+        - `TimeoutError`:
+            If the batch is still running after `timeout` seconds.
+    """
+
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = client.get(batch_id)
+        print("Batch", batch.id, batch.status, batch.request_counts)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Batch {batch_id} still {batch.status}")
+        sleep(poll_interval)
+
+
+def parse_output(
+    content: bytes, model: str
+) -> dict[str, tuple[AIResponse, PostingAttributes] | None]:
+    """
+    ### Description:
+        - Parses a batch output file.
+
+    ### Args:
+        - `content`: bytes
+            The JSONL output file.
+        - `model`: str
+            The model, to price the responses.
+
+    ### Returns:
+        - `dict[str, tuple[AIResponse, PostingAttributes] | None]`
+            The response and attributes by custom id, or None for
+            requests that failed or didn't match the schema.
+    """
+
+    results = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        custom_id = item["custom_id"]
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            print("Batch request failed", custom_id, item.get("error"))
+            results[custom_id] = None
+            continue
+        try:
+            ai_response = AIResponse(**response["body"])
+            ai_response.calculate_cost(model, LLM_COST_PER_TOKEN)
+            ai_response.cost *= BATCH_COST_DISCOUNT
+            results[custom_id] = (
+                ai_response,
+                convert_response_to_schema(ai_response.text),
+            )
+        except Exception as e:
+            print("Unusable batch result", custom_id, type(e).__name__, e)
+            results[custom_id] = None
+    return results
+
+
+def submit_batch(pages: dict[str, str], client: BatchClient, model: str) -> BatchJob:
+    """
+    ### Description:
+        - Writes, uploads and starts a batch over the pages.
+
+    ### Args:
+        - `pages`: dict[str, str]
+            Page text by custom id.
+        - `client`: BatchClient
+            The batch api client.
+        - `model`: str
+            The model to extract with.
+
+    ### Returns:
+        - `BatchJob`
+            The started batch, with its input file id.
+    """
+
+    path = write_batch_file(pages, model)
+    try:
+        file_id = client.upload(path)
+        batch = client.create(file_id)
+    finally:
+        path.unlink(missing_ok=True)
+    batch.input_file_id = batch.input_file_id or file_id
+    print(f"Submitted batch {batch.id} with {len(pages)} pages")
+    return batch
+
+
+def is_unfinished(line: bytes) -> bool:
+    """Whether an error file line is a request the batch never ran"""
+
+    if not line.strip():
+        return False
+    error = json.loads(line).get("error") or {}
+    return error.get("code") in UNFINISHED_ERRORS
+
+
+def batch_results(
+    batch: BatchJob, custom_ids: list[str], client: BatchClient, model: str
+) -> dict[str, tuple[AIResponse, PostingAttributes] | None]:
+    """
+    ### Description:
+        - Reads the results of a finished batch from its output and
+          error files. A batch that expired or was cancelled can still
+          have results for the requests it got through.
+        - Requests the batch never ran are left out: the ones that
+          expired or were cancelled, and all of them when the batch
+          failed as a whole.
+
+    ### Returns:
+        - `dict[str, tuple[AIResponse, PostingAttributes] | None]`
+            The result by custom id, None for requests that ran and
+            failed.
+    """
+
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        lines = client.download(file_id).splitlines()
+        content = b"\n".join(x for x in lines if not is_unfinished(x))
+        results.update(parse_output(content, model))
+    return {x: y for x, y in results.items() if x in custom_ids}
+
+
+def run_batch(
+    pages: dict[str, str],
+    client: BatchClient,
+    model: str,
+    poll_interval: float,
+    timeout: float,
+    sleep: Callable[[float], None] = time.sleep,
+) -> dict[str, tuple[AIResponse, PostingAttributes] | None]:
+    """
+    ### Description:
+        - Submits pages as one batch, waits for it and parses the output.
+
+    ### Args:
+        - `pages`: dict[str, str]
+            Page text by custom id.
+        - `client`: BatchClient
+            The batch api client.
+        - `model`: str
+            The model to extract with.
+        - `poll_interval`: float
+            Seconds between status checks.
+        - `timeout`: float
+            Seconds to wait for the batch.
+
+    ### Returns:
+        - `dict[str, tuple[AIResponse, PostingAttributes] | None]`
+            The result of every submitted page, by custom id.
+
+    ### Raises:
+        - `RuntimeError`:
+            If the batch did not complete.
+    """
+
+    batch = submit_batch(pages, client, model)
+    batch = wait_for_batch(client, batch.id, poll_interval, timeout, sleep)
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended as {batch.status}")
+    return {x: None for x in pages} | batch_results(batch, list(pages), client, model)
+
+
+class OpenBatch(BaseModel):
+    """
+    ### Description:
+        - A submitted batch whose results haven't been applied yet,
+          with the rows it covers.
+    """
+
+    id: str
+    input_file_id: str | None = None
+    model: str
+    links: dict[str, str]
+    keys: dict[str, str]
+    submitted_at: float
+
+
+def save_open_batch(batch: OpenBatch):
+    """Keeps a batch on disk until its results are applied"""
+
+    OPEN_BATCH_FOLDER.mkdir(parents=True, exist_ok=True)
+    path = Path(OPEN_BATCH_FOLDER, f"{batch.id}.json")
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_text(batch.model_dump_json(), encoding="utf-8")
+    temp_path.replace(path)
+
+
+def load_open_batches() -> list[OpenBatch]:
+    """The saved batches, oldest first"""
+
+    batches = []
+    for path in OPEN_BATCH_FOLDER.glob("*.json"):
+        try:
+            batches.append(OpenBatch.model_validate_json(path.read_text("utf-8")))
+        except ValueError as e:
+            print("Unreadable open batch", path.name, type(e).__name__, e)
+    return sorted(batches, key=lambda x: x.submitted_at)
+
+
+def drop_open_batch(batch_id: str):
+    """Forgets a batch once its results are applied"""
+
+    Path(OPEN_BATCH_FOLDER, f"{batch_id}.json").unlink(missing_ok=True)
+
+
+def finish_batch(
+    open_batch: OpenBatch,
+    client: BatchClient,
+    poll_interval: float,
+    timeout: float,
+    sleep: Callable[[float], None] = time.sleep,
+) -> bool:
+    """
+    ### Description:
+        - Waits for a saved batch and applies its results.
+        - Rows whose request ran and failed are marked as done once the
+          batch has finished. Rows the batch never ran, e.g. all of
+          them when the batch failed as a whole, stay pending for a
+          later run.
+        - While the batch is still running, or its status can't be
+          read, it stays saved and its rows pending.
+
+    ### Args:
+        - `open_batch`: OpenBatch
+            The batch to finish.
+        - `client`: BatchClient
+            The batch api client.
+        - `poll_interval`: float
+            Seconds between status checks.
+        - `timeout`: float
+            Seconds to wait for the batch in this run.
+
+    ### Returns:
+        - `bool`
+            True if the batch finished and every row was settled.
+    """
+
+    try:
+        batch = wait_for_batch(client, open_batch.id, poll_interval, timeout, sleep)
+        results = batch_results(batch, list(open_batch.links), client, open_batch.model)
+    except (RuntimeError, TimeoutError, httpx.HTTPError) as e:
+        print(
+            f"Batch {open_batch.id} isn't finished. Resuming it next run",
+            type(e).__name__,
+            e,
+        )
+        return False
+
+    if batch.status != "completed":
+        print(f"Batch {open_batch.id} ended as {batch.status}")
+
+    cache = get_extraction_cache()
+    cost = 0
+    for custom_id, result in results.items():
+        url = open_batch.links[custom_id]
+        if result is None:
+            EXTRACTION_STATS.record("failed")
+            update_row_as_done(url)
+            continue
+        cache.put(open_batch.keys[custom_id], *result)
+        update_row(url, result[1])
+        cost += result[0].cost or 0
+        EXTRACTION_STATS.record("llm_batch")
+    print(f"Applied batch of {len(results)} pages for ${cost:.4f}")
+
+    drop_open_batch(open_batch.id)
+    unfinished = len(open_batch.links) - len(results)
+    if unfinished:
+        print(
+            f"Batch {open_batch.id} never ran {unfinished} rows. Leaving them pending"
+        )
+        return False
+    return True
+
+
+def backlog_executor(
+    batch_size: int | None = None,
+    client: BatchClient | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+):
+    """
+    ### Description:
+        - Finishes the batches a previous run left open, then drains
+          the pending client data rows in batches of `batch_size`
+          until none are left.
+        - Rows the batch couldn't extract are marked as done, like the
+          regular executor does, once the batch has finished. Rows the
+          batch never ran stay pending and end the run, so they aren't
+          submitted again straight away.
+        - A batch that is still running after `BATCH_TIMEOUT`, or whose
+          status can't be read, ends the run. Its rows stay pending and
+          the batch is picked up again by the next run.
+
+    ### Args:
+        - `batch_size`: int | None
+            Rows per batch. Defaults to `BATCH_SIZE` or 200.
+        - `client`: BatchClient | None
+            The batch api client.
+    """
+
+    batch_size = batch_size or int(os.getenv("BATCH_SIZE", "200"))
+    poll_interval = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+    timeout = float(os.getenv("BATCH_TIMEOUT", str(24 * 3600)))
+    model = ValidLLMModels.OPENAI_GPT4o_MINI.value
+    client = client or BatchClient()
+    cache = get_extraction_cache()
+
+    # the rows of an open batch are still pending, so they must be
+    # applied before new rows are fetched, or they'd be submitted again
+    for open_batch in load_open_batches():
+        print(f"Resuming batch {open_batch.id}")
+        if not finish_batch(open_batch, client, poll_interval, timeout, sleep):
+            print("Extraction sources", EXTRACTION_STATS.summary())
+            return
+
+    while True:
+        urls = get_pending_client_data_rows(batch_size)
+        if not urls:
+            print("No more enrich rows left to process")
+            break
+
+        pages, links, keys = {}, {}, {}
+        for i, url in enumerate(urls):
+            try:
+                attributes, page = extract_without_llm(url)
+            except Exception as e:
+                print("Unable to load posting", url, type(e).__name__, e)
+                attributes, page = None, None
+            if attributes:
+                update_row(url, attributes)
+                continue
+            if not page:
+                update_row_as_done(url)
+                continue
+
+            text = llm_input(page)
+            key = cache_key(text, model)
+            cached = cache.get(key)
+            if cached:
+                update_row(url, cached[1])
+                continue
+
+            custom_id = f"row-{i}"
+            pages[custom_id], links[custom_id], keys[custom_id] = text, url, key
+
+        if not pages:
+            continue
+
+        try:
+            batch = submit_batch(pages, client, model)
+        except (RuntimeError, httpx.HTTPError) as e:
+            print(
+                "Unable to submit batch. Leaving its rows pending", type(e).__name__, e
+            )
+            break
+        open_batch = OpenBatch(
+            id=batch.id,
+            input_file_id=batch.input_file_id,
+            model=model,
+            links=links,
+            keys=keys,
+            submitted_at=time.time(),
+        )
+        save_open_batch(open_batch)
+
+        if not finish_batch(open_batch, client, poll_interval, timeout, sleep):
+            break
+
+    print("Extraction sources", EXTRACTION_STATS.summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    backlog_executor(args.batch_size)
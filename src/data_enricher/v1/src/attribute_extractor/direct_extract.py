@@ -0,0 +1,203 @@
+"""
+### Description:
+    - Extracts job posting attributes without the LLM whenever Upwork
+      already hands us the data as JSON.
+    - Tries the authenticated job details api first, which needs no
+      browser at all, then the Nuxt state of the rendered job page.
+      Only pages that match neither go to the LLM.
+    - Counts which source served every posting, so a change on
+      Upwork's side that pushes rows onto the LLM shows up.
+"""
+
+# pylint:disable=wrong-import-position
+
+import asyncio
+import threading
+
+from pydantic import ValidationError
+from rich import print
+from wrapworks import cwdtoenv
+from dotenv import load_dotenv
+
+cwdtoenv()
+load_dotenv()
+
+from src.attribute_extractor.async_extract import AsyncLLMClient
+from src.attribute_extractor.reduce_page import reduce_for_extraction
+from src.formatter.format_cipher import get_cipher
+from src.history_fetcher.fetch_client_history import get_history
+from src.models.genai_models import AIResponse
+from src.models.upwork_models import JobDetails, PostingAttributes
+from src.upwork_accounts.browser_handlers import render_page, RenderedPage
+
+
+class ExtractionStats:
+    """
+    ### Description:
+        - Counts postings per extraction source: `api`, `nuxt`, `llm`,
+          `llm_batch` or `failed`.
+    """
+
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, source: str):
+        with self.lock:
+            self.counts[source] = self.counts.get(source, 0) + 1
+
+    def summary(self) -> dict:
+        total = sum(self.counts.values())
+        llm = self.counts.get("llm", 0) + self.counts.get("llm_batch", 0)
+        return {
+            **self.counts,
+            "total": total,
+            "llm_rate": round(llm / total, 3) if total else 0,
+        }
+
+
+EXTRACTION_STATS = ExtractionStats()
+
+
+def find_details(state, depth: int = 8) -> dict | None:
+    """
+    ### Description:
+        - Finds the job details in a Nuxt state: the first object
+          holding both a `job` and a `buyer`, searched breadth first
+          so the exact store layout doesn't matter.
+
+    ### Args:
+        - `state`: Any
+            The Nuxt state, or any json value.
+        - `depth`: int
+            How many levels to search.
+
+    ### Returns:
+        - `dict | None`
+            The job details, or None if the state has none.
+    """
+
+    level = [state]
+    for _ in range(depth):
+        next_level = []
+        for value in level:
+            if isinstance(value, dict):
+                if isinstance(value.get("job"), dict) and isinstance(
+                    value.get("buyer"), dict
+                ):
+                    return value
+                next_level.extend(value.values())
+            elif isinstance(value, list):
+                next_level.extend(value)
+        level = next_level
+    return None
+
+
+def attributes_from_details(details: dict, url: str) -> PostingAttributes | None:
+    """Maps job details to attributes, or None if they don't fit"""
+
+    try:
+        return JobDetails(**details).to_attributes(url)
+    except ValidationError as e:
+        print("Job details didn't match", e.error_count(), "errors")
+        return None
+
+
+def get_api_details(url: str) -> dict | None:
+    """The job details from the authenticated api, if it serves them"""
+
+    try:
+        details = get_history(get_cipher(url))
+    except Exception as e:
+        print("Unable to get job details", type(e).__name__, e)
+        return None
+    if not details or "not authenticated" in str(details.get("details", "")):
+        return None
+    return details
+
+
+def extract_without_llm(
+    url: str, stats: ExtractionStats = EXTRACTION_STATS
+) -> tuple[PostingAttributes | None, RenderedPage | None]:
+    """
+    ### Description:
+        - Extracts the attributes of a job posting from the details
+          api, then the rendered page's Nuxt state.
+
+    ### Args:
+        - `url`: str
+            The job posting url.
+        - `stats`: ExtractionStats
+            Where the source that served the posting is counted.
+
+    ### Returns:
+        - `tuple[PostingAttributes | None, RenderedPage | None]`
+            The attributes if either source had them, and the rendered
+            page if it had to be loaded.
+    """
+
+    details = get_api_details(url)
+    attributes = attributes_from_details(details, url) if details else None
+    if attributes:
+        print("Attributes served by the details api")
+        stats.record("api")
+        return attributes, None
+
+    page = render_page(url)
+    if page and page.nuxt_state:
+        details = find_details(page.nuxt_state)
+        attributes = attributes_from_details(details, url) if details else None
+        if attributes:
+            print("Attributes served by the Nuxt state")
+            stats.record("nuxt")
+            return attributes, page
+
+    return None, page
+
+
+def llm_input(page: RenderedPage) -> str:
+    """The text the LLM gets for a page, reduced when the source is known"""
+
+    return reduce_for_extraction(page.html, page.text) if page.html else page.text
+
+
+async def entry_extract_posting_async(
+    url: str, client: AsyncLLMClient, stats: ExtractionStats = EXTRACTION_STATS
+) -> tuple[AIResponse | None, PostingAttributes]:
+    """
+    ### Description:
+        - Extracts the attributes of a job posting from the details
+          api, then the rendered page's Nuxt state, then the LLM.
+        - The api and the browser run in a worker thread, so other
+          postings keep their completions in flight on `client`
+          meanwhile.
+
+    ### Args:
+        - `url`: str
+            The job posting url.
+        - `client`: AsyncLLMClient
+            The shared LLM client.
+        - `stats`: ExtractionStats
+            Where the source that served the posting is counted.
+
+    ### Returns:
+        - `tuple[AIResponse | None, PostingAttributes]`
+            The LLM response when the LLM was used, and the attributes.
+
+    ### Raises:
+        - `RuntimeError`:
+            If no source could extract the attributes.
+    """
+
+    attributes, page = await asyncio.to_thread(extract_without_llm, url, stats)
+    if attributes:
+        return None, attributes
+
+    extracted = await client.extract(llm_input(page)) if page else None
+    if not extracted:
+        stats.record("failed")
+        raise RuntimeError("No source could extract the attributes")
+
+    print("Attributes served by the LLM")
+    stats.record("llm")
+    return extracted
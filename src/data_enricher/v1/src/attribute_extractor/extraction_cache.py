@@ -0,0 +1,194 @@
+"""
+### Description:
+    - Content addressed cache of LLM attribute extractions, so
+      re-running a batch after a crash, or reaching the same posting
+      through another url, doesn't pay for the same completion twice.
+    - Entries are keyed by a hash of the normalized page text, the
+      model and the schema version, and stored in SQLite in the temp
+      folder. The least recently used entries are evicted once the
+      cache is full.
+    - Any SQLite error disables the cache instead of failing the run.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from rich import print
+
+from src.models.genai_models import AIResponse
+from src.models.upwork_models import PostingAttributes, OPENAPI_SCHEMA
+
+# changes whenever PostingAttributes does, so stale extractions miss
+SCHEMA_VERSION = hashlib.sha256(OPENAPI_SCHEMA.encode()).hexdigest()[:12]
+
+CACHE_PATH = Path(
+    Path.cwd(), "src", "attribute_extractor", "temp", "extractions.sqlite3"
+)
+
+
+def normalize_page(page: str) -> str:
+    """Collapses whitespace, so layout-only differences hit the same entry"""
+
+    lines = (re.sub(r"\s+", " ", x).strip() for x in page.splitlines())
+    return "\n".join(x for x in lines if x)
+
+
+def cache_key(page: str, model: str) -> str:
+    """
+    ### Description:
+        - The cache key of a page extracted with a model.
+
+    ### Args:
+        - `page`: str
+            The page text sent to the LLM.
+        - `model`: str
+            The LLM model name.
+
+    ### Returns:
+        - `str`
+            Hex sha256 of the normalized text, model and schema version.
+    """
+
+    digest = hashlib.sha256()
+    for part in (model, SCHEMA_VERSION, normalize_page(page)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    ### Description:
+        - Size bounded LRU cache of `(AIResponse, PostingAttributes)`
+          pairs. A hit returns the original response, including what
+          the extraction cost when it was made.
+        - Counts hits and misses. Safe to share between threads.
+    """
+
+    def __init__(self, path: str | Path | None = None, max_size: int | None = None):
+
+        self.path = path or os.getenv("EXTRACTION_CACHE_PATH", str(CACHE_PATH))
+        self.max_size = max_size or int(os.getenv("EXTRACTION_CACHE_MAX_SIZE", "5000"))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+
+        try:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS extractions "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "attributes TEXT NOT NULL, used_at REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS extractions_used_at "
+                "ON extractions (used_at)"
+            )
+            self.connection.commit()
+        except (sqlite3.Error, OSError) as error:
+            print("Extraction cache disabled", type(error).__name__, error)
+            self.connection = None
+
+    def get(self, key: str) -> tuple[AIResponse, PostingAttributes] | None:
+        """
+        ### Description:
+            - Looks up an extraction and marks it as recently used.
+
+        ### Returns:
+            - `tuple[AIResponse, PostingAttributes] | None`
+                The cached extraction, or None on a miss.
+        """
+
+        if not self.connection:
+            return None
+
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT response, attributes FROM extractions WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row:
+                    self.connection.execute(
+                        "UPDATE extractions SET used_at = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self.connection.commit()
+            except sqlite3.Error as error:
+                print("Error reading extraction cache", type(error).__name__, error)
+                row = None
+
+            if not row:
+                self.misses += 1
+                return None
+
+            try:
+                # the response was validated from the api's shape before
+                # it was stored, which its aliases can't read back
+                cached = (
+                    AIResponse.model_construct(**json.loads(row[0])),
+                    PostingAttributes.model_validate_json(row[1]),
+                )
+            except ValueError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return cached
+
+    def put(self, key: str, response: AIResponse, attributes: PostingAttributes):
+        """Stores an extraction and evicts the least recently used excess"""
+
+        if not self.connection:
+            return
+
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO extractions "
+                    "(key, response, attributes, used_at) VALUES (?, ?, ?, ?)",
+                    (
+                        key,
+                        json.dumps(response.model_dump()),
+                        json.dumps(attributes.model_dump(), default=str),
+                        time.time(),
+                    ),
+                )
+                self.connection.execute(
+                    "DELETE FROM extractions WHERE key NOT IN "
+                    "(SELECT key FROM extractions ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_size,),
+                )
+                self.connection.commit()
+            except sqlite3.Error as error:
+                print("Error writing extraction cache", type(error).__name__, error)
+
+    def summary(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0,
+        }
+
+
+EXTRACTION_CACHE: ExtractionCache | None = None
+EXTRACTION_CACHE_LOCK = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Opens the extraction cache on first use, once across threads"""
+
+    global EXTRACTION_CACHE  # pylint:disable=global-statement
+    if EXTRACTION_CACHE is None:
+        with EXTRACTION_CACHE_LOCK:
+            if EXTRACTION_CACHE is None:
+                EXTRACTION_CACHE = ExtractionCache()
+    return EXTRACTION_CACHE
@@ -1,6 +1,6 @@
 """
 ### Description:
-    - This module contains the worker responsible for 
+    - This module contains the worker responsible for
       gathering client data from Upwork job postings.
 """
 
@@ -31,6 +31,7 @@ from src.models.genai_models import (
     AIResponse,
     LLMRoles,
 )
+from src.attribute_extractor.extraction_cache import cache_key, get_extraction_cache
 
 # ----------------------------------------
 #               WORKERS
@@ -139,24 +140,20 @@ def convert_response_to_schema(res: str) -> PostingAttributes:
     return schemed_product
 
 
-def entry_extract_attributes(page: str) -> tuple[AIResponse, PostingAttributes]:
+def build_messages(page: str) -> LLMMessageLog:
     """
     ### Description:
-        - Extracts job posting attributes from a webpage using
-          the OpenAI API to parse the content.
+        - Builds the extraction prompt for a page.
 
     ### Args:
         - `page`: str
-            The content of the webpage to extract attributes from.
+            The page text to extract attributes from.
 
     ### Returns:
-        - `tuple[AIResponse, PostingAttributes]`
-            A tuple containing the generated AI response and the
-            parsed posting attributes.
+        - `LLMMessageLog`
+            The system prompts followed by the page.
     """
 
-    print("Extracting attributes from a page")
-
     messages = LLMMessageLog(
         messages=[
             LLMMessage(
@@ -177,20 +174,51 @@ def entry_extract_attributes(page: str) -> tuple[AIResponse, PostingAttributes]:
     )
 
     messages.messages.append(LLMMessage(role=LLMRoles.USER, content=page))
+    return messages
+
+
+def entry_extract_attributes(page: str) -> tuple[AIResponse, PostingAttributes]:
+    """
+    ### Description:
+        - Extracts job posting attributes from a webpage using
+          the OpenAI API to parse the content.
+        - Pages that were extracted before are served from the
+          extraction cache without calling the API.
+
+    ### Args:
+        - `page`: str
+            The content of the webpage to extract attributes from.
+
+    ### Returns:
+        - `tuple[AIResponse, PostingAttributes]`
+            A tuple containing the generated AI response and the
+            parsed posting attributes.
+    """
+
+    print("Extracting attributes from a page")
+
+    model = ValidLLMModels.OPENAI_GPT4o_MINI
+    cache = get_extraction_cache()
+    key = cache_key(page, model.value)
+    cached = cache.get(key)
+    if cached:
+        print("Attributes served by the extraction cache", cache.summary())
+        return cached
+
+    messages = build_messages(page)
 
     running_cost = 0
     retries = 0
     while retries < 5:
         try:
-            response = handler_generate_response(
-                messages, ValidLLMModels.OPENAI_GPT4o_MINI
-            )
+            response = handler_generate_response(messages, model)
             # add current cost to checkpoint incase validation fails
             if response:
                 running_cost += response.cost
 
             parsed_job = convert_response_to_schema(response.text)
             response.cost = running_cost  # combine cost of failed previous runs
+            cache.put(key, response, parsed_job)
             return response, parsed_job
         except ValidationError:
             retries += 1
@@ -0,0 +1,230 @@
+"""
+### Description:
+    - Shrinks a rendered job page to the text the LLM actually needs
+      before it goes into the prompt.
+    - Keeps only the job body and the client sidebar, collapses
+      whitespace, and drops long lines that repeat across pages, such
+      as banners and footers, learned from a corpus of saved pages.
+    - Falls back to the whole page when none of the sections are
+      found, so a layout change costs tokens, not data.
+
+### Usage:
+    python -m src.attribute_extractor.reduce_page --learn <folder of .html pages>
+"""
+
+# pylint:disable=wrong-import-position
+
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+from bs4 import BeautifulSoup
+from rich import print
+
+# job title, description, budget and activity, then the client sidebar
+KEEP_SELECTORS = [
+    "header h4",
+    "h1",
+    "[data-test='Description']",
+    "[data-test='Features']",
+    "[data-test='ClientActivity']",
+    "[data-test='about-client-container']",
+    "[data-test='AboutClientUser']",
+]
+DROP_TAGS = ["script", "style", "noscript", "svg", "template", "iframe"]
+BOILERPLATE_PATH = Path(
+    Path.cwd(), "src", "attribute_extractor", "temp", "boilerplate.json"
+)
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    ### Description:
+        - Estimates LLM tokens as words plus punctuation marks. Close
+          enough to compare inputs with each other.
+    """
+
+    return len(WORD_RE.findall(text))
+
+
+def clean_lines(text: str) -> list[str]:
+    """Collapses whitespace and drops empty lines"""
+
+    lines = (re.sub(r"\s+", " ", x).strip() for x in text.splitlines())
+    return [x for x in lines if x]
+
+
+def full_text(html: str) -> str:
+    """The page text the way `get_page` returns it"""
+
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n")
+
+
+class Boilerplate:
+    """
+    ### Description:
+        - Lines to drop from every page. Only lines of at least
+          `min_length` characters are learned, so short labels such as
+          "Hourly" or "jobs posted" that repeat on every page but carry
+          meaning next to their values are kept.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()) -> None:
+        self.lines = set(lines)
+
+    @classmethod
+    def learn(
+        cls, pages: Iterable[str], min_share: float = 0.5, min_length: int = 40
+    ) -> "Boilerplate":
+        """
+        ### Description:
+            - Learns the lines that appear on at least `min_share` of
+              the pages.
+
+        ### Args:
+            - `pages`: Iterable[str]
+                The html of the pages in the corpus.
+            - `min_share`: float
+                Share of pages a line must appear on.
+            - `min_length`: int
+                Shortest line that can be boilerplate.
+
+        ### Returns:
+            - `Boilerplate`
+                The learned lines.
+        """
+
+        counts = Counter()
+        total = 0
+        for html in pages:
+            total += 1
+            counts.update(
+                {x for x in clean_lines(full_text(html)) if len(x) >= min_length}
+            )
+        # a line shared by two pages is not boilerplate yet
+        threshold = max(2, min_share * total)
+        return cls(x for x, y in counts.items() if y >= threshold)
+
+    @classmethod
+    def load(cls, path: str | Path | None = None) -> "Boilerplate":
+        """Reads learned lines, or none if nothing was learned yet"""
+
+        path = path or os.getenv("BOILERPLATE_PATH", str(BOILERPLATE_PATH))
+        try:
+            with open(path, "r", encoding="utf-8") as rf:
+                return cls(json.load(rf))
+        except (OSError, ValueError):
+            return cls()
+
+    def save(self, path: str | Path | None = None):
+
+        path = Path(path or os.getenv("BOILERPLATE_PATH", str(BOILERPLATE_PATH)))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as wf:
+            json.dump(sorted(self.lines), wf, indent=2)
+
+
+def reduce_page(html: str, boilerplate: Boilerplate | None = None) -> str:
+    """
+    ### Description:
+        - Reduces a rendered job page to the text of its job and
+          client sections.
+
+    ### Args:
+        - `html`: str
+            The page source.
+        - `boilerplate`: Boilerplate | None
+            Learned lines to drop.
+
+    ### Returns:
+        - `str`
+            One cleaned line per text block, in page order.
+    """
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(DROP_TAGS):
+        tag.decompose()
+
+    sections, kept = [], set()
+    for element in soup.select(", ".join(KEEP_SELECTORS)):
+        # selectors can match inside a section that is already kept
+        if not any(id(x) in kept for x in element.parents):
+            sections.append(element)
+            kept.add(id(element))
+    parts = sections or [soup.body or soup]
+
+    drop = boilerplate.lines if boilerplate else set()
+    lines = []
+    for part in parts:
+        for line in clean_lines(part.get_text(separator="\n")):
+            if line not in drop and (not lines or lines[-1] != line):
+                lines.append(line)
+    return "\n".join(lines)
+
+
+BOILERPLATE: Boilerplate | None = None
+
+
+def reduce_for_extraction(html: str, page_text: str) -> str:
+    """
+    ### Description:
+        - Reduces a page before extraction, with the saved boilerplate,
+          and logs the estimated tokens before and after.
+
+    ### Args:
+        - `html`: str
+            The page source.
+        - `page_text`: str
+            The full page text that would have been sent otherwise.
+
+    ### Returns:
+        - `str`
+            The reduced text, or the full text if reducing left nothing.
+    """
+
+    global BOILERPLATE  # pylint:disable=global-statement
+    if BOILERPLATE is None:
+        BOILERPLATE = Boilerplate.load()
+
+    reduced = reduce_page(html, BOILERPLATE)
+    if not reduced:
+        return page_text
+
+    before, after = count_tokens(page_text), count_tokens(reduced)
+    print(
+        "Page text reduced",
+        {"tokens_before": before, "tokens_after": after, "saved": before - after},
+    )
+    return reduced
+
+
+def load_corpus(folder: str | Path) -> dict[str, str]:
+    """Reads every saved `.html` page in a folder, by file name"""
+
+    pages = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".html"):
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as rf:
+                pages[name] = rf.read()
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--learn", required=True, help="Folder of saved pages")
+    parser.add_argument("--min-share", type=float, default=0.5)
+    parser.add_argument("--min-length", type=int, default=40)
+    parser.add_argument("--output", help="Where to save the boilerplate")
+    args = parser.parse_args()
+
+    learned = Boilerplate.learn(
+        load_corpus(args.learn).values(), args.min_share, args.min_length
+    )
+    learned.save(args.output)
+    print(f"Learned {len(learned.lines)} boilerplate lines")
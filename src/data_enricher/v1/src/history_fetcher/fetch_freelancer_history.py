@@ -22,6 +22,7 @@ cwdtoenv()
 from src.upwork_accounts.browser_worker import get_cookies
 from src.sqlalchemy.insert_functions import save_work_history_to_db
 from src.upwork_accounts.browser_worker import GetSessionDriver
+from src.upwork_accounts.page_waits import wait_for_page
 
 from src.models.upwork_models import WorkHistory, FreelancerIdentity
 from src.errors.common_errors import NotLoggedIn
@@ -62,6 +63,7 @@ def get_profile_with_render(cipher: str, driver: Chrome) -> dict:
     )
 
     driver.get(url)
+    wait_for_page(driver, "api")
     content = driver.page_source
     content = driver.find_element(By.CSS_SELECTOR, "pre")
     parsed_json = json.loads(content.text)
@@ -114,6 +116,7 @@ def get_contracts_with_render(
         url += "completed"
 
     driver.get(url)
+    wait_for_page(driver, "api")
     content = driver.page_source
     try:
         content = driver.find_element(By.CSS_SELECTOR, "pre")
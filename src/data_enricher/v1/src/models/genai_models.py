@@ -16,6 +16,10 @@ LLM_COST_PER_TOKEN = {
 }
 
 
+# the batch api bills half the regular price per token
+BATCH_COST_DISCOUNT = 0.5
+
+
 class ValidLLMModels(Enum):
     OPENAI_GPT4o = "gpt-4o"
     OPENAI_GPT4o_MINI = "gpt-4o-mini"
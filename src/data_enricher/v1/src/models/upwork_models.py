@@ -66,6 +66,167 @@ class PostingAttributes(BaseModel):
 
 OPENAPI_SCHEMA = json.dumps(PostingAttributes.model_json_schema())
 
+CONTRACTOR_TIERS = {
+    "1": "Entry level",
+    "2": "Intermediate",
+    "3": "Expert",
+    "EntryLevel": "Entry level",
+    "IntermediateLevel": "Intermediate",
+    "ExpertLevel": "Expert",
+}
+
+
+class JobDetails(BaseModel):
+    """
+    Pydantic model to read the job details json that Upwork serves from
+    its job details api and keeps in the job page's Nuxt state
+    """
+
+    title: str = Field(
+        validation_alias=AliasChoices(
+            AliasPath("job", "title"), AliasPath("job", "info", "title")
+        )
+    )
+    description: str | None = Field(
+        None, validation_alias=AliasPath("job", "description")
+    )
+    job_type: str | int | None = Field(
+        None,
+        validation_alias=AliasChoices(
+            AliasPath("job", "type"), AliasPath("job", "info", "type")
+        ),
+    )
+    hourly_low: float | None = Field(
+        None,
+        validation_alias=AliasChoices(
+            AliasPath("job", "extendedBudgetInfo", "hourlyBudgetMin"),
+            AliasPath("job", "hourlyBudgetMin"),
+        ),
+    )
+    hourly_high: float | None = Field(
+        None,
+        validation_alias=AliasChoices(
+            AliasPath("job", "extendedBudgetInfo", "hourlyBudgetMax"),
+            AliasPath("job", "hourlyBudgetMax"),
+        ),
+    )
+    budget: float | None = Field(
+        None,
+        validation_alias=AliasChoices(
+            AliasPath("job", "budget", "amount"), AliasPath("job", "amount", "amount")
+        ),
+    )
+    duration_weeks: int | None = Field(
+        None, validation_alias=AliasPath("job", "engagementDuration", "weeks")
+    )
+    contractor_tier: str | int | None = Field(
+        None, validation_alias=AliasPath("job", "contractorTier")
+    )
+    project_type: str | None = Field(
+        None, validation_alias=AliasPath("job", "projectType")
+    )
+    proposals: int | None = Field(
+        None, validation_alias=AliasPath("job", "clientActivity", "totalApplicants")
+    )
+    interviewing: int | None = Field(
+        None,
+        validation_alias=AliasPath("job", "clientActivity", "totalInvitedToInterview"),
+    )
+    invites_sent: int | None = Field(
+        None, validation_alias=AliasPath("job", "clientActivity", "invitationsSent")
+    )
+    unanswered_invites: int | None = Field(
+        None, validation_alias=AliasPath("job", "clientActivity", "unansweredInvites")
+    )
+
+    client_country: str = Field(
+        validation_alias=AliasPath("buyer", "location", "country")
+    )
+    client_city: str | None = Field(
+        None, validation_alias=AliasPath("buyer", "location", "city")
+    )
+    client_join_date: datetime = Field(
+        validation_alias=AliasPath("buyer", "company", "contractDate")
+    )
+    client_jobs_posted: int | None = Field(
+        None, validation_alias=AliasPath("buyer", "jobs", "postedCount")
+    )
+    client_open_jobs: int | None = Field(
+        None, validation_alias=AliasPath("buyer", "jobs", "openCount")
+    )
+    client_total_spent_usd: float | None = Field(
+        None,
+        validation_alias=AliasChoices(
+            AliasPath("buyer", "stats", "totalCharges", "amount"),
+            AliasPath("buyer", "stats", "totalCharges"),
+        ),
+    )
+    client_total_hires: int | None = Field(
+        None, validation_alias=AliasPath("buyer", "stats", "totalJobsWithHires")
+    )
+    client_active_hires: int | None = Field(
+        None, validation_alias=AliasPath("buyer", "stats", "activeAssignmentsCount")
+    )
+    client_avg_hourly_rate: float | None = Field(
+        None,
+        validation_alias=AliasChoices(
+            AliasPath("buyer", "avgHourlyJobsRate", "amount"),
+            AliasPath("buyer", "avgHourlyJobsRate"),
+        ),
+    )
+    client_total_paid_hours: float | None = Field(
+        None, validation_alias=AliasPath("buyer", "stats", "hoursCount")
+    )
+
+    def to_attributes(self, url: str | None = None) -> PostingAttributes:
+        """Maps the details to the attributes the LLM would extract"""
+
+        job_type = str(self.job_type).upper()
+        is_hourly = {"HOURLY": True, "2": True, "FIXED": False, "1": False}.get(
+            job_type
+        )
+        hire_rate = None
+        if self.client_jobs_posted and self.client_total_hires is not None:
+            hire_rate = round(self.client_total_hires / self.client_jobs_posted * 100)
+
+        def to_int(value: float | None) -> int | None:
+            return None if value is None else int(value)
+
+        job = UpworkJob(
+            url=url,
+            title=self.title,
+            full_description=self.description,
+            is_hourly=is_hourly,
+            hourly_low=to_int(self.hourly_low),
+            hourly_high=to_int(self.hourly_high),
+            budget=to_int(self.budget),
+            duration_months=(
+                max(1, round(self.duration_weeks / 4.345))
+                if self.duration_weeks
+                else None
+            ),
+            freelancer_experince_level=CONTRACTOR_TIERS.get(str(self.contractor_tier)),
+            project_type=self.project_type,
+            proposals=self.proposals or 0,
+            interviewing=self.interviewing or 0,
+            invites_sent=self.invites_sent or 0,
+            unanswered_invites=self.unanswered_invites or 0,
+        )
+        client = UpworkClient(
+            client_country=self.client_country,
+            client_city=self.client_city,
+            client_join_date=self.client_join_date,
+            client_jobs_posted=self.client_jobs_posted,
+            client_hire_rate=hire_rate,
+            client_open_jobs=self.client_open_jobs,
+            client_total_spent_usd=to_int(self.client_total_spent_usd),
+            client_total_hires=self.client_total_hires,
+            client_active_hires=self.client_active_hires,
+            client_avg_hourly_rate=self.client_avg_hourly_rate,
+            client_total_paid_hours=to_int(self.client_total_paid_hours),
+        )
+        return PostingAttributes(job=job, client=client)
+
 
 class PastJob(BaseModel):
     job_id: str | None = Field(
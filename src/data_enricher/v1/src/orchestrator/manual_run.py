@@ -4,7 +4,9 @@ Module to manually trigger data augmentation
 
 # pylint:disable=wrong-import-position
 
+import asyncio
 import json
+import os
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -16,12 +18,17 @@ load_dotenv()
 cwdtoenv()
 
 from src.postgres.select_functions import (
-    get_pending_client_data_row,
+    get_pending_client_data_rows,
     get_pending_hire_history_row,
 )
 from src.postgres.update_functions import update_row, update_row_as_done
-from src.upwork_accounts.browser_handlers import get_page, do_login
-from src.attribute_extractor.get_attributes import entry_extract_attributes
+from src.upwork_accounts.browser_handlers import do_login, DRIVER_POOL
+from src.attribute_extractor.async_extract import AsyncLLMClient
+from src.attribute_extractor.direct_extract import (
+    entry_extract_posting_async,
+    EXTRACTION_STATS,
+)
+from src.attribute_extractor.extraction_cache import get_extraction_cache
 from src.sqlalchemy.select_functions import get_batch_freelancers_from_db
 from src.sqlalchemy.update_functions import (
     update_freelancer_in_db,
@@ -38,23 +45,47 @@ from src.upwork_accounts.browser_worker import GetSessionDriver
 from src.errors.common_errors import NotLoggedIn
 
 
-def client_data_executor():
+async def handler_client_data_async(url: str, client: AsyncLLMClient):
     """"""
 
-    while True:
-        url = get_pending_client_data_row()
-        if not url:
-            print("No more enrich rows left to process")
-            break
+    try:
+        response, attributes = await entry_extract_posting_async(url, client)
+        print(attributes)
+        await asyncio.to_thread(update_row, url, attributes)
+    except Exception as e:
+        print("Unable to extract attributes: ", type(e).__name__, e)
+        await asyncio.to_thread(update_row_as_done, url)
+
+
+async def client_data_loop():
+    """"""
+
+    # every row of a chunk is finished before the next one is fetched,
+    # so rows still in flight are never fetched twice. A row may need a
+    # browser, so a chunk is as large as the pool: a bigger one only
+    # parks worker threads waiting on a checkout
+    chunk = int(os.getenv("CLIENT_DATA_CHUNK", "0")) or DRIVER_POOL.size
+    async with AsyncLLMClient() as client:
+        while True:
+            urls = await asyncio.to_thread(get_pending_client_data_rows, chunk)
+            if not urls:
+                print("No more enrich rows left to process")
+                break
+
+            await asyncio.gather(*[handler_client_data_async(x, client) for x in urls])
+        print("LLM client", client.summary())
+
+
+def client_data_executor():
+    """"""
 
-        page = get_page(url)
-        try:
-            response, attributes = entry_extract_attributes(page)
-            print(attributes)
-            update_row(url, attributes)
-        except Exception as e:
-            print("Unable to extract attributes: ", type(e).__name__, e)
-            update_row_as_done(url)
+    try:
+        asyncio.run(client_data_loop())
+    finally:
+        # don't hold the browsers open between scheduled runs
+        DRIVER_POOL.reset()
+        print("Extraction sources", EXTRACTION_STATS.summary())
+        print("Extraction cache", get_extraction_cache().summary())
 
 
 def hire_history_executor():
@@ -44,6 +44,46 @@ def get_pending_client_data_row() -> str | None:
     return rows[0]["link"]
 
 
+def get_pending_client_data_rows(limit: int) -> list[str] | None:
+    """
+    ### Description:
+        - Fetches several pending rows that have not yet been
+          augmented with client data, for batch extraction.
+
+    ### Args:
+        - `limit`: int
+            Maximum number of rows to fetch.
+
+    ### Returns:
+        - `list[str] | None`
+            The URL links of the fetched rows, or None if no rows
+            are available.
+    """
+
+    print(f"Getting up to {limit} rows to enrich client data")
+
+    url = os.getenv("POSTGREST_URL") + "/upwork_filtered_jobs"
+
+    querystring = {
+        "did_augment_client_data": "eq.false",
+        "select": "link",
+        "limit": limit,
+    }
+
+    headers = {
+        "apikey": os.getenv("SUPABASE_CLIENT_ANON_KEY"),
+        "Authorization": f"Bearer {os.getenv('SUPABASE_CLIENT_ANON_KEY')}",
+        "Content-Type": "application/json",
+    }
+
+    response = httpx.get(url, headers=headers, params=querystring)
+
+    rows = response.json()
+    if not rows:
+        return None
+    return [x["link"] for x in rows]
+
+
 def get_pending_hire_history_row(limit: int = 1) -> list[str] | None:
     """"""
 
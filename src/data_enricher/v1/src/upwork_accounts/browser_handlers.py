@@ -1,68 +1,168 @@
-import time
+import atexit
+import hashlib
+import os
+import threading
 
 from bs4 import BeautifulSoup
+from pydantic import BaseModel
 from rich import print
+from selenium.webdriver import Chrome
 
 
 from src.upwork_accounts.browser_worker import (
     save_cookies,
-    get_cookies,
-    get_driver,
     login,
     restart_session,
 )
+from src.upwork_accounts.driver_pool import DriverPool
+from src.upwork_accounts.page_waits import wait_for_page
 
+DRIVER_POOL = DriverPool()
+atexit.register(DRIVER_POOL.reset)
+SESSION_RESET_LOCK = threading.Lock()
 
-def get_page(url: str) -> str | None:
+
+class RenderedPage(BaseModel):
+    """A loaded page's text, source and the Nuxt state it was rendered from"""
+
+    text: str
+    html: str | None = None
+    nuxt_state: dict | None = None
+
+
+def save_to_corpus(url: str, source: str):
+    """
+    ### Description:
+        - Keeps a copy of the page in `PAGE_CORPUS_DIR`, if set, for
+          learning boilerplate and benchmarking the text reduction.
+    """
+
+    folder = os.getenv("PAGE_CORPUS_DIR")
+    if not folder:
+        return
+    try:
+        os.makedirs(folder, exist_ok=True)
+        name = hashlib.sha1(url.encode()).hexdigest()[:16] + ".html"
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as wf:
+            wf.write(source)
+    except OSError as e:
+        print("Unable to save page to corpus", type(e).__name__, e)
+
+
+def get_nuxt_state(driver: Chrome) -> dict | None:
+    """
+    ### Description:
+        - Reads `window.__NUXT__` from the loaded page. The browser has
+          already evaluated it, so this works for the function wrapped
+          state Nuxt inlines as well.
+    """
+
+    try:
+        state = driver.execute_script("return window.__NUXT__ || null")
+    except Exception as e:
+        print("Unable to read Nuxt state", type(e).__name__, e)
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def reset_session(pool: DriverPool, generation: int) -> bool:
+    """
+    ### Description:
+        - Logs in again and resets the pool, once per bad stretch.
+          Pages render concurrently, so several of them can give up on
+          the session together. The first one resets it, the others
+          see the pool generation moved on and skip.
+
+    ### Args:
+        - `pool`: DriverPool
+            The pool the failing page borrowed from.
+        - `generation`: int
+            The pool generation the page started on.
+
+    ### Returns:
+        - `bool`
+            True if this call did the reset.
+    """
+
+    with SESSION_RESET_LOCK:
+        if pool.generation != generation:
+            print("Session was already reset by another page")
+            return False
+        restart_session()
+        pool.reset()
+        return True
+
+
+def render_page(
+    url: str, pool: DriverPool = DRIVER_POOL, kind: str = "job"
+) -> RenderedPage | None:
     """
     ### Description:
         - Loads a webpage using Selenium and returns the text
-          content of the page.
-        - Automatically refreshes the page with saved cookies.
+          content of the page along with its Nuxt state.
+        - Borrows an already logged in browser from the pool instead
+          of launching one, so there is no cold start or cookie setup
+          per page.
+        - Waits until the page is ready rather than a fixed time.
 
     ### Args:
         - `url`: str
             The URL of the page to load.
+        - `pool`: DriverPool
+            The pool to borrow the browser from.
+        - `kind`: str
+            The page type, which decides when the page is ready.
 
     ### Returns:
-        - `str | None`
-            The text content of the page, or None if the page
-            could not be loaded.
+        - `RenderedPage | None`
+            The text content and Nuxt state of the page, or None if
+            the page could not be loaded.
     """
 
+    generation = pool.generation
     session_reset = False
     retries = 0
     while retries < 10:
         if retries > 5 and not session_reset:
-            restart_session()
+            reset_session(pool, generation)
             session_reset = True
 
         print(f"Getting page {url}")
         try:
-            driver = get_driver()
-            driver.get(url)
-
-            cookies = get_cookies()
-            for i in cookies:
-                driver.add_cookie(i)
-            driver.refresh()
-            time.sleep(10)
+            with pool.driver() as driver:
+                driver.get(url)
+                wait_for_page(driver, kind)
 
-            source = driver.page_source
-            save_cookies(driver.get_cookies())
-            driver.quit()
+                source = driver.page_source
+                nuxt_state = get_nuxt_state(driver)
+                save_cookies(driver.get_cookies())
 
+            save_to_corpus(url, source)
             soup = BeautifulSoup(source, "html.parser")
-            return soup.get_text(separator="\n")
+            return RenderedPage(
+                text=soup.get_text(separator="\n"), html=source, nuxt_state=nuxt_state
+            )
         except Exception as e:
-            try:
-                driver.quit()
-            except:
-                pass
             print("Error when getting page", type(e).__name__, e)
             retries += 1
 
 
+def get_page(url: str, pool: DriverPool = DRIVER_POOL, kind: str = "job") -> str | None:
+    """
+    ### Description:
+        - Loads a webpage using Selenium and returns the text
+          content of the page.
+
+    ### Returns:
+        - `str | None`
+            The text content of the page, or None if the page
+            could not be loaded.
+    """
+
+    page = render_page(url, pool, kind)
+    return page.text if page else None
+
+
 def do_login():
     """"""
 
@@ -71,6 +171,8 @@ def do_login():
         print("Trying to login to account")
         try:
             login()
+            # pooled browsers still carry the old session
+            DRIVER_POOL.reset()
             break
         except Exception as e:
             print("Error when logging in", type(e).__name__, e)
@@ -8,7 +8,6 @@
 
 import os
 import json
-import time
 from pathlib import Path
 from contextlib import contextmanager
 import shutil
@@ -28,6 +27,7 @@ cwdtoenv()
 load_dotenv()
 
 from src.errors.common_errors import NotLoggedIn
+from src.upwork_accounts.page_waits import wait_for_page
 
 
 SELENIUM_CACHE_FOLDER = Path(Path.cwd(), "src", "upwork_accounts", "temp", "chrome")
@@ -89,8 +89,11 @@ def save_cookies(cookies: list[dict]):
 
 
 @timeit()
-def get_driver() -> Chrome:
-    """"""
+def get_driver(user_data_dir: Path = SELENIUM_CACHE_FOLDER) -> Chrome:
+    """
+    ### Description:
+        - Launches undetected Chrome with the given profile folder.
+    """
 
     options = uc.ChromeOptions()
     options.add_argument("--disable-gpu")
@@ -103,7 +106,7 @@ def get_driver() -> Chrome:
 
     driver = uc.Chrome(
         options=options,
-        user_data_dir=SELENIUM_CACHE_FOLDER,
+        user_data_dir=user_data_dir,
         headless=False,
         use_subprocess=False,
     )
@@ -180,11 +183,11 @@ def login(driver: Chrome | None = None):
         except NoSuchElementException:
             print("Already logged in")
             driver.get("https://www.upwork.com/nx/search/jobs/?nbs=1&q=backend")
+            wait_for_page(driver, "search")
 
             # save session cookies
             save_cookies(driver.get_cookies())
 
-            time.sleep(10)
             if not no_close:
                 driver.quit()
             return
@@ -210,14 +213,14 @@ def login(driver: Chrome | None = None):
             By.CSS_SELECTOR, "button#login_control_continue"
         )
         continue_btn.click()
-        time.sleep(10)
+        wait_for_page(driver, "logged_in")
 
         driver.get("https://www.upwork.com/nx/search/jobs/?nbs=1&q=backend")
+        wait_for_page(driver, "search")
 
         # save session cookies
         save_cookies(driver.get_cookies())
 
-        time.sleep(10)
         if not no_close:
             driver.quit()
     except Exception as e:
@@ -233,7 +236,7 @@ def restart_session():
     """"""
 
     print("Restarting Session")
-    shutil.rmtree(SELENIUM_CACHE_FOLDER)
+    shutil.rmtree(SELENIUM_CACHE_FOLDER, ignore_errors=True)
 
     login()
 
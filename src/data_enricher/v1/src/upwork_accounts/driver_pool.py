@@ -0,0 +1,230 @@
+"""
+### Description:
+    - Keeps a few authenticated Chrome drivers alive between pages,
+      so loading a page doesn't pay for a browser cold start and the
+      cookie setup every time.
+    - Drivers are borrowed with `DriverPool.driver()` and returned when
+      the block exits. A driver is recycled after `max_pages` pages,
+      when it crashes or fails a health check, and after a re-login.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+from rich import print
+from selenium.webdriver import Chrome
+
+from src.upwork_accounts.browser_worker import (
+    SELENIUM_CACHE_FOLDER,
+    get_cookies,
+    get_driver,
+)
+
+
+class PooledDriver:
+    """
+    ### Description:
+        - A driver owned by the pool, with what it needs to decide
+          when to recycle it.
+    """
+
+    def __init__(self, driver: Chrome, slot: int, generation: int) -> None:
+
+        self.driver = driver
+        self.slot = slot
+        self.generation = generation
+        self.pages = 0
+        self.created_at = time.monotonic()
+
+
+def authenticate(driver: Chrome):
+    """
+    ### Description:
+        - Loads Upwork once and injects the saved session cookies, so
+          every page the driver loads afterwards is logged in.
+
+    ### Raises:
+        - `NotLoggedIn`:
+            If there are no saved cookies.
+    """
+
+    driver.get("https://www.upwork.com/")
+    for i in get_cookies():
+        driver.add_cookie(i)
+
+
+def is_healthy(driver: Chrome) -> bool:
+    """Whether the browser still answers commands"""
+
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+
+def quit_driver(driver: Chrome):
+    """Quits a driver, ignoring errors from a browser that is already gone"""
+
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class DriverPool:
+    """
+    ### Description:
+        - Thread safe pool of up to `size` long-lived drivers.
+        - Each slot has its own Chrome profile folder, since two
+          browsers can't share one.
+
+    ### Args:
+        - `size`: int
+            Maximum number of drivers alive at once.
+        - `max_pages`: int
+            Pages a driver serves before it is recycled.
+        - `factory`: Callable[[Path], Chrome]
+            Launches a driver with the given profile folder.
+        - `warm_up`: Callable[[Chrome], None]
+            Prepares a fresh driver before its first page.
+    """
+
+    def __init__(
+        self,
+        size: int | None = None,
+        max_pages: int | None = None,
+        factory: Callable[[Path], Chrome] = get_driver,
+        warm_up: Callable[[Chrome], None] = authenticate,
+    ) -> None:
+
+        self.size = size or int(os.getenv("BROWSER_POOL_SIZE", "4"))
+        self.max_pages = max_pages or int(os.getenv("BROWSER_MAX_PAGES", "100"))
+        self.factory = factory
+        self.warm_up = warm_up
+        self.condition = threading.Condition()
+        self.idle: list[PooledDriver] = []
+        self.free_slots = list(range(self.size))
+        self.generation = 0
+
+    def profile_folder(self, slot: int) -> Path:
+        return SELENIUM_CACHE_FOLDER.with_name(f"chrome_pool_{slot}")
+
+    def launch(self, slot: int, generation: int) -> PooledDriver:
+        """Starts and warms up a driver for a slot"""
+
+        print("Launching pooled browser", slot)
+        driver = self.factory(self.profile_folder(slot))
+        try:
+            self.warm_up(driver)
+        except Exception:
+            quit_driver(driver)
+            raise
+        return PooledDriver(driver, slot, generation)
+
+    def discard(self, pooled: PooledDriver):
+        """Quits a driver and frees its slot"""
+
+        quit_driver(pooled.driver)
+        with self.condition:
+            self.free_slots.append(pooled.slot)
+            self.condition.notify()
+
+    def checkout(self, timeout: float | None = None) -> PooledDriver:
+        """
+        ### Description:
+            - Borrows a healthy idle driver, or launches one if a slot
+              is free. Otherwise waits for a driver to be returned.
+
+        ### Args:
+            - `timeout`: float | None
+                Seconds to wait for a driver. None waits forever.
+
+        ### Returns:
+            - `PooledDriver`
+                The borrowed driver.
+
+        ### Raises:
+            - `TimeoutError`:
+                If no driver became available in time.
+        """
+
+        while True:
+            with self.condition:
+                if not self.condition.wait_for(
+                    lambda: self.idle or self.free_slots, timeout
+                ):
+                    raise TimeoutError("No browser available in the pool")
+                if self.idle:
+                    pooled, slot = self.idle.pop(), None
+                else:
+                    pooled, slot = None, self.free_slots.pop()
+                generation = self.generation
+
+            if pooled is None:
+                try:
+                    return self.launch(slot, generation)
+                except Exception:
+                    with self.condition:
+                        self.free_slots.append(slot)
+                        self.condition.notify()
+                    raise
+
+            if is_healthy(pooled.driver):
+                return pooled
+            print("Pooled browser is unresponsive. Recycling it", pooled.slot)
+            self.discard(pooled)
+
+    def checkin(self, pooled: PooledDriver, healthy: bool = True):
+        """
+        ### Description:
+            - Returns a borrowed driver. It is recycled instead if it
+              failed, served `max_pages` pages or predates a reset.
+        """
+
+        pooled.pages += 1
+        with self.condition:
+            keep = (
+                healthy
+                and pooled.pages < self.max_pages
+                and pooled.generation == self.generation
+            )
+            if keep:
+                self.idle.append(pooled)
+                self.condition.notify()
+                return
+        self.discard(pooled)
+
+    @contextmanager
+    def driver(self, timeout: float | None = None):
+        """
+        ### Description:
+            - Borrows a driver for the duration of the block. A driver
+              whose block raised is recycled.
+        """
+
+        pooled = self.checkout(timeout)
+        try:
+            yield pooled.driver
+        except Exception:
+            self.checkin(pooled, healthy=False)
+            raise
+        self.checkin(pooled)
+
+    def reset(self):
+        """
+        ### Description:
+            - Quits every idle driver. Borrowed drivers are recycled
+              when they are returned, so the next pages start with the
+              current cookies, e.g. after a re-login.
+        """
+
+        with self.condition:
+            self.generation += 1
+            idle, self.idle = self.idle, []
+        for pooled in idle:
+            self.discard(pooled)
@@ -0,0 +1,166 @@
+"""
+### Description:
+    - Waits until a page is actually ready instead of sleeping a fixed
+      amount of time after every navigation.
+    - Each page type has its own readiness conditions: the document
+      finished loading, no new network requests for a while, one of
+      a set of selectors is present, the url left a page, or the JSON
+      `<pre>` of an api page can be parsed.
+    - A wait that times out is logged and the caller carries on, as it
+      did after the fixed sleep, so the timeout is the worst case.
+"""
+
+import json
+import os
+import time
+
+from pydantic import BaseModel
+from rich import print
+from selenium.webdriver import Chrome
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+# number of resources the current document requested so far
+RESOURCE_COUNT_JS = "return performance.getEntriesByType('resource').length"
+
+
+class PageReadiness(BaseModel):
+    """
+    ### Description:
+        - What makes a page of one type ready. All set conditions
+          must hold at the same time.
+    """
+
+    ready_state: bool = True
+    network_idle: float = 0
+    selectors: list[str] = []
+    url_excludes: list[str] = []
+    json_pre: bool = False
+    timeout: float = 10
+
+
+class WaitResult(BaseModel):
+    """How long a readiness wait took"""
+
+    kind: str
+    seconds: float
+    timed_out: bool
+
+
+PAGE_READINESS = {
+    "job": PageReadiness(
+        network_idle=0.5,
+        selectors=[
+            "[data-test='about-client-container']",
+            "[data-test='AboutClientUser']",
+            "[data-test='Description']",
+        ],
+    ),
+    "search": PageReadiness(
+        network_idle=0.5,
+        selectors=["[data-test='job-tile-list']", "article[data-test='JobTile']"],
+    ),
+    "logged_in": PageReadiness(url_excludes=["/account-security/login"]),
+    "api": PageReadiness(json_pre=True),
+}
+
+
+class ReadinessCheck:
+    """
+    ### Description:
+        - `WebDriverWait` condition for a `PageReadiness`. Keeps the
+          state the network idle check needs between polls.
+    """
+
+    def __init__(self, readiness: PageReadiness) -> None:
+
+        self.readiness = readiness
+        self.resources = -1
+        self.resources_changed_at = time.monotonic()
+
+    def network_is_idle(self, driver: Chrome) -> bool:
+
+        resources = driver.execute_script(RESOURCE_COUNT_JS)
+        now = time.monotonic()
+        if resources != self.resources:
+            self.resources = resources
+            self.resources_changed_at = now
+            return False
+        return now - self.resources_changed_at >= self.readiness.network_idle
+
+    def __call__(self, driver: Chrome) -> bool:
+
+        readiness = self.readiness
+        if readiness.url_excludes and any(
+            x in driver.current_url for x in readiness.url_excludes
+        ):
+            return False
+        if (
+            readiness.ready_state
+            and driver.execute_script("return document.readyState") != "complete"
+        ):
+            return False
+        if readiness.selectors and not any(
+            driver.find_elements(By.CSS_SELECTOR, x) for x in readiness.selectors
+        ):
+            return False
+        if readiness.json_pre:
+            pre = driver.find_elements(By.CSS_SELECTOR, "pre")
+            if not pre:
+                return False
+            try:
+                json.loads(pre[0].text)
+            except ValueError:
+                return False
+        if readiness.network_idle and not self.network_is_idle(driver):
+            return False
+        return True
+
+
+def wait_for_page(
+    driver: Chrome, kind: str, timeout: float | None = None
+) -> WaitResult:
+    """
+    ### Description:
+        - Blocks until the page loaded in `driver` is ready according
+          to the readiness conditions of its type, or the timeout runs
+          out.
+
+    ### Args:
+        - `driver`: Chrome
+            The driver that just navigated or submitted a form.
+        - `kind`: str
+            The page type, a key of `PAGE_READINESS`.
+        - `timeout`: float | None
+            Overrides the page type's timeout. `PAGE_WAIT_TIMEOUT`
+            overrides every page type.
+
+    ### Returns:
+        - `WaitResult`
+            The measured wait, and whether it timed out.
+    """
+
+    readiness = PAGE_READINESS[kind]
+    timeout = timeout or float(os.getenv("PAGE_WAIT_TIMEOUT", readiness.timeout))
+
+    start = time.monotonic()
+    timed_out = False
+    try:
+        WebDriverWait(
+            driver,
+            timeout,
+            poll_frequency=0.1,
+            ignored_exceptions=(WebDriverException,),
+        ).until(ReadinessCheck(readiness))
+    except TimeoutException:
+        timed_out = True
+
+    result = WaitResult(
+        kind=kind, seconds=round(time.monotonic() - start, 3), timed_out=timed_out
+    )
+    if timed_out:
+        print("Page not ready in time", result)
+    else:
+        print("Page ready", result)
+    return result
@@ -0,0 +1,205 @@
+"""Tests for the async LLM client and its rate limit budget"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import IsolatedAsyncioTestCase, TestCase, main
+from unittest.mock import patch
+import json
+import os
+import tempfile
+import time
+
+import httpx
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from benchmarks.mock_openai import CANNED_ATTRIBUTES
+from src.attribute_extractor import async_extract
+from src.attribute_extractor.async_extract import (
+    AsyncLLMClient,
+    RateBudget,
+    parse_reset,
+)
+from src.attribute_extractor.extraction_cache import ExtractionCache
+from src.attribute_extractor.get_attributes import build_messages
+from src.models.genai_models import ValidLLMModels
+
+COMPLETION = {
+    "object": "chat.completion",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(CANNED_ATTRIBUTES)},
+        }
+    ],
+    "usage": {"prompt_tokens": 1500, "completion_tokens": 300},
+}
+
+
+class TestRateBudget(TestCase):
+
+    def test_parse_reset(self):
+
+        self.assertEqual(parse_reset("20ms"), 0.02)
+        self.assertEqual(parse_reset("1.5s"), 1.5)
+        self.assertEqual(parse_reset("6m0s"), 360)
+        self.assertEqual(parse_reset("1h2m"), 3720)
+        self.assertIsNone(parse_reset("soon"))
+        self.assertIsNone(parse_reset(None))
+
+    def test_headers_correct_the_budget(self):
+        """Limits, remaining counts and reset times follow the api"""
+
+        budget = RateBudget(rpm=500, tpm=200000)
+        headers = httpx.Headers(
+            {
+                "x-ratelimit-limit-requests": "60",
+                "x-ratelimit-remaining-requests": "7",
+                "x-ratelimit-reset-requests": "6m0s",
+                "x-ratelimit-remaining-tokens": "not a number",
+            }
+        )
+
+        budget.update(headers)
+
+        self.assertEqual(budget.limits["requests"], 60)
+        self.assertEqual(budget.remaining["requests"], 7)
+        self.assertEqual(budget.remaining["tokens"], 200000)
+        self.assertAlmostEqual(
+            budget.reset_at["requests"] - time.monotonic(), 360, delta=1
+        )
+
+    def test_refills_at_reset(self):
+
+        budget = RateBudget(rpm=10, tpm=1000)
+        budget.remaining = {"requests": 0, "tokens": 0}
+
+        budget.refill(budget.reset_at["requests"])
+
+        self.assertEqual(budget.remaining, {"requests": 10, "tokens": 1000})
+
+
+class TestRateBudgetAcquire(IsolatedAsyncioTestCase):
+
+    async def test_acquire_spends_the_budget(self):
+
+        budget = RateBudget(rpm=10, tpm=1000)
+
+        await budget.acquire(400)
+        self.assertEqual(budget.remaining, {"requests": 9, "tokens": 600})
+
+        # a request larger than the whole budget still goes through
+        large = RateBudget(rpm=10, tpm=1000)
+        await large.acquire(5000)
+        self.assertEqual(large.remaining, {"requests": 9, "tokens": 0})
+        self.assertEqual(budget.waits + large.waits, 0)
+
+    async def test_pause_holds_requests_back(self):
+
+        budget = RateBudget(rpm=10, tpm=1000)
+        budget.pause(0.1)
+
+        start = time.monotonic()
+        await budget.acquire(10)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(budget.waits, 1)
+
+
+class TestAsyncLLMClient(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.responses: list[httpx.Response] = []
+        self.requests: list[httpx.Request] = []
+        self.client = AsyncLLMClient(
+            max_in_flight=2,
+            budget=RateBudget(rpm=100, tpm=10**6),
+            base_url="http://llm.test/v1",
+            api_key="test",
+            max_retries=3,
+        )
+        # answer from the queued responses instead of the network
+        pooled = self.client.client
+        await pooled.aclose()
+        self.client.client = httpx.AsyncClient(
+            base_url=pooled.base_url,
+            headers=pooled.headers,
+            transport=httpx.MockTransport(self.handler),
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+
+        self.requests.append(request)
+        if len(self.responses) > 1:
+            return self.responses.pop(0)
+        return self.responses[0]
+
+    async def complete(self):
+
+        return await self.client.complete(
+            ValidLLMModels.OPENAI_GPT4o_MINI, build_messages("Build a Shopify sync")
+        )
+
+    async def test_retries_after_429(self):
+        """A 429 pauses the budget, then the request is sent again"""
+
+        self.responses = [
+            httpx.Response(429, headers={"retry-after-ms": "10"}, json={}),
+            httpx.Response(
+                200, headers={"x-ratelimit-remaining-requests": "42"}, json=COMPLETION
+            ),
+        ]
+
+        response = await self.complete()
+
+        self.assertEqual(response.input_tokens, 1500)
+        self.assertGreater(response.cost, 0)
+        self.assertEqual(self.client.summary()["requests"], 2)
+        self.assertEqual(self.client.summary()["refused"], 1)
+        self.assertEqual(self.client.budget.remaining["requests"], 42)
+        self.assertEqual(self.requests[0].url.path, "/v1/chat/completions")
+        self.assertEqual(self.requests[0].headers["Authorization"], "Bearer test")
+
+    async def test_gives_up_after_max_retries(self):
+
+        self.responses = [httpx.Response(503, headers={"retry-after-ms": "1"})]
+
+        with self.assertRaises(RuntimeError):
+            await self.complete()
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_api_error_is_not_retried(self):
+
+        self.responses = [
+            httpx.Response(200, json={"error": {"message": "invalid model"}})
+        ]
+
+        with self.assertRaisesRegex(RuntimeError, "invalid model"):
+            await self.complete()
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_extract_is_served_from_cache(self):
+        """The second extraction of a page costs no request"""
+
+        self.responses = [httpx.Response(200, json=COMPLETION)]
+        with tempfile.TemporaryDirectory() as folder:
+            cache = ExtractionCache(os.path.join(folder, "extractions.sqlite3"))
+            with patch.object(
+                async_extract, "get_extraction_cache", return_value=cache
+            ):
+                first = await self.client.extract("Build a Shopify sync")
+                second = await self.client.extract("Build  a Shopify sync\n")
+            cache.connection.close()
+
+        self.assertEqual(first[1], second[1])
+        self.assertEqual(second[0].cost, first[0].cost)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(cache.summary()["hits"], 1)
+
+
+if __name__ == "__main__":
+    main()
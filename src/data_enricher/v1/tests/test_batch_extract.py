@@ -0,0 +1,253 @@
+"""Tests for extraction through the OpenAI Batch API"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+# the database modules connect when they are imported, mocks stand in
+for name in (
+    "src.sqlalchemy.core_sqlalchemy",
+    "src.postgres.select_functions",
+    "src.postgres.update_functions",
+):
+    sys.modules.setdefault(name, Mock())
+
+from benchmarks.mock_openai import CANNED_ATTRIBUTES, MockConfig, MockOpenAI
+from src.attribute_extractor import batch_extract
+from src.attribute_extractor.batch_extract import (
+    BatchClient,
+    BatchJob,
+    backlog_executor,
+    build_request,
+    load_open_batches,
+    parse_output,
+    run_batch,
+)
+from src.attribute_extractor.extraction_cache import ExtractionCache
+from src.models.genai_models import BATCH_COST_DISCOUNT, ValidLLMModels
+from src.upwork_accounts.browser_handlers import RenderedPage
+
+MODEL = ValidLLMModels.OPENAI_GPT4o_MINI.value
+
+
+def output_line(custom_id: str, content: str, status_code: int = 200) -> str:
+    """One line of a batch output file"""
+
+    body = {
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": 200},
+    }
+    return json.dumps(
+        {
+            "custom_id": custom_id,
+            "response": {"status_code": status_code, "body": body},
+            "error": None,
+        }
+    )
+
+
+class TestParseOutput(TestCase):
+
+    def test_results_by_custom_id(self):
+        """Usable lines are parsed and priced, the others are None"""
+
+        content = "\n".join(
+            [
+                output_line("row-0", json.dumps(CANNED_ATTRIBUTES)),
+                output_line("row-1", '{"job": {}}'),
+                output_line("row-2", json.dumps(CANNED_ATTRIBUTES), 500),
+                json.dumps(
+                    {
+                        "custom_id": "row-3",
+                        "response": None,
+                        "error": {"code": "server_error"},
+                    }
+                ),
+                "",
+            ]
+        ).encode()
+
+        results = parse_output(content, MODEL)
+
+        self.assertEqual(list(results), ["row-0", "row-1", "row-2", "row-3"])
+        response, attributes = results["row-0"]
+        self.assertEqual(attributes.client.client_country, "United States")
+        regular = (1000 * 0.000000150) + (200 * 0.000000600)
+        self.assertAlmostEqual(response.cost, regular * BATCH_COST_DISCOUNT)
+        self.assertIsNone(results["row-1"])
+        self.assertIsNone(results["row-2"])
+        self.assertIsNone(results["row-3"])
+
+    def test_request_line(self):
+
+        line = build_request("row-7", "Build a Shopify sync", MODEL)
+
+        self.assertEqual(line["custom_id"], "row-7")
+        self.assertEqual(line["url"], "/v1/chat/completions")
+        self.assertEqual(line["body"]["model"], MODEL)
+        self.assertIn("Build a Shopify sync", line["body"]["messages"][-1]["content"])
+
+
+class TestRunBatch(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        folder = patch.object(batch_extract, "BATCH_FOLDER", Path(self.folder.name))
+        folder.start()
+        self.addCleanup(folder.stop)
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def run_against_mock(self, config: MockConfig) -> dict:
+
+        server = MockOpenAI(config)
+        server.start()
+        client = BatchClient(base_url=server.url, api_key="mock")
+        pages = {f"row-{x}": f"Job page {x}" for x in range(10)}
+        try:
+            return run_batch(pages, client, MODEL, poll_interval=0, timeout=10)
+        finally:
+            client.close()
+            server.stop()
+
+    def test_batch_round_trip(self):
+        """Pages go up as one file and come back by custom id"""
+
+        results = self.run_against_mock(MockConfig(polls=2))
+
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(results.values()))
+        # the request file is removed once it is uploaded
+        self.assertEqual(list(Path(self.folder.name).iterdir()), [])
+
+    def test_failed_requests_come_back_as_none(self):
+
+        results = self.run_against_mock(MockConfig(polls=0, error_rate=0.5, seed=3))
+
+        failed = [x for x, y in results.items() if y is None]
+        self.assertTrue(0 < len(failed) < 10)
+
+
+@patch.dict("os.environ", {"BATCH_POLL_INTERVAL": "0"})
+class TestBacklogExecutor(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        batches = Path(self.folder.name, "batches")
+        self.urls = [f"https://www.upwork.com/jobs/~0{x}" for x in range(4)]
+        self.pending = list(self.urls)
+        self.written: list[str] = []
+        self.done: list[str] = []
+        self.cache = ExtractionCache(os.path.join(self.folder.name, "cache.sqlite3"))
+        self.addCleanup(self.cache.connection.close)
+
+        for name, value in {
+            "BATCH_FOLDER": batches,
+            "OPEN_BATCH_FOLDER": Path(batches, "open"),
+            "get_pending_client_data_rows": self.get_pending,
+            "extract_without_llm": self.extract_without_llm,
+            "update_row": lambda url, attributes: self.written.append(url),
+            "update_row_as_done": self.done.append,
+            "get_extraction_cache": lambda: self.cache,
+        }.items():
+            patcher = patch.object(batch_extract, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.server = MockOpenAI(MockConfig(polls=3))
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.client = BatchClient(base_url=self.server.url, api_key="mock")
+        self.addCleanup(self.client.close)
+
+    def get_pending(self, count: int) -> list[str]:
+        """Rows stay pending until they are written or marked as done"""
+
+        finished = set(self.written) | set(self.done)
+        return [x for x in self.pending if x not in finished][:count]
+
+    def extract_without_llm(self, url: str):
+        return None, RenderedPage(text=f"Job page {url[-2:]}")
+
+    def test_timed_out_batch_is_resumed(self):
+        """A batch still running at the timeout is finished by the next run"""
+
+        with patch.dict("os.environ", {"BATCH_TIMEOUT": "0"}):
+            backlog_executor(10, self.client, sleep=lambda _: None)
+
+        self.assertEqual(self.written + self.done, [])
+        open_batches = load_open_batches()
+        self.assertEqual(len(open_batches), 1)
+        self.assertIn(open_batches[0].input_file_id, self.server.files)
+        self.assertEqual(sorted(open_batches[0].links.values()), self.urls)
+
+        backlog_executor(10, self.client, sleep=lambda _: None)
+
+        self.assertEqual(sorted(self.written), self.urls)
+        self.assertEqual(len(self.server.batches), 1)
+        self.assertEqual(load_open_batches(), [])
+
+    def test_unreadable_status_keeps_batch_open(self):
+
+        client = Mock(wraps=self.client)
+        client.get.side_effect = RuntimeError("Batch api error 502")
+
+        backlog_executor(10, client, sleep=lambda _: None)
+
+        self.assertEqual(self.written + self.done, [])
+        self.assertEqual(len(load_open_batches()), 1)
+
+    def test_failed_batch_leaves_rows_pending(self):
+        """A batch that failed as a whole extracted nothing, so no row is done"""
+
+        client = Mock(wraps=self.client)
+        client.get.side_effect = lambda batch_id: BatchJob(id=batch_id, status="failed")
+
+        backlog_executor(10, client, sleep=lambda _: None)
+
+        self.assertEqual(self.written + self.done, [])
+        self.assertEqual(load_open_batches(), [])
+        self.assertEqual(len(self.get_pending(10)), 4)
+
+    def test_only_reported_failures_are_done(self):
+        """Failed requests are done, expired ones stay pending"""
+
+        lines = [
+            output_line("row-0", json.dumps(CANNED_ATTRIBUTES)),
+            output_line("row-1", json.dumps(CANNED_ATTRIBUTES), 500),
+            json.dumps(
+                {
+                    "custom_id": "row-2",
+                    "response": None,
+                    "error": {"code": "batch_expired"},
+                }
+            ),
+        ]
+        files = {"out": "\n".join(lines[:2]).encode(), "err": lines[2].encode()}
+        client = Mock(wraps=self.client)
+        client.get.side_effect = lambda batch_id: BatchJob(
+            id=batch_id, status="expired", output_file_id="out", error_file_id="err"
+        )
+        client.download.side_effect = files.get
+
+        backlog_executor(10, client, sleep=lambda _: None)
+
+        self.assertEqual(self.written, self.urls[:1])
+        self.assertEqual(self.done, self.urls[1:2])
+        self.assertEqual(self.get_pending(10), self.urls[2:])
+
+
+if __name__ == "__main__":
+    main()
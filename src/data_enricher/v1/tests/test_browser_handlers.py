@@ -0,0 +1,59 @@
+"""Tests for the session reset of the browser pool"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from src.upwork_accounts import browser_handlers
+from src.upwork_accounts.browser_handlers import reset_session
+from src.upwork_accounts.driver_pool import DriverPool
+
+
+class FakeDriver:
+    """Stands in for Chrome"""
+
+    def execute_script(self, script: str):
+        return 1
+
+    def quit(self):
+        pass
+
+
+class TestSessionReset(TestCase):
+
+    def setUp(self) -> None:
+        self.pool = DriverPool(4, 100, lambda _: FakeDriver(), lambda _: None)
+        self.logins = 0
+        patcher = patch.object(browser_handlers, "restart_session", self.login)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self):
+        self.logins += 1
+
+    def test_reset_is_single_flight(self):
+        """Pages giving up together log in again only once"""
+
+        barrier = threading.Barrier(4)
+
+        def give_up(_):
+            barrier.wait()
+            return reset_session(self.pool, 0)
+
+        with ThreadPoolExecutor(max_workers=4) as tpe:
+            resets = list(tpe.map(give_up, range(4)))
+
+        self.assertEqual(resets.count(True), 1)
+        self.assertEqual(self.logins, 1)
+        self.assertEqual(self.pool.generation, 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Tests for the one extraction path of the client data run"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import IsolatedAsyncioTestCase, TestCase, main
+from unittest.mock import AsyncMock, Mock, patch
+import sys
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+# the database modules connect when they are imported, mocks stand in
+for name in (
+    "src.sqlalchemy.core_sqlalchemy",
+    "src.postgres.select_functions",
+    "src.postgres.update_functions",
+):
+    sys.modules.setdefault(name, Mock())
+
+from benchmarks.mock_openai import CANNED_ATTRIBUTES
+from src.attribute_extractor import direct_extract
+from src.attribute_extractor.direct_extract import (
+    ExtractionStats,
+    attributes_from_details,
+    entry_extract_posting_async,
+    extract_without_llm,
+    find_details,
+)
+from src.models.upwork_models import PostingAttributes
+from src.upwork_accounts.browser_handlers import RenderedPage
+
+URL = "https://www.upwork.com/jobs/~01ca8dd0ca558e3386"
+DETAILS = {
+    "job": {
+        "title": "Build a Shopify sync",
+        "description": "Sync our stock levels",
+        "type": "HOURLY",
+        "extendedBudgetInfo": {"hourlyBudgetMin": 25, "hourlyBudgetMax": 45.5},
+        "engagementDuration": {"weeks": 13},
+        "clientActivity": {"totalApplicants": 12, "invitationsSent": 3},
+    },
+    "buyer": {
+        "location": {"country": "United States", "city": "Austin"},
+        "company": {"contractDate": "2019-04-01T00:00:00.000Z"},
+        "jobs": {"postedCount": 20, "openCount": 2},
+        "stats": {"totalCharges": {"amount": 15000.7}, "totalJobsWithHires": 15},
+    },
+}
+
+
+class TestJobDetails(TestCase):
+
+    def test_details_found_anywhere_in_the_state(self):
+        """The job details are found whatever the store layout"""
+
+        state = {"config": {}, "state": {"jobDetails": [{"other": 1}, DETAILS]}}
+
+        self.assertIs(find_details(state), DETAILS)
+        self.assertIsNone(find_details({"state": {"job": {}}}))
+        self.assertIsNone(find_details(state, depth=2))
+
+    def test_details_map_to_attributes(self):
+
+        attributes = attributes_from_details(DETAILS, URL)
+
+        self.assertEqual(str(attributes.job.url), URL)
+        self.assertTrue(attributes.job.is_hourly)
+        self.assertEqual(
+            (attributes.job.hourly_low, attributes.job.hourly_high), (25, 45)
+        )
+        self.assertEqual(attributes.job.duration_months, 3)
+        self.assertEqual(attributes.job.proposals, 12)
+        self.assertEqual(attributes.client.client_country, "United States")
+        self.assertEqual(attributes.client.client_hire_rate, 75)
+        self.assertEqual(attributes.client.client_total_spent_usd, 15000)
+
+    def test_incomplete_details_are_skipped(self):
+
+        self.assertIsNone(attributes_from_details({"job": {}, "buyer": {}}, URL))
+
+
+class TestExtractWithoutLLM(TestCase):
+
+    def setUp(self) -> None:
+        self.stats = ExtractionStats()
+
+    def extract(self, api_details: dict | None, page: RenderedPage | None):
+
+        with patch.object(
+            direct_extract, "get_api_details", return_value=api_details
+        ), patch.object(direct_extract, "render_page", return_value=page) as render:
+            result = extract_without_llm(URL, self.stats)
+        return result, render
+
+    def test_api_needs_no_browser(self):
+
+        (attributes, page), render = self.extract(DETAILS, None)
+
+        self.assertEqual(attributes.job.title, "Build a Shopify sync")
+        self.assertIsNone(page)
+        render.assert_not_called()
+        self.assertEqual(self.stats.counts, {"api": 1})
+
+    def test_nuxt_state_of_the_page(self):
+
+        page = RenderedPage(text="Build a Shopify sync", nuxt_state={"data": [DETAILS]})
+
+        (attributes, rendered), _ = self.extract(None, page)
+
+        self.assertEqual(attributes.client.client_city, "Austin")
+        self.assertIs(rendered, page)
+        self.assertEqual(self.stats.counts, {"nuxt": 1})
+
+    def test_unknown_page_is_left_to_the_llm(self):
+        """Without usable JSON the page comes back for the LLM"""
+
+        page = RenderedPage(text="Build a Shopify sync", nuxt_state={"job": {}})
+
+        (attributes, rendered), _ = self.extract({"job": {}, "buyer": {}}, page)
+
+        self.assertIsNone(attributes)
+        self.assertIs(rendered, page)
+        self.assertEqual(self.stats.counts, {})
+
+
+class TestEntryExtractPosting(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.stats = ExtractionStats()
+        self.attributes = PostingAttributes(**CANNED_ATTRIBUTES)
+        self.client = Mock(extract=AsyncMock(return_value=None))
+
+    async def extract(self, without_llm: tuple):
+
+        with patch.object(
+            direct_extract, "extract_without_llm", return_value=without_llm
+        ):
+            return await entry_extract_posting_async(URL, self.client, self.stats)
+
+    async def test_json_sources_skip_the_llm(self):
+
+        response, attributes = await self.extract((self.attributes, None))
+
+        self.assertIsNone(response)
+        self.assertIs(attributes, self.attributes)
+        self.client.extract.assert_not_called()
+
+    async def test_page_goes_to_the_llm(self):
+
+        llm_response = Mock()
+        self.client.extract.return_value = (llm_response, self.attributes)
+
+        result = await self.extract((None, RenderedPage(text="Build a sync")))
+
+        self.assertEqual(result, (llm_response, self.attributes))
+        self.client.extract.assert_awaited_once_with("Build a sync")
+        self.assertEqual(self.stats.counts, {"llm": 1})
+
+    async def test_nothing_extracted_raises(self):
+
+        with self.assertRaises(RuntimeError):
+            await self.extract((None, RenderedPage(text="Build a sync")))
+        with self.assertRaises(RuntimeError):
+            await self.extract((None, None))
+        self.assertEqual(self.stats.counts, {"failed": 2})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Tests for the pool of long-lived browsers"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import Mock
+from pathlib import Path
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from src.upwork_accounts.driver_pool import DriverPool
+
+
+class FakeDriver:
+    """Stands in for Chrome: answers scripts until it is broken or quit"""
+
+    def __init__(self, profile: Path) -> None:
+        self.profile = profile
+        self.broken = False
+        self.quit_calls = 0
+
+    def execute_script(self, script: str):
+        if self.broken:
+            raise RuntimeError("browser is gone")
+        return 1
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class TestDriverPool(TestCase):
+
+    def setUp(self) -> None:
+        self.launched: list[FakeDriver] = []
+        self.warm_up = Mock()
+
+    def factory(self, profile: Path) -> FakeDriver:
+
+        driver = FakeDriver(profile)
+        self.launched.append(driver)
+        return driver
+
+    def make_pool(self, size: int = 2, max_pages: int = 100) -> DriverPool:
+
+        return DriverPool(size, max_pages, self.factory, self.warm_up)
+
+    def test_checked_in_driver_is_reused(self):
+        """A returned driver serves the next page, no new launch"""
+
+        pool = self.make_pool()
+
+        with pool.driver() as first:
+            pass
+        with pool.driver() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.launched), 1)
+        self.warm_up.assert_called_once_with(first)
+
+    def test_slots_get_their_own_profile(self):
+
+        pool = self.make_pool()
+
+        first, second = pool.checkout(), pool.checkout()
+
+        self.assertNotEqual(first.slot, second.slot)
+        self.assertNotEqual(first.driver.profile, second.driver.profile)
+
+    def test_full_pool_times_out(self):
+
+        pool = self.make_pool(size=1)
+        pool.checkout()
+
+        with self.assertRaises(TimeoutError):
+            pool.checkout(timeout=0.01)
+
+    def test_recycled_after_max_pages(self):
+        """A driver is quit once it served `max_pages` pages"""
+
+        pool = self.make_pool(size=1, max_pages=2)
+
+        for _ in range(3):
+            with pool.driver():
+                pass
+
+        self.assertEqual(len(self.launched), 2)
+        self.assertEqual(self.launched[0].quit_calls, 1)
+        self.assertEqual(self.launched[1].quit_calls, 0)
+
+    def test_failed_block_recycles_driver(self):
+
+        pool = self.make_pool(size=1)
+
+        with self.assertRaises(ValueError):
+            with pool.driver():
+                raise ValueError("page broke")
+        with pool.driver() as driver:
+            pass
+
+        self.assertIs(driver, self.launched[1])
+        self.assertEqual(self.launched[0].quit_calls, 1)
+
+    def test_unresponsive_driver_is_replaced(self):
+        """An idle driver that stopped answering isn't handed out"""
+
+        pool = self.make_pool(size=1)
+        with pool.driver() as driver:
+            pass
+        driver.broken = True
+
+        with pool.driver() as replacement:
+            pass
+
+        self.assertIsNot(replacement, driver)
+        self.assertEqual(driver.quit_calls, 1)
+
+    def test_failed_warm_up_frees_the_slot(self):
+
+        pool = self.make_pool(size=1)
+        self.warm_up.side_effect = [RuntimeError("no cookies"), None]
+
+        with self.assertRaises(RuntimeError):
+            pool.checkout(timeout=0.01)
+        pool.checkout(timeout=0.01)
+
+        self.assertEqual(self.launched[0].quit_calls, 1)
+
+    def test_reset_quits_idle_and_recycles_borrowed(self):
+        """After a reset no driver from before it serves another page"""
+
+        pool = self.make_pool()
+        idle, borrowed = pool.checkout(), pool.checkout()
+        pool.checkin(idle)
+
+        pool.reset()
+        self.assertEqual(idle.driver.quit_calls, 1)
+        self.assertEqual(borrowed.driver.quit_calls, 0)
+
+        pool.checkin(borrowed)
+        self.assertEqual(borrowed.driver.quit_calls, 1)
+        with pool.driver() as driver:
+            pass
+        self.assertIs(driver, self.launched[-1])
+        self.assertEqual(len(self.launched), 3)
+
+
+if __name__ == "__main__":
+    main()
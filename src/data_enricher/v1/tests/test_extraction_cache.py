@@ -0,0 +1,108 @@
+"""Tests for the cache of LLM extractions"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from benchmarks.mock_openai import CANNED_ATTRIBUTES
+from src.attribute_extractor import extraction_cache
+from src.attribute_extractor.extraction_cache import (
+    ExtractionCache,
+    cache_key,
+    get_extraction_cache,
+)
+from src.models.genai_models import AIResponse
+from src.models.upwork_models import PostingAttributes
+
+
+def make_extraction(cost: float = 0.01) -> tuple[AIResponse, PostingAttributes]:
+
+    response = AIResponse.model_construct(
+        text="{}", input_tokens=1500, output_tokens=300, cost=cost
+    )
+    return response, PostingAttributes(**CANNED_ATTRIBUTES)
+
+
+class TestExtractionCache(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "extractions.sqlite3")
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_miss_then_hit(self):
+        """A stored extraction comes back with its original cost"""
+
+        cache = ExtractionCache(self.path, max_size=10)
+        key = cache_key("Build a Shopify sync", "gpt-4o-mini")
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, *make_extraction(cost=0.02))
+        response, attributes = cache.get(key)
+
+        self.assertEqual(response.cost, 0.02)
+        self.assertEqual(attributes.job.title, CANNED_ATTRIBUTES["job"]["title"])
+        self.assertEqual(cache.summary(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_survives_a_restart(self):
+
+        key = cache_key("page", "gpt-4o-mini")
+        ExtractionCache(self.path).put(key, *make_extraction())
+
+        self.assertIsNotNone(ExtractionCache(self.path).get(key))
+
+    def test_key_ignores_layout_only(self):
+        """Whitespace differences hit, another model or page misses"""
+
+        key = cache_key("Budget:  $25\n\n  Hourly ", "gpt-4o-mini")
+
+        self.assertEqual(key, cache_key("Budget: $25\nHourly", "gpt-4o-mini"))
+        self.assertNotEqual(key, cache_key("Budget: $25\nHourly", "gpt-4o"))
+        self.assertNotEqual(key, cache_key("Budget: $30\nHourly", "gpt-4o-mini"))
+
+    def test_least_recently_used_is_evicted(self):
+
+        cache = ExtractionCache(self.path, max_size=2)
+        keys = [cache_key(f"page {x}", "gpt-4o-mini") for x in range(3)]
+
+        with patch.object(extraction_cache.time, "time", side_effect=range(100)):
+            cache.put(keys[0], *make_extraction())
+            cache.put(keys[1], *make_extraction())
+            cache.get(keys[0])
+            cache.put(keys[2], *make_extraction())
+
+            self.assertIsNotNone(cache.get(keys[0]))
+            self.assertIsNone(cache.get(keys[1]))
+            self.assertIsNotNone(cache.get(keys[2]))
+
+    def test_unusable_path_disables_cache(self):
+
+        cache = ExtractionCache(self.folder.name, max_size=2)
+        key = cache_key("page", "gpt-4o-mini")
+
+        cache.put(key, *make_extraction())
+        self.assertIsNone(cache.get(key))
+
+    @patch.object(extraction_cache, "EXTRACTION_CACHE", None)
+    def test_threads_share_one_cache(self):
+        """Threads asking for the cache at once all get the same one"""
+
+        with patch.dict("os.environ", {"EXTRACTION_CACHE_PATH": self.path}):
+            with ThreadPoolExecutor(max_workers=8) as tpe:
+                caches = list(tpe.map(lambda _: get_extraction_cache(), range(32)))
+
+        self.assertEqual(len({id(x) for x in caches}), 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Tests for the page readiness waits"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from src.upwork_accounts import page_waits
+from src.upwork_accounts.page_waits import (
+    PAGE_READINESS,
+    PageReadiness,
+    ReadinessCheck,
+)
+
+
+class FakeElement:
+
+    def __init__(self, text: str = "") -> None:
+        self.text = text
+
+
+class FakeDriver:
+    """Answers the readiness scripts from plain attributes"""
+
+    def __init__(self) -> None:
+        self.ready_state = "complete"
+        self.resources = 10
+        self.current_url = "https://www.upwork.com/jobs/~01"
+        self.elements: list[FakeElement] = []
+
+    def execute_script(self, script: str):
+        if script == page_waits.RESOURCE_COUNT_JS:
+            return self.resources
+        return self.ready_state
+
+    def find_elements(self, by, selector: str) -> list[FakeElement]:
+        return self.elements
+
+
+class TestReadinessCheck(TestCase):
+
+    def setUp(self) -> None:
+        self.driver = FakeDriver()
+
+    def test_waits_for_document_and_selector(self):
+        """A job page is ready once it loaded and a section shows up"""
+
+        check = ReadinessCheck(
+            PAGE_READINESS["job"].model_copy(update={"network_idle": 0})
+        )
+        self.driver.ready_state = "interactive"
+        self.assertFalse(check(self.driver))
+
+        self.driver.ready_state = "complete"
+        self.assertFalse(check(self.driver))
+
+        self.driver.elements = [FakeElement()]
+        self.assertTrue(check(self.driver))
+
+    def test_network_must_stay_idle(self):
+        """New requests restart the idle window"""
+
+        check = ReadinessCheck(PageReadiness(network_idle=0.5))
+
+        with patch.object(page_waits.time, "monotonic", side_effect=[0, 0.4, 0.5, 1.1]):
+            self.assertFalse(check(self.driver))
+            self.assertFalse(check(self.driver))
+            self.driver.resources = 12
+            self.assertFalse(check(self.driver))
+            self.assertTrue(check(self.driver))
+
+    def test_login_waits_to_leave_the_login_page(self):
+
+        check = ReadinessCheck(PAGE_READINESS["logged_in"])
+        self.driver.current_url = "https://www.upwork.com/ab/account-security/login"
+        self.assertFalse(check(self.driver))
+
+        self.driver.current_url = "https://www.upwork.com/nx/find-work/"
+        self.assertTrue(check(self.driver))
+
+    def test_api_page_needs_parsable_json(self):
+
+        check = ReadinessCheck(PAGE_READINESS["api"])
+        self.assertFalse(check(self.driver))
+
+        self.driver.elements = [FakeElement('{"job": ')]
+        self.assertFalse(check(self.driver))
+
+        self.driver.elements = [FakeElement('{"job": {}}')]
+        self.assertTrue(check(self.driver))
+
+
+if __name__ == "__main__":
+    main()
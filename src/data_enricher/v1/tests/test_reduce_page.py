@@ -0,0 +1,101 @@
+"""Tests for the page text reduction before LLM extraction"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+import os
+import tempfile
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from benchmarks.bench_reduction import PAGES
+from src.attribute_extractor.reduce_page import (
+    Boilerplate,
+    count_tokens,
+    full_text,
+    load_corpus,
+    reduce_page,
+)
+
+BANNER = "Upwork is the world's work marketplace, find talent for any project"
+
+
+def make_page(title: str, body: str) -> str:
+    """A job page with the sections we keep and the noise around them"""
+
+    return f"""
+    <html><body>
+      <nav>Find work  Messages  Reports</nav>
+      <header><h4>{title}</h4></header>
+      <script>window.__NUXT__ = {{}}</script>
+      <section data-test="Description">
+        <p>{body}</p>
+        <p>{BANNER}</p>
+      </section>
+      <section data-test="about-client-container">
+        <span>United States</span>
+        <span>14 jobs posted</span>
+      </section>
+      <footer>© 2015 - 2024 Upwork® Global Inc.</footer>
+    </body></html>
+    """
+
+
+class TestReducePage(TestCase):
+
+    def test_keeps_job_and_client_sections(self):
+
+        reduced = reduce_page(make_page("Build a sync", "Sync  our\n  stock levels"))
+
+        self.assertEqual(
+            reduced.splitlines(),
+            [
+                "Build a sync",
+                "Sync our",
+                "stock levels",
+                BANNER,
+                "United States",
+                "14 jobs posted",
+            ],
+        )
+
+    def test_learned_boilerplate_is_dropped(self):
+        """Long lines shared by most pages go, short labels stay"""
+
+        pages = [make_page(f"Job {x}", f"Description of job {x}") for x in range(4)]
+        boilerplate = Boilerplate.learn(pages)
+
+        reduced = reduce_page(pages[0], boilerplate)
+
+        self.assertEqual(boilerplate.lines, {BANNER})
+        self.assertNotIn(BANNER, reduced)
+        self.assertIn("14 jobs posted", reduced)
+
+    def test_boilerplate_round_trip(self):
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "boilerplate.json")
+            Boilerplate([BANNER]).save(path)
+
+            self.assertEqual(Boilerplate.load(path).lines, {BANNER})
+            self.assertEqual(Boilerplate.load(folder).lines, set())
+
+    def test_unknown_layout_keeps_the_body(self):
+
+        html = "<html><body><div>Budget</div><div>$500</div></body></html>"
+
+        self.assertEqual(reduce_page(html), "Budget\n$500")
+
+    def test_fixture_pages_shrink(self):
+
+        for name, html in load_corpus(PAGES).items():
+            with self.subTest(name):
+                reduced = reduce_page(html)
+                self.assertTrue(reduced)
+                self.assertLess(count_tokens(reduced), count_tokens(full_text(html)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+### Description:
+- In-process stand-ins for the services the enricher talks to, so it
+  can be load tested without Supabase, Upwork or real proxies.
+- `FakePostgrest` serves the claim, release and update rpcs, the row
+  PATCH fallback and the proxy list, over a queue of synthetic rows.
+- `FakeUpwork` is the http proxy and the job details endpoint in one.
+  It can answer 407 or return malformed payloads at tunable rates.
+- Both count requests per route and the connections opened to them.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class FakeConfig(BaseModel):
+    """
+    ### Description:
+    - Behaviour of the fake services.
+    """
+
+    rows: int = 500
+    details_latency: float = 0.05
+    postgrest_latency: float = 0.01
+    proxy_error_rate: float = 0
+    malformed_rate: float = 0
+    proxies: int = 10
+    seed: int = 0
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    ### Description:
+    - Threaded http server that counts requests and connections.
+    - With HTTP/1.1 keep-alive every handler instance is one connection.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler: type, config: FakeConfig) -> None:
+
+        super().__init__(("127.0.0.1", 0), handler)
+        self.config = config
+        # one stream per decision, so thread order cannot move the outcomes
+        self.randoms: dict[str, random.Random] = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests: dict[str, int] = defaultdict(int)
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def connected(self):
+        with self.lock:
+            self.connections += 1
+
+    def count(self, route: str):
+        with self.lock:
+            self.requests[route] += 1
+
+    def chance(self, decision: str, rate: float) -> bool:
+        with self.lock:
+            if decision not in self.randoms:
+                self.randoms[decision] = random.Random(f"{self.config.seed}-{decision}")
+            return self.randoms[decision].random() < rate
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Shared plumbing of the fake handlers"""
+
+    server: FakeServer
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connected()
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        pass
+
+    def _read(self) -> bytes:
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        path = re.sub(
+            r"/visitor/[^/]+/", "/visitor/{cipher}/", urlsplit(self.path).path
+        )
+        self.server.count(self.command + " " + path)
+        return body
+
+    def _send(self, status: int, data: bytes = b"", content_type="application/json"):
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, payload):
+        self._send(status, json.dumps(payload).encode())
+
+
+class PostgrestHandler(FakeHandler):
+    """Routes of the fake PostgREST"""
+
+    server: "FakePostgrest"
+
+    def do_GET(self):  # pylint:disable=invalid-name
+
+        self._read()
+        if urlsplit(self.path).path == "/proxies":
+            self._send(200, self.server.proxy_list().encode(), "text/plain")
+        else:
+            self._send_json(404, {"message": "unknown route"})
+
+    def do_POST(self):  # pylint:disable=invalid-name
+
+        body = json.loads(self._read() or b"{}")
+        path = urlsplit(self.path).path
+        time.sleep(self.server.config.postgrest_latency)
+
+        if path == "/rpc/claim_pending_rows":
+            links = self.server.claim(body["row_limit"])
+            self._send_json(200, [{"link": x} for x in links])
+        elif path == "/rpc/release_claimed_rows":
+            self.server.release(body["links"])
+            self._send_json(200, None)
+        elif path == "/rpc/update_client_data":
+            self.server.write([x["link"] for x in body["payload"]])
+            self._send_json(200, len(body["payload"]))
+        else:
+            self._send_json(404, {"message": "unknown route"})
+
+    def do_PATCH(self):  # pylint:disable=invalid-name
+
+        self._read()
+        url = urlsplit(self.path)
+        time.sleep(self.server.config.postgrest_latency)
+        if url.path == "/upwork_filtered_jobs":
+            link = url.query.split("link=eq.", 1)[-1]
+            self.server.write([link])
+            self._send(204)
+        else:
+            self._send_json(404, {"message": "unknown route"})
+
+
+class FakePostgrest(FakeServer):
+    """
+    ### Description:
+    - Fake PostgREST over `config.rows` pending rows.
+    - Claimed rows leave the queue, released rows go back to it, and
+      written rows are recorded.
+    """
+
+    def __init__(self, config: FakeConfig, proxy_port: int = 0) -> None:
+
+        super().__init__(PostgrestHandler, config)
+        self.proxy_port = proxy_port
+        self.pending = deque(
+            f"https://www.upwork.com/jobs/~02{x:016x}" for x in range(config.rows)
+        )
+        self.claimed: set[str] = set()
+        self.written: set[str] = set()
+
+    def proxy_list(self) -> str:
+        return "\n".join(
+            f"127.0.0.1:{self.proxy_port}:user{x}:pass"
+            for x in range(self.config.proxies)
+        )
+
+    def claim(self, limit: int) -> list[str]:
+        with self.lock:
+            links = [
+                self.pending.popleft() for _ in range(min(limit, len(self.pending)))
+            ]
+            self.claimed.update(links)
+            return links
+
+    def release(self, links: list[str]):
+        with self.lock:
+            self.pending.extend(links)
+
+    def write(self, links: list[str]):
+        with self.lock:
+            self.written.update(links)
+
+
+class UpworkHandler(FakeHandler):
+    """The job details endpoint, reached through the fake proxy"""
+
+    server: "FakeUpwork"
+
+    def do_GET(self):  # pylint:disable=invalid-name
+
+        self._read()
+        config = self.server.config
+        path = urlsplit(self.path).path
+
+        if self.server.chance("407", config.proxy_error_rate):
+            self.server.count("407")
+            self._send(407)
+            return
+        if not path.endswith("/details"):
+            self._send_json(404, {"message": "unknown route"})
+            return
+
+        time.sleep(config.details_latency)
+        if self.server.chance("malformed", config.malformed_rate):
+            self.server.count("malformed")
+            self._send(200, self.server.malformed())
+            return
+        self._send(200, self.server.details)
+
+
+class FakeUpwork(FakeServer):
+    """
+    ### Description:
+    - Fake http proxy and Upwork job details endpoint.
+    - Proxied requests arrive with the absolute url as path.
+    """
+
+    def __init__(self, config: FakeConfig) -> None:
+
+        super().__init__(UpworkHandler, config)
+        with open(os.path.join(FIXTURES, "job_details.json"), "rb") as rf:
+            self.details = rf.read()
+
+    def malformed(self) -> bytes:
+        """Either a truncated body or a buyer without the expected fields"""
+
+        if self.chance("truncated", 0.5):
+            return self.details[: len(self.details) // 2]
+        return json.dumps({"buyer": {"location": "unavailable"}}).encode()
@@ -0,0 +1,186 @@
+"""
+### Description:
+- Load test for the enricher's `lambda_handler` against the fake
+  services in `fake_services.py`.
+- Reports rows per second, p50/p99 per row latency, connections opened
+  to PostgREST and to the proxies, and requests per route, so
+  concurrency and pooling changes can be compared without burning
+  real proxies. The handler's own EMF record is included for the per
+  stage split.
+
+### Usage (from src/data_enricher):
+    python -m v2.benchmarks.load_test [--rows 500] [--workers 10]
+        [--proxy-error-rate 0.1] [--malformed-rate 0.05] [--output report.json]
+"""
+
+# pylint: disable=wrong-import-position
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from v2.benchmarks.fake_services import FakeConfig, FakePostgrest, FakeUpwork
+from v2.src.metrics import MemorySink
+
+MODULE = "v2.src.fetch_client_data"
+
+
+def percentile(values: list[float], pct: int) -> float | None:
+    """The `pct` percentile of `values`, None without samples"""
+
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0], 4)
+    return round(statistics.quantiles(values, n=100, method="inclusive")[pct - 1], 4)
+
+
+def run(
+    config: FakeConfig,
+    workers: int = 10,
+    budget: float = 120,
+    verbose: bool = False,
+) -> dict:
+    """
+    ### Description:
+        - Starts the fake services and runs the handler once, until
+          every row is processed or the budget is used up.
+
+    ### Args:
+        - `config`: FakeConfig
+            Rows, latency and failure settings of the fake services.
+        - `workers`: int
+            Number of concurrent workers in the handler.
+        - `budget`: float
+            Run time budget of the handler, in seconds.
+        - `verbose`: bool
+            Whether to show the handler's output.
+
+    ### Returns:
+        - `dict`
+            The report.
+    """
+
+    upwork = FakeUpwork(config)
+    upwork.start()
+    postgrest = FakePostgrest(config, upwork.server_port)
+    postgrest.start()
+    folder = tempfile.TemporaryDirectory()
+    env = {
+        "POSTGREST_URL": postgrest.url,
+        "SUPABASE_CLIENT_ANON_KEY": "bench",
+        "PROXY_URL": postgrest.url + "proxies",
+        "PROXY_CACHE_PATH": os.path.join(folder.name, "proxies.json"),
+        "RUN_TIME_BUDGET": str(budget),
+        "DEADLINE_SAFETY_MARGIN": "0",
+        "ROW_TIME_BUDGET": "1",
+        "WORKERS": str(workers),
+        "FLUSH_INTERVAL": "1",
+    }
+
+    latencies: list[float] = []
+    sink = MemorySink()
+    imported = sys.modules.pop(MODULE, None)
+    try:
+        with patch.dict("os.environ", env):
+            # the module builds its proxy cache at import, so import after
+            # the env points at the fakes
+            enricher = importlib.import_module(MODULE)
+            handle_row = enricher.handle_row
+
+            async def timed_handle_row(url, proxies):
+                start = time.perf_counter()
+                try:
+                    return await handle_row(url, proxies)
+                finally:
+                    latencies.append(time.perf_counter() - start)
+
+            output = (
+                contextlib.nullcontext()
+                if verbose
+                else contextlib.redirect_stdout(io.StringIO())
+            )
+            with patch.object(enricher, "handle_row", timed_handle_row), patch.object(
+                enricher,
+                "DETAILS_URL",
+                "http://upwork.test/job-details/jobdetails/visitor/{cipher}/details",
+            ), patch.object(enricher.METRICS, "sink", sink), output:
+                start = time.perf_counter()
+                enricher.lambda_handler({}, None)
+                wall_time = time.perf_counter() - start
+
+            loop = enricher.get_event_loop()
+            loop.run_until_complete(enricher.CLIENTS.aclose())
+            loop.close()
+    finally:
+        sys.modules.pop(MODULE, None)
+        if imported:
+            sys.modules[MODULE] = imported
+        upwork.stop()
+        postgrest.stop()
+        folder.cleanup()
+
+    written = len(postgrest.written)
+    return {
+        "config": {**config.model_dump(), "workers": workers, "budget": budget},
+        "rows_written": written,
+        "rows_pending": len(postgrest.pending),
+        "wall_time": round(wall_time, 4),
+        "rows_per_sec": round(written / wall_time, 2) if wall_time else None,
+        "row_latency_p50": percentile(latencies, 50),
+        "row_latency_p99": percentile(latencies, 99),
+        "connections": {
+            "postgrest": postgrest.connections,
+            "upwork": upwork.connections,
+        },
+        "requests": {
+            "postgrest": dict(sorted(postgrest.requests.items())),
+            "upwork": dict(sorted(upwork.requests.items())),
+        },
+        "metrics": {
+            x: y for x, y in sink.records()[-1].items() if x not in ("_aws", "Service")
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--proxies", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=120)
+    parser.add_argument("--details-latency", type=float, default=0.05)
+    parser.add_argument("--postgrest-latency", type=float, default=0.01)
+    parser.add_argument("--proxy-error-rate", type=float, default=0)
+    parser.add_argument("--malformed-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Writes the report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    fake_config = FakeConfig(
+        rows=args.rows,
+        details_latency=args.details_latency,
+        postgrest_latency=args.postgrest_latency,
+        proxy_error_rate=args.proxy_error_rate,
+        malformed_rate=args.malformed_rate,
+        proxies=args.proxies,
+        seed=args.seed,
+    )
+    report = run(fake_config, args.workers, args.budget, args.verbose)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as wf:
+            json.dump(report, wf, indent=2)
@@ -0,0 +1,50 @@
+-- Atomic row claiming for the v2 data enricher.
+-- Exposed through PostgREST as /rpc/claim_pending_rows and /rpc/release_claimed_rows.
+
+ALTER TABLE upwork_filtered_jobs
+ADD COLUMN IF NOT EXISTS client_data_claimed_at TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION claim_pending_rows (
+  row_limit INTEGER DEFAULT 10,
+  max_tries INTEGER DEFAULT 1,
+  lease_seconds INTEGER DEFAULT 900
+) RETURNS TABLE (link TEXT) LANGUAGE sql AS $$
+    WITH
+        claimable AS (
+            SELECT
+                upwork_filtered_jobs.link
+            FROM
+                upwork_filtered_jobs
+            WHERE
+                did_augment_client_data IS FALSE
+                AND client_data_try_count < max_tries
+                AND (
+                    client_data_claimed_at IS NULL
+                    OR client_data_claimed_at < NOW() - MAKE_INTERVAL(secs => lease_seconds)
+                )
+            LIMIT
+                row_limit
+            FOR UPDATE
+                SKIP LOCKED
+        )
+    UPDATE upwork_filtered_jobs
+    SET
+        client_data_try_count = upwork_filtered_jobs.client_data_try_count + 1,
+        client_data_claimed_at = NOW()
+    FROM
+        claimable
+    WHERE
+        upwork_filtered_jobs.link = claimable.link
+    RETURNING
+        upwork_filtered_jobs.link;
+$$;
+
+CREATE OR REPLACE FUNCTION release_claimed_rows (links TEXT[]) RETURNS VOID LANGUAGE sql AS $$
+    UPDATE upwork_filtered_jobs
+    SET
+        client_data_try_count = GREATEST(client_data_try_count - 1, 0),
+        client_data_claimed_at = NULL
+    WHERE
+        link = ANY (links)
+        AND did_augment_client_data IS FALSE;
+$$;
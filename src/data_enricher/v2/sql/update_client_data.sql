@@ -0,0 +1,42 @@
+-- Bulk write of enriched client data for the v2 data enricher.
+-- Exposed through PostgREST as /rpc/update_client_data and takes a JSON array of rows.
+
+CREATE OR REPLACE FUNCTION update_client_data (payload JSONB) RETURNS INTEGER LANGUAGE sql AS $$
+    WITH
+        updated AS (
+            UPDATE upwork_filtered_jobs
+            SET
+                client_city = data.client_city,
+                client_join_data = data.client_join_data,
+                client_jobs_posted = data.client_jobs_posted,
+                client_open_jobs = data.client_open_jobs,
+                client_total_spent_usd = data.client_total_spent_usd,
+                client_total_hires = data.client_total_hires,
+                client_active_hires = data.client_active_hires,
+                client_avg_hourly_rate = data.client_avg_hourly_rate,
+                client_total_paid_hours = data.client_total_paid_hours,
+                did_augment_client_data = data.did_augment_client_data
+            FROM
+                JSONB_TO_RECORDSET(payload) AS data (
+                    link TEXT,
+                    client_city TEXT,
+                    client_join_data TIMESTAMPTZ,
+                    client_jobs_posted INTEGER,
+                    client_open_jobs INTEGER,
+                    client_total_spent_usd NUMERIC,
+                    client_total_hires INTEGER,
+                    client_active_hires INTEGER,
+                    client_avg_hourly_rate NUMERIC,
+                    client_total_paid_hours NUMERIC,
+                    did_augment_client_data BOOLEAN
+                )
+            WHERE
+                upwork_filtered_jobs.link = data.link
+            RETURNING
+                1
+        )
+    SELECT
+        COUNT(*)::INTEGER
+    FROM
+        updated;
+$$;
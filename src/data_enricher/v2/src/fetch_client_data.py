@@ -8,7 +8,8 @@ from datetime import datetime
 import os
 import asyncio
 import json
-import random
+import time
+from collections import OrderedDict
 
 import httpx
 from pydantic import (
@@ -24,9 +25,146 @@ from dotenv import load_dotenv
 from rich import print
 import ua_generator
 
+try:
+    from .proxy_pool import ProxyPool, ProxyListCache
+    from .metrics import Metrics
+except ImportError:  # flat layout inside the lambda zip
+    from proxy_pool import ProxyPool, ProxyListCache
+    from metrics import Metrics
+
 load_dotenv()
 
 
+class ClientRegistry:
+    """
+    ### Description:
+    - Holds the pooled HTTP clients used by the enricher.
+    - One client is shared for PostgREST, and one client per proxy is
+      kept for Upwork, so keep-alive connections are reused instead of
+      paying a new TCP/TLS handshake on every request.
+    - Clients are bound to the event loop they were created on. When
+      the loop changes, the stale clients are dropped and rebuilt.
+    """
+
+    def __init__(self, max_proxy_clients: int = 64) -> None:
+
+        self.max_proxy_clients = max_proxy_clients
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.postgrest_client: httpx.AsyncClient | None = None
+        self.upwork_clients: OrderedDict[str, httpx.AsyncClient] = OrderedDict()
+
+    def _check_loop(self):
+
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.postgrest_client = None
+            self.upwork_clients = OrderedDict()
+
+    def postgrest(self) -> httpx.AsyncClient:
+        """
+        ### Description:
+            - Returns the shared PostgREST client, creating it on first use.
+
+        ### Returns:
+            - `httpx.AsyncClient`
+                A pooled client carrying the Supabase auth headers.
+        """
+
+        self._check_loop()
+        if self.postgrest_client is None or self.postgrest_client.is_closed:
+            self.postgrest_client = httpx.AsyncClient(
+                headers={
+                    "apikey": os.getenv("SUPABASE_CLIENT_ANON_KEY"),
+                    "Authorization": f"Bearer {os.getenv('SUPABASE_CLIENT_ANON_KEY')}",
+                    "Content-Type": "application/json",
+                },
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=20,
+                    max_keepalive_connections=10,
+                    keepalive_expiry=60,
+                ),
+                timeout=10,
+            )
+        return self.postgrest_client
+
+    def upwork(self, proxy: str) -> httpx.AsyncClient:
+        """
+        ### Description:
+            - Returns the pooled Upwork client for a proxy.
+            - Least recently used clients are closed once more than
+              `max_proxy_clients` proxies are in use.
+
+        ### Args:
+            - `proxy`: str
+                The proxy url the client routes through.
+
+        ### Returns:
+            - `httpx.AsyncClient`
+                A pooled client bound to that proxy.
+        """
+
+        self._check_loop()
+        client = self.upwork_clients.get(proxy)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                proxy=proxy,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=5,
+                    max_keepalive_connections=5,
+                    keepalive_expiry=30,
+                ),
+                timeout=5,
+            )
+            self.upwork_clients[proxy] = client
+        self.upwork_clients.move_to_end(proxy)
+
+        while len(self.upwork_clients) > self.max_proxy_clients:
+            _, stale = self.upwork_clients.popitem(last=False)
+            asyncio.ensure_future(stale.aclose())
+
+        return client
+
+    async def aclose(self):
+        """
+        ### Description:
+            - Closes every pooled client.
+        """
+
+        clients = list(self.upwork_clients.values())
+        if self.postgrest_client:
+            clients.append(self.postgrest_client)
+        self.postgrest_client = None
+        self.upwork_clients = OrderedDict()
+        await asyncio.gather(*[x.aclose() for x in clients], return_exceptions=True)
+
+
+CLIENTS = ClientRegistry()
+PROXY_POOL = ProxyPool()
+METRICS = Metrics("UpworkScraper", "data_enricher")
+EVENT_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    ### Description:
+        - Returns the process wide event loop.
+        - Reusing one loop across warm lambda invocations keeps the
+          pooled clients in `CLIENTS` alive between runs.
+
+    ### Returns:
+        - `asyncio.AbstractEventLoop`
+            The shared event loop.
+    """
+
+    global EVENT_LOOP  # pylint:disable=global-statement
+    if EVENT_LOOP is None or EVENT_LOOP.is_closed():
+        EVENT_LOOP = asyncio.new_event_loop()
+    return EVENT_LOOP
+
+
 class UpworkClient(BaseModel):
     """
     ### Description:
@@ -85,26 +223,21 @@ class UpworkClient(BaseModel):
         return int(value)
 
 
-async def update_row(upwork_link: str, client: UpworkClient):
+def client_payload(client: UpworkClient) -> dict:
     """
     ### Description:
-        - Asynchronously updates the client data in the database
-          for a specific Upwork link.
-        - Sends a PATCH request to the server with updated data.
+        - Maps an UpworkClient to the columns of `upwork_filtered_jobs`.
 
     ### Args:
-        - `upwork_link`: str
-            The Upwork job link that needs to be updated.
         - `client`: UpworkClient
             The UpworkClient instance containing updated client data.
 
+    ### Returns:
+        - `dict`
+            The column values to write, marking the row as augmented.
     """
 
-    print(f"Updating row {upwork_link}")
-
-    url = os.getenv("POSTGREST_URL") + "upwork_filtered_jobs"
-
-    payload = {
+    return {
         "client_city": client.client_city,
         "client_join_data": (
             str(client.client_join_date) if client.client_join_date else None
@@ -118,108 +251,242 @@ async def update_row(upwork_link: str, client: UpworkClient):
         "client_total_paid_hours": client.client_total_paid_hours,
         "did_augment_client_data": True,
     }
-    headers = {
-        "apikey": os.getenv("SUPABASE_CLIENT_ANON_KEY"),
-        "Authorization": f"Bearer {os.getenv('SUPABASE_CLIENT_ANON_KEY')}",
-        "Content-Type": "application/json",
-    }
+
+
+async def update_row(upwork_link: str, client: UpworkClient) -> bool:
+    """
+    ### Description:
+        - Asynchronously updates the client data in the database
+          for a specific Upwork link.
+        - Sends a PATCH request to the server with updated data.
+
+    ### Args:
+        - `upwork_link`: str
+            The Upwork job link that needs to be updated.
+        - `client`: UpworkClient
+            The UpworkClient instance containing updated client data.
+
+    ### Returns:
+        - `bool`
+            True if the row was updated.
+    """
+
+    print(f"Updating row {upwork_link}")
+
+    url = os.getenv("POSTGREST_URL") + "upwork_filtered_jobs"
+
+    payload = client_payload(client)
     params = {"link": "eq." + upwork_link}
 
-    response = await httpx.AsyncClient(headers=headers).patch(
-        url, json=payload, params=params
-    )
+    METRICS.count("write_requests")
+    with METRICS.span("write"):
+        response = await CLIENTS.postgrest().patch(url, json=payload, params=params)
     print(response.status_code)
     if response.status_code >= 400:
         print(response.text)
+        return False
+    return True
 
 
-async def increase_try_count(upwork_link: str):
-    """"""
+async def update_rows(rows: dict[str, UpworkClient]) -> bool:
+    """
+    ### Description:
+        - Writes the client data of many rows in one request through
+          the `update_client_data` rpc.
 
-    print("Increasing try count of a link")
-    url = os.getenv("POSTGREST_URL") + "upwork_filtered_jobs"
-    headers = {
-        "apikey": os.getenv("SUPABASE_CLIENT_ANON_KEY"),
-        "Authorization": f"Bearer {os.getenv('SUPABASE_CLIENT_ANON_KEY')}",
-        "Content-Type": "application/json",
-    }
+    ### Args:
+        - `rows`: dict[str, UpworkClient]
+            Client data keyed by Upwork job link.
 
-    params = {
-        "link": f"eq.{upwork_link}",
-        "select": "client_data_try_count",
-        "limit": 10,
-    }
-    response = await httpx.AsyncClient().get(url, headers=headers, params=params)
+    ### Returns:
+        - `bool`
+            True if the batch was written.
+    """
 
-    rows = response.json()
-    if not rows:
-        return None
+    print(f"Updating {len(rows)} rows")
 
-    print(rows)
-    count = rows[0]["client_data_try_count"] + 1
+    url = os.getenv("POSTGREST_URL") + "rpc/update_client_data"
 
-    payload = {"client_data_try_count": count}
-    params = {"link": "eq." + upwork_link}
+    payload = [{"link": link, **client_payload(x)} for link, x in rows.items()]
+    body = json.dumps({"payload": payload})
 
-    response = await httpx.AsyncClient().patch(
-        url, headers=headers, json=payload, params=params
-    )
+    METRICS.count("write_requests")
+    METRICS.count("write_bytes", len(body))
+    with METRICS.span("write"):
+        response = await CLIENTS.postgrest().post(url, content=body)
     print(response.status_code)
     if response.status_code >= 400:
         print(response.text)
+        return False
+    return True
 
 
-def get_pending_rows() -> list[str] | None:
+class UpdateBuffer:
     """
     ### Description:
-        - Fetches a list of pending rows for client data augmentation
-          from the database.
+    - Buffers enriched rows in memory and writes them in bulk.
+    - Flushes once `max_size` rows are buffered, or once the oldest
+      buffered row is `max_wait` seconds old, so a timeout can only
+      ever lose a few seconds of work.
+    - If a bulk write fails or raises, the rows are written one by one
+      instead, since their claim is already spent.
+    """
+
+    def __init__(self, max_size: int | None = None, max_wait: float | None = None):
+
+        self.max_size = max_size or int(os.getenv("FLUSH_SIZE", "25"))
+        self.max_wait = max_wait or float(os.getenv("FLUSH_INTERVAL", "10"))
+        self.rows: dict[str, UpworkClient] = {}
+        self.oldest: float | None = None
+        self.stopping = asyncio.Event()
+        self.written = 0
+
+    async def add(self, upwork_link: str, client: UpworkClient):
+        """
+        ### Description:
+            - Buffers a row, flushing if the buffer is full.
+
+        ### Args:
+            - `upwork_link`: str
+                The Upwork job link that was enriched.
+            - `client`: UpworkClient
+                The client data fetched for it.
+        """
+
+        if not self.rows:
+            self.oldest = time.monotonic()
+        self.rows[upwork_link] = client
+
+        if len(self.rows) >= self.max_size:
+            await self.flush()
+
+    async def flush(self):
+        """
+        ### Description:
+            - Writes out everything that is buffered.
+        """
+
+        if not self.rows:
+            return
+
+        rows = self.rows
+        self.rows = {}
+        self.oldest = None
+
+        try:
+            written = await update_rows(rows)
+        except Exception as e:
+            print("Bulk update raised", type(e).__name__, e)
+            written = False
+        if written:
+            self.written += len(rows)
+            METRICS.count("rows_written", len(rows))
+            return
+
+        print("Bulk update failed. Updating rows one by one")
+        METRICS.count("bulk_write_failures")
+        results = await asyncio.gather(
+            *[update_row(link, x) for link, x in rows.items()], return_exceptions=True
+        )
+        self.written += sum(x is True for x in results)
+        METRICS.count("rows_written", sum(x is True for x in results))
+
+    async def flush_on_interval(self):
+        """
+        ### Description:
+            - Background task flushing rows that have waited too long.
+            - Runs until `stop` is called, finishing any flush in progress.
+          A failed flush is logged and doesn't end the loop.
+        """
+
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.max_wait / 2)
+            except asyncio.TimeoutError:
+                pass
+            if self.oldest and time.monotonic() - self.oldest >= self.max_wait:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print("Interval flush failed", type(e).__name__, e)
+
+    def stop(self):
+        """
+        ### Description:
+            - Tells the background flusher to exit.
+        """
+
+        self.stopping.set()
+
+
+async def claim_pending_rows(limit: int = 10) -> list[str] | None:
+    """
+    ### Description:
+        - Atomically claims a batch of pending rows for client data
+          augmentation through the `claim_pending_rows` rpc.
+        - The database increases the try count and sets a lease on the
+          claimed rows, so overlapping invocations never get the same row.
+
+    ### Args:
+        - `limit`: int
+            Maximum number of rows to claim.
 
     ### Returns:
         - `list[str] | None`
             A list of Upwork links to augment, or None if none are found.
     """
 
-    url = os.getenv("POSTGREST_URL") + "upwork_filtered_jobs"
+    url = os.getenv("POSTGREST_URL") + "rpc/claim_pending_rows"
 
-    querystring = {
-        "did_augment_client_data": "eq.false",
-        "client_data_try_count": "lt.1",
-        "select": "link",
-        "limit": 10,
-    }
-
-    headers = {
-        "apikey": os.getenv("SUPABASE_CLIENT_ANON_KEY"),
-        "Authorization": f"Bearer {os.getenv('SUPABASE_CLIENT_ANON_KEY')}",
-        "Content-Type": "application/json",
+    payload = {
+        "row_limit": limit,
+        "max_tries": int(os.getenv("MAX_TRIES", "1")),
+        "lease_seconds": int(os.getenv("LEASE_SECONDS", "900")),
     }
 
-    response = httpx.get(url, headers=headers, params=querystring)
+    with METRICS.span("claim"):
+        response = await CLIENTS.postgrest().post(url, json=payload)
+    if response.status_code >= 400:
+        print(response.text)
+        return None
 
     rows = response.json()
     if not rows:
         return None
+    METRICS.count("rows_claimed", len(rows))
     return [x["link"] for x in rows]
 
 
-def download_proxies() -> list[str]:
-    res = httpx.get(os.getenv("PROXY_URL"), timeout=5)
-    return res.text.split()
+async def release_rows(upwork_links: list[str]):
+    """
+    ### Description:
+        - Hands claimed rows that were never worked on back to the pool
+          through the `release_claimed_rows` rpc.
 
+    ### Args:
+        - `upwork_links`: list[str]
+            The links to release.
+    """
+
+    print(f"Releasing {len(upwork_links)} unprocessed rows")
+    url = os.getenv("POSTGREST_URL") + "rpc/release_claimed_rows"
 
-def get_proxy(proxies: list[str]) -> str:
-    """"""
+    response = await CLIENTS.postgrest().post(url, json={"links": upwork_links})
+    if response.status_code >= 400:
+        print(response.text)
 
-    print("Getting a new proxy")
 
-    proxy = random.choice(proxies)
-    ip, port, user, password = proxy.split(":")
+def download_proxies() -> list[str]:
+    res = httpx.get(os.getenv("PROXY_URL"), timeout=5)
+    res.raise_for_status()
+    return res.text.split()
+
 
-    return "http://" + user + ":" + password + "@" + ip + ":" + port
+PROXY_LIST = ProxyListCache(download_proxies)
+DETAILS_URL = "https://www.upwork.com/job-details/jobdetails/visitor/{cipher}/details"
 
 
-async def get_details(cipher: str, proxies: list[str]) -> UpworkClient:
+async def get_details(cipher: str, proxies: ProxyPool) -> UpworkClient:
     """
     ### Description:
         - Asynchronously fetches the details of a client
@@ -228,6 +495,8 @@ async def get_details(cipher: str, proxies: list[str]) -> UpworkClient:
     ### Args:
         - `cipher`: str
             The cipher code for the Upwork job.
+        - `proxies`: ProxyPool
+            The proxy pool to route the request through.
 
     ### Returns:
         - `UpworkClient`
@@ -236,9 +505,11 @@ async def get_details(cipher: str, proxies: list[str]) -> UpworkClient:
     ### Raises:
         - `httpx.HTTPStatusError`:
             If the request fails due to an HTTP error.
+        - `RuntimeError`:
+            If every retry failed on a proxy error or a block.
     """
 
-    url = f"https://www.upwork.com/job-details/jobdetails/visitor/{cipher}/details"
+    url = DETAILS_URL.format(cipher=cipher)
 
     headers = {
         "User-Agent": ua_generator.generate().text,
@@ -250,19 +521,36 @@ async def get_details(cipher: str, proxies: list[str]) -> UpworkClient:
 
     retries = 0
     while retries < 10:
+        proxy = proxies.get()
+        METRICS.count("details_requests")
+        start = time.monotonic()
         try:
-            response = await httpx.AsyncClient(
-                headers=headers, proxy=get_proxy(proxies), timeout=5
-            ).get(url)
+            with METRICS.span("details"):
+                response = await CLIENTS.upwork(proxy).get(url, headers=headers)
 
             if response.status_code == 407:
                 raise RuntimeError("Invalid Proxy")
+            if response.status_code in (403, 429):
+                METRICS.count("proxy_blocked")
+                proxies.report_failure(proxy, soft=True)
+                retries += 1
+                continue
+            if response.status_code == 200:
+                proxies.report_success(proxy, time.monotonic() - start)
             break
 
-        except (httpx.ProxyError, RuntimeError):
+        except (httpx.TransportError, RuntimeError) as e:
+            METRICS.count(
+                "proxy_407" if isinstance(e, RuntimeError) else "proxy_errors"
+            )
+            proxies.report_failure(proxy)
             retries += 1
             continue
-    client = UpworkClient(**response.json())
+    else:
+        raise RuntimeError("Ran out of proxy retries")
+
+    with METRICS.span("parse"):
+        client = UpworkClient(**response.json())
 
     return client
 
@@ -284,7 +572,7 @@ def link_to_cipher(link: str) -> str:
     return link.split("/")[-1]
 
 
-async def handle_row(url: str, proxies: list[str]):
+async def handle_row(url: str, proxies: ProxyPool) -> UpworkClient:
     """
     ### Description:
         - Handles the enrichment process for a single row of data,
@@ -293,57 +581,219 @@ async def handle_row(url: str, proxies: list[str]):
     ### Args:
         - `url`: str
             The Upwork job link to process.
+        - `proxies`: ProxyPool
+            The proxy pool to route requests through.
+
+    ### Returns:
+        - `UpworkClient`
+            The client data to write for the row.
     """
-    await increase_try_count(url)
     retries = 0
     while retries < 3:
         try:
-            details = await get_details(link_to_cipher(url), proxies)
-            await update_row(url, details)
-            break
+            return await get_details(link_to_cipher(url), proxies)
         except ValidationError:
+            METRICS.count("malformed_payloads")
             retries += 1
         except Exception as e:
             print("Exception in a URL", url, type(e).__name__, e)
+            METRICS.count("row_retries")
             retries += 1
     else:
         raise RuntimeError("Unable to process row")
 
 
-async def async_handler(rows: list[str], proxies: list[str]):
+def get_deadline(context) -> float:
     """
     ### Description:
-        - Manages the asynchronous handling of multiple rows of
-        client data augmentation.
+        - Works out when this invocation has to stop picking up work.
+        - Uses the lambda's remaining time when available, otherwise
+          the `RUN_TIME_BUDGET` env var (seconds, 300 by default).
 
     ### Args:
-        - `rows`: list[str]
-            A list of Upwork job links to process.
+        - `context`: any
+            Context providing runtime information.
+
+    ### Returns:
+        - `float`
+            The deadline as a `time.monotonic()` timestamp.
+    """
+
+    safety_margin = float(os.getenv("DEADLINE_SAFETY_MARGIN", "5"))
+    try:
+        budget = context.get_remaining_time_in_millis() / 1000
+    except AttributeError:
+        budget = float(os.getenv("RUN_TIME_BUDGET", "300"))
+
+    return time.monotonic() + budget - safety_margin
+
+
+def time_left(deadline: float) -> float:
+    """Seconds left until the deadline"""
+
+    return deadline - time.monotonic()
+
+
+async def produce_rows(queue: asyncio.Queue, deadline: float, page_size: int):
+    """
+    ### Description:
+        - Keeps claiming batches of pending rows and feeds them to the workers.
+        - The queue is bounded, so the producer only claims the next batch
+          when the workers are ready for more.
+
+    ### Args:
+        - `queue`: asyncio.Queue
+            The queue consumed by the workers.
+        - `deadline`: float
+            When to stop claiming new rows.
+        - `page_size`: int
+            Rows claimed per batch.
+    """
+
+    row_budget = float(os.getenv("ROW_TIME_BUDGET", "20"))
+    queued = set()
+    while time_left(deadline) > row_budget:
+        rows = await claim_pending_rows(page_size)
+        if not rows:
+            break
+
+        new_rows = [x for x in rows if x not in queued]
+        if not new_rows:
+            break
+
+        for row in new_rows:
+            queued.add(row)
+            await queue.put(row)
+
+
+async def consume_rows(
+    queue: asyncio.Queue,
+    proxies: ProxyPool,
+    deadline: float,
+    stats: dict,
+    skipped: list[str],
+    buffer: UpdateBuffer,
+):
+    """
+    ### Description:
+        - Worker that processes rows from the queue until cancelled.
+        - Rows picked up too close to the deadline are collected in
+          `skipped` so they can be released for the next invocation.
+
+    ### Args:
+        - `queue`: asyncio.Queue
+            The queue filled by the producer.
+        - `proxies`: ProxyPool
+            The proxy pool to route requests through.
+        - `deadline`: float
+            When to stop starting new rows.
+        - `stats`: dict
+            Shared counters for completed, failed and skipped rows.
+        - `skipped`: list[str]
+            Shared list of rows that were claimed but not processed.
+        - `buffer`: UpdateBuffer
+            Where enriched rows are collected for bulk writing.
+    """
+
+    row_budget = float(os.getenv("ROW_TIME_BUDGET", "20"))
+    while True:
+        row = await queue.get()
+        try:
+            if time_left(deadline) < row_budget:
+                stats["skipped"] += 1
+                skipped.append(row)
+                continue
+            details = await asyncio.wait_for(
+                handle_row(row, proxies), time_left(deadline)
+            )
+            await buffer.add(row, details)
+            stats["completed"] += 1
+        except Exception as e:
+            print("Row failed", row, type(e).__name__, e)
+            stats["errors"] += 1
+        finally:
+            queue.task_done()
+
+
+async def async_handler(
+    proxies: ProxyPool,
+    deadline: float,
+    workers: int | None = None,
+    page_size: int | None = None,
+) -> dict:
     """
+    ### Description:
+        - Runs a producer/consumer pipeline over the pending rows.
+        - A fixed pool of workers processes rows until there are none
+          left or the deadline is reached.
+        - Results are written in bulk through an UpdateBuffer, which is
+          flushed one last time before returning.
 
-    print(f"We have {len(rows)} to work on this round")
+    ### Args:
+        - `proxies`: ProxyPool
+            The proxy pool to route requests through.
+        - `deadline`: float
+            When to stop picking up new rows.
+        - `workers`: int | None
+            Number of concurrent workers. Defaults to the `WORKERS`
+            env var, or 10.
+        - `page_size`: int | None
+            Rows claimed per batch. Defaults to the `PAGE_SIZE` env var,
+            or the number of workers.
 
-    tasks = [asyncio.Task(handle_row(x, proxies)) for x in rows]
-    done, pending = await asyncio.wait(tasks, return_when="ALL_COMPLETED")
+    ### Returns:
+        - `dict`
+            Counts of completed, failed and skipped rows.
+    """
 
-    completed = 0
-    errors = 0
-    for future in done:
-        if future.exception():
-            errors += 1
-        else:
-            completed += 1
+    workers = workers or int(os.getenv("WORKERS", "10"))
+    page_size = page_size or int(os.getenv("PAGE_SIZE", str(workers)))
+    print(f"Working with {workers} workers for {time_left(deadline):.0f} seconds")
+
+    stats = {"completed": 0, "errors": 0, "skipped": 0}
+    skipped = []
+    buffer = UpdateBuffer()
+    queue = asyncio.Queue(maxsize=workers)
+    consumers = [
+        asyncio.create_task(
+            consume_rows(queue, proxies, deadline, stats, skipped, buffer)
+        )
+        for _ in range(workers)
+    ]
+    flusher = asyncio.create_task(buffer.flush_on_interval())
+
+    try:
+        await produce_rows(queue, deadline, page_size)
+        await queue.join()
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        buffer.stop()
+        # write and release before waiting on the flusher, so an error
+        # there can't cost us the last rows
+        try:
+            await buffer.flush()
+            if skipped:
+                await release_rows(skipped)
+        finally:
+            await asyncio.gather(flusher, return_exceptions=True)
 
     print(
-        f"Out of {len(rows)} rows, {completed} rows completed successfully while {errors} failed"
+        f"{stats['completed']} rows completed successfully, {stats['errors']} failed"
+        f" and {stats['skipped']} were left for the next run"
     )
+    return stats
 
 
+@METRICS.instrument
 def lambda_handler(event, context):
     """
     ### Description:
         - Main handler function for AWS Lambda which retrieves
         pending rows and triggers the async processing.
+        - Keeps draining rows until the lambda's remaining time runs out.
+        - Stage timings and counters are emitted as one EMF line.
 
     ### Args:
         - `event`: any
@@ -355,16 +805,20 @@ def lambda_handler(event, context):
         - `str`
             JSON string indicating the status of the operation.
     """
-    rows = get_pending_rows()
-    proxies = download_proxies()
-    if not rows:
+    deadline = get_deadline(context)
+    with METRICS.span("proxy_list"):
+        PROXY_POOL.update(PROXY_LIST.get())
+    with METRICS.span("pipeline"):
+        stats = get_event_loop().run_until_complete(async_handler(PROXY_POOL, deadline))
+    for name, value in stats.items():
+        METRICS.count("rows_" + name, value)
+    print("Proxy pool", PROXY_POOL.summary())
+    if not any(stats.values()):
         print("No rows available")
         return json.dumps({"status_code": 200, "status": "No rows available"})
-    asyncio.run(async_handler(rows, proxies))
 
     return json.dumps({"status_code": 200, "status": "Rows processed successfully"})
 
 
 if __name__ == "__main__":
     lambda_handler(1, 1)
-    # asyncio.run(increase_try_count("https://www.upwork.com/jobs/~019e435b7718f79a48"))
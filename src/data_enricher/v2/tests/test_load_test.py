@@ -0,0 +1,50 @@
+"""Tests for the enricher load test harness"""
+
+from unittest import TestCase, main
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from v2.benchmarks.load_test import run, percentile
+from v2.benchmarks.fake_services import FakeConfig
+
+
+class TestLoadTest(TestCase):
+
+    def test_every_row_is_written(self):
+        """Rows survive 407s and malformed payloads through the retries"""
+
+        config = FakeConfig(
+            rows=40,
+            details_latency=0,
+            postgrest_latency=0,
+            proxy_error_rate=0.1,
+            malformed_rate=0.05,
+            proxies=3,
+        )
+
+        report = run(config, workers=5, budget=60)
+
+        self.assertEqual(report["rows_written"], 40)
+        self.assertEqual(report["rows_pending"], 0)
+        self.assertGreater(report["rows_per_sec"], 0)
+        self.assertLessEqual(report["row_latency_p50"], report["row_latency_p99"])
+        # clients are pooled, so connections stay well below requests
+        self.assertLess(report["connections"]["upwork"], 40)
+        self.assertLessEqual(report["connections"]["postgrest"], 5)
+        metrics = report["metrics"]
+        self.assertEqual(metrics["rows_written"], 40)
+        self.assertEqual(metrics["rows_completed"], 40)
+        self.assertEqual(metrics["proxy_407"], report["requests"]["upwork"]["407"])
+        self.assertIn("details_ms", metrics)
+
+    def test_percentile(self):
+
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([1.0], 99), 1.0)
+        self.assertEqual(percentile([float(x) for x in range(1, 101)], 50), 50.5)
+
+
+if __name__ == "__main__":
+    main()
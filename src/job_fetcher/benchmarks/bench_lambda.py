@@ -0,0 +1,214 @@
+"""
+### Description:
+- End to end benchmark of the job fetcher `lambda_handler` against the
+  local mock servers in `mock_servers.py`, so no network, token or
+  database is needed.
+- Every iteration is a forced run with an empty seen cache. The first
+  iteration also pays for the token and proxy caches, later ones run
+  warm.
+- Measures wall time, requests and bytes sent per route, and peak
+  python memory, next to the handler's own per stage metrics. The report is written as JSON and can be compared
+  with a report from another commit.
+
+### Usage:
+    python -m benchmarks.bench_lambda [--iterations 5] [--output report.json]
+        [--compare baseline.json] [--graphql-latency 0.05] ...
+"""
+
+# pylint: disable=wrong-import-position
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_servers import MockConfig, MockUpwork
+from src.metrics import MemorySink
+
+
+def git_commit() -> str | None:
+    """The current commit, so reports can be told apart"""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(fetch_jobs, server: MockUpwork, verbose: bool) -> dict:
+    """
+    ### Description:
+        - Runs the handler once with an empty seen cache.
+
+    ### Returns:
+        - `dict`
+            Measurements of this run.
+    """
+
+    fetch_jobs.SEEN_CACHE = None
+    with contextlib.suppress(OSError):
+        os.remove(os.environ["SEEN_CACHE_PATH"])
+    server.reset_counters()
+    sink = MemorySink()
+
+    output = (
+        contextlib.nullcontext()
+        if verbose
+        else contextlib.redirect_stdout(io.StringIO())
+    )
+    tracemalloc.start()
+    start = time.perf_counter()
+    with output, patch.object(fetch_jobs.METRICS, "sink", sink):
+        response = fetch_jobs.lambda_handler({"force": True}, None)
+    wall_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "status_code": response["statusCode"],
+        "body": json.loads(response["body"]),
+        "wall_time": round(wall_time, 4),
+        "requests": sum(server.requests.values()),
+        "bytes_sent": sum(server.bytes_sent.values()),
+        "peak_memory": peak,
+        "by_route": {
+            x: {"requests": server.requests[x], "bytes_sent": server.bytes_sent[x]}
+            for x in sorted(server.requests)
+        },
+        "metrics": {
+            x: y for x, y in sink.records()[-1].items() if x not in ("_aws", "Service")
+        },
+    }
+
+
+def run(config: MockConfig, iterations: int, verbose: bool = False) -> dict:
+    """
+    ### Description:
+        - Starts the mock servers and benchmarks the handler.
+
+    ### Args:
+        - `config`: MockConfig
+            Latency and failure settings of the mock servers.
+        - `iterations`: int
+            Number of handler runs.
+        - `verbose`: bool
+            Whether to show the handler's output.
+
+    ### Returns:
+        - `dict`
+            The report.
+    """
+
+    server = MockUpwork(config)
+    server.start()
+    folder = tempfile.TemporaryDirectory()
+    env = {
+        **server.env(),
+        "SEEN_CACHE_PATH": os.path.join(folder.name, "seen.sqlite3"),
+        "PROXY_CACHE_PATH": os.path.join(folder.name, "proxies.json"),
+        "TOKEN_CACHE_DIR": folder.name,
+        "SCHEDULER_STATE_PATH": os.path.join(folder.name, "scheduler.json"),
+    }
+
+    imported = sys.modules.pop("src.fetch_jobs", None)
+    try:
+        with patch.dict("os.environ", env):
+            # the lambda builds its caches at import, so import after
+            # the env points at the mock servers
+            fetch_jobs = importlib.import_module("src.fetch_jobs")
+
+            with patch.object(fetch_jobs, "GRAPHQL_URL", server.graphql_url()):
+                runs = [
+                    run_once(fetch_jobs, server, verbose) for _ in range(iterations)
+                ]
+    finally:
+        sys.modules.pop("src.fetch_jobs", None)
+        if imported:
+            sys.modules["src.fetch_jobs"] = imported
+        server.stop()
+        folder.cleanup()
+
+    warm = runs[1:] or runs
+    return {
+        "commit": git_commit(),
+        "config": config.model_dump(),
+        "iterations": iterations,
+        "summary": {
+            "cold_wall_time": runs[0]["wall_time"],
+            "warm_wall_time_median": round(
+                statistics.median(x["wall_time"] for x in warm), 4
+            ),
+            "warm_requests_median": statistics.median(x["requests"] for x in warm),
+            "warm_bytes_sent_median": statistics.median(x["bytes_sent"] for x in warm),
+            "peak_memory_max": max(x["peak_memory"] for x in runs),
+        },
+        "runs": runs,
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """
+    ### Description:
+        - Relative change of every summary number against a baseline
+          report, e.g. `0.1` for 10% more than the baseline.
+    """
+
+    changes = {}
+    for key, value in report["summary"].items():
+        before = baseline.get("summary", {}).get(key)
+        if before:
+            changes[key] = round((value - before) / before, 4)
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--graphql-latency", type=float, default=0.05)
+    parser.add_argument("--postgrest-latency", type=float, default=0.02)
+    parser.add_argument("--insert-error-rate", type=float, default=0)
+    parser.add_argument("--proxy-error-rate", type=float, default=0)
+    parser.add_argument(
+        "--new-jobs",
+        type=int,
+        help="Jobs newer than the stored high water mark. Default: no mark",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Writes the report to this file")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    bench_config = MockConfig(
+        graphql_latency=args.graphql_latency,
+        postgrest_latency=args.postgrest_latency,
+        insert_error_rate=args.insert_error_rate,
+        proxy_error_rate=args.proxy_error_rate,
+        new_jobs=args.new_jobs,
+        seed=args.seed,
+    )
+    bench_report = run(bench_config, args.iterations, args.verbose)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as rf:
+            bench_report["compared_to"] = compare(bench_report, json.load(rf))
+
+    print(json.dumps({x: y for x, y in bench_report.items() if x != "runs"}, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as wf:
+            json.dump(bench_report, wf, indent=2)
@@ -0,0 +1,97 @@
+"""
+### Description:
+- Micro-benchmark for parsing GraphQL search pages into jobs and
+  serializing them into PostgREST bulk insert bodies.
+- Runs on the recorded pages in `benchmarks/fixtures` and compares the
+  current path with the previous `JobList(**response.json())` and
+  per job `model_dump_json` path.
+
+### Usage:
+    python -m benchmarks.bench_parsing [--rounds 200] [--output report.json]
+"""
+
+# pylint: disable=wrong-import-position
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fetch_jobs import JobList, parse_feed, serialize_jobs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures() -> list[bytes]:
+    """Reads every recorded GraphQL page"""
+
+    pages = []
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.startswith("graphql_") and name.endswith(".json"):
+            with open(os.path.join(FIXTURES, name), "rb") as rf:
+                pages.append(rf.read())
+    return pages
+
+
+def legacy_parse(raw: bytes) -> JobList:
+    return JobList(**json.loads(raw))
+
+
+def legacy_serialize(jobs: list) -> str:
+    return "[" + ",".join(x.model_dump_json(exclude="job_type") for x in jobs) + "]"
+
+
+def jobs_per_second(func, pages: list, jobs: int, rounds: int) -> int:
+    """Best of 5 runs, so noise from other processes is filtered out"""
+
+    timings = timeit.repeat(lambda: [func(x) for x in pages], number=rounds, repeat=5)
+    return round(jobs * rounds / min(timings))
+
+
+def run(rounds: int) -> dict:
+    """
+    ### Description:
+        - Benchmarks parsing and serialization on the fixtures.
+
+    ### Args:
+        - `rounds`: int
+            How often every fixture is processed per run.
+
+    ### Returns:
+        - `dict`
+            Jobs per second for every path.
+    """
+
+    pages = load_fixtures()
+    parsed = [parse_feed(x).jobs for x in pages]
+    jobs = sum(len(x) for x in parsed)
+
+    assert serialize_jobs(parsed[0]).decode() == legacy_serialize(parsed[0])
+
+    return {
+        "pages": len(pages),
+        "jobs": jobs,
+        "rounds": rounds,
+        "parse_jobs_per_sec": jobs_per_second(parse_feed, pages, jobs, rounds),
+        "legacy_parse_jobs_per_sec": jobs_per_second(legacy_parse, pages, jobs, rounds),
+        "serialize_jobs_per_sec": jobs_per_second(serialize_jobs, parsed, jobs, rounds),
+        "legacy_serialize_jobs_per_sec": jobs_per_second(
+            legacy_serialize, parsed, jobs, rounds
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--output", help="Writes the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.rounds)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as wf:
+            json.dump(report, wf, indent=2)
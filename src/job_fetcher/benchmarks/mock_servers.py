@@ -0,0 +1,236 @@
+"""
+### Description:
+- A local stand-in for everything the job fetcher talks to: the proxy
+  list, the proxies themselves, the Upwork GraphQL api, PostgREST and
+  the authorizer.
+- GraphQL requests replay the recorded pages in `benchmarks/fixtures`.
+- Every route has a configurable latency, and inserts and proxies can
+  fail at a configurable rate. Requests and the bytes sent to each
+  route are counted.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import BaseModel
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class MockConfig(BaseModel):
+    """
+    ### Description:
+    - Behaviour of the mock servers.
+    """
+
+    graphql_latency: float = 0.05
+    postgrest_latency: float = 0.02
+    insert_error_rate: float = 0
+    proxy_error_rate: float = 0
+    new_jobs: int | None = None
+    seed: int = 0
+
+
+def load_pages() -> list[dict]:
+    """Reads the recorded GraphQL search pages, in name order"""
+
+    pages = []
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.startswith("graphql_") and name.endswith(".json"):
+            with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as rf:
+                pages.append(json.load(rf))
+    return pages
+
+
+def page_results(page: dict) -> list[dict]:
+    return page["data"]["search"]["universalSearchNuxt"]["visitorJobSearchV1"][
+        "results"
+    ]
+
+
+class MockUpwork(ThreadingHTTPServer):
+    """
+    ### Description:
+    - Threaded http server answering every mocked route.
+    - The server doubles as the http proxy. Proxied requests arrive
+      with the absolute url as path, which is routed like any other.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig | None = None) -> None:
+
+        super().__init__(("127.0.0.1", 0), MockHandler)
+        self.config = config or MockConfig()
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.results = [x for page in load_pages() for x in page_results(page)]
+        self.requests: dict[str, int] = defaultdict(int)
+        self.bytes_sent: dict[str, int] = defaultdict(int)
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def env(self) -> dict[str, str]:
+        """Env vars pointing the job fetcher at this server"""
+
+        return {
+            "POSTGREST_URL": self.url + "rest/",
+            "SUPABASE_CLIENT_ANON_KEY": "bench",
+            "PROXY_URL": self.url + "proxies",
+            "AUTHORIZER_URL": self.url + "authorizer",
+            "AUTH_SECRET": "bench",
+        }
+
+    def graphql_url(self) -> str:
+        return self.url + "api/graphql/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_sent.clear()
+
+    def count(self, route: str, size: int):
+        with self.lock:
+            self.requests[route] += 1
+            self.bytes_sent[route] += size
+
+    def fails(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+    def high_water_mark(self) -> list[dict]:
+        """The stored job the crawl should stop at, if any"""
+
+        new_jobs = self.config.new_jobs
+        if new_jobs is None or new_jobs >= len(self.results):
+            return []
+        job = self.results[new_jobs]["jobTile"]["job"]
+        return [
+            {
+                "link": "https://www.upwork.com/jobs/" + job["ciphertext"],
+                "published_date": job["publishTime"],
+            }
+        ]
+
+    def search_page(self, body: bytes) -> dict:
+        """Serves the recorded results at the requested offset"""
+
+        paging = json.loads(body)["variables"]["requestVariables"]["paging"]
+        start = paging["offset"]
+        results = self.results[start : start + paging["count"]]
+        return {
+            "data": {
+                "search": {
+                    "universalSearchNuxt": {"visitorJobSearchV1": {"results": results}}
+                }
+            }
+        }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes requests to the mocked services"""
+
+    server: MockUpwork
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        pass
+
+    def _read(self) -> bytes:
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        size = len(self.requestline) + len(str(self.headers)) + len(body)
+        route = self.command + " " + urlsplit(self.path).path
+        self.server.count(route, size)
+        return body
+
+    def _send(self, status: int, payload=None):
+
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):  # pylint:disable=invalid-name
+
+        self._read()
+        config = self.server.config
+        url = urlsplit(self.path)
+
+        if url.path == "/proxies":
+            port = self.server.server_port
+            self._send_text(
+                "\n".join(f"127.0.0.1:{port}:bench{x}:bench" for x in range(10))
+            )
+        elif url.path == "/rest/token_tracker":
+            time.sleep(config.postgrest_latency)
+            self._send(
+                200,
+                [
+                    {
+                        "token_name": "UniversalSearch",
+                        "token_value": "oauth2v2_bench",
+                        "expires": time.time() + 3600,
+                    }
+                ],
+            )
+        elif url.path == "/rest/upwork_jobs_streaming":
+            time.sleep(config.postgrest_latency)
+            self._send(200, self.server.high_water_mark())
+        else:
+            self._send(404, {"message": "unknown route " + url.path})
+
+    def do_POST(self):  # pylint:disable=invalid-name
+
+        body = self._read()
+        config = self.server.config
+        url = urlsplit(self.path)
+
+        if url.path == "/api/graphql/v1":
+            if self.server.fails(config.proxy_error_rate):
+                self._send(407)
+                return
+            time.sleep(config.graphql_latency)
+            self._send(200, self.server.search_page(body))
+        elif url.path == "/rest/upwork_jobs_streaming":
+            time.sleep(config.postgrest_latency)
+            if self.server.fails(config.insert_error_rate):
+                self._send(500, {"message": "injected failure"})
+                return
+            if parse_qs(url.query).get("on_conflict") != ["link"]:
+                self._send(409, {"message": "duplicate key value"})
+                return
+            self._send(201)
+        elif url.path == "/authorizer":
+            self._send(200, {"token": "oauth2v2_bench", "expires": time.time() + 3600})
+        else:
+            self._send(404, {"message": "unknown route " + url.path})
+
+    def _send_text(self, text: str):
+
+        data = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
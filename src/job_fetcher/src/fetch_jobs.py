@@ -1,15 +1,18 @@
 """
-- This module is responsible for fetching jobs from the Upwork public job board 
+- This module is responsible for fetching jobs from the Upwork public job board
   and saving them to a database.
 - It can be configured to run on a schedule.
 
 """
 
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import asyncio
 import json
-import random
+import sqlite3
+import sys
+import tempfile
+import time
 
 from pydantic import (
     BaseModel,
@@ -19,13 +22,29 @@ from pydantic import (
     model_validator,
     field_serializer,
     field_validator,
+    TypeAdapter,
+    ValidationError,
 )
 import httpx
 import ua_generator
 import dotenv
 
+try:
+    from .proxy_pool import ProxyPool, ProxyListCache
+    from .token_cache import TokenCache, CachedToken
+    from .scheduler import PollScheduler, log_decision
+    from .metrics import Metrics
+except ImportError:  # flat layout inside the lambda zip
+    from proxy_pool import ProxyPool, ProxyListCache
+    from token_cache import TokenCache, CachedToken
+    from scheduler import PollScheduler, log_decision
+    from metrics import Metrics
+
 dotenv.load_dotenv()
 
+PROXY_POOL = ProxyPool()
+METRICS = Metrics("UpworkScraper", "job_fetcher")
+
 
 class OntologySkill(BaseModel):
     """
@@ -55,13 +74,13 @@ class Job(BaseModel):
     )
     is_hourly: bool = None
     job_type: str = Field(validation_alias=AliasPath("jobTile", "job", "jobType"))
-    hourly_low: int | str | None = Field(
+    hourly_low: int | None = Field(
         validation_alias=AliasPath("jobTile", "job", "hourlyBudgetMin")
     )
-    hourly_high: int | str | None = Field(
+    hourly_high: int | None = Field(
         validation_alias=AliasPath("jobTile", "job", "hourlyBudgetMax")
     )
-    budget: int | str | None = Field(
+    budget: int | None = Field(
         validation_alias=AliasChoices(
             AliasPath("jobTile", "job", "fixedPriceAmount", "amount"),
             AliasPath("jobTile", "job", "fixedPriceAmount"),
@@ -79,12 +98,14 @@ class Job(BaseModel):
 
         return self
 
-    @field_validator("hourly_low", "hourly_high", "budget", mode="after")
+    @field_validator("hourly_low", "hourly_high", "budget", mode="before")
     @classmethod
     def _str2int(cls, value):
 
-        if value is None:
-            return None
+        # converting up front leaves a plain int check instead of
+        # validating the int | str union and converting afterwards
+        if value is None or type(value) is int:
+            return value
 
         return int(float(value))
 
@@ -110,6 +131,8 @@ class JobList(BaseModel):
     - Represents a list of job postings returned from
       the job API.
     - Contains a list of Job objects.
+    - A crawl also keeps the links of every job it fetched, before the
+      high water mark filter, as the poll scheduler's signal.
     """
 
     jobs: list[Job] = Field(
@@ -117,37 +140,136 @@ class JobList(BaseModel):
             "data", "search", "universalSearchNuxt", "visitorJobSearchV1", "results"
         )
     )
+    crawled_links: list[str] = Field(default=[], exclude=True)
 
 
-def get_auth_token(use_authorizer=False) -> str:
+JOB_LIST_ADAPTER = TypeAdapter(JobList)
+JOBS_ADAPTER = TypeAdapter(list[Job])
+
+
+class TokenRejected(Exception):
     """
     ### Description:
-        - Retrieves an authorization token to access the job API.
-        - Can optionally use an authorizer server for token fetching.
+    - Raised when Upwork refuses the auth token, either with a 401/403
+      or with a GraphQL authentication error.
+    - Only this error makes the lambda drop its cached token and ask
+      the authorizer for a new one.
+    """
+
+
+AUTH_ERROR_MARKERS = ("unauthenticated", "unauthorized", "oauth", "token")
+
+
+def is_auth_error(raw_feed: bytes | str | dict) -> bool:
+    """
+    ### Description:
+        - Checks whether a GraphQL response that didn't parse as a feed
+          carries an authentication error.
 
     ### Args:
-        - `use_authorizer`: bool
-            Indicates whether to use the authorizer service.
+        - `raw_feed`: bytes | str | dict
+            The response body, or an already decoded response.
 
     ### Returns:
-        - `str`
-            The retrieved authorization token.
+        - `bool`
+            True if one of the GraphQL errors is about authentication.
+    """
+
+    try:
+        data = raw_feed if isinstance(raw_feed, dict) else json.loads(raw_feed)
+        errors = data.get("errors") or []
+    except (ValueError, AttributeError):
+        return False
+
+    return any(
+        x in json.dumps(error).lower() for error in errors for x in AUTH_ERROR_MARKERS
+    )
+
+
+def parse_feed(raw_feed: bytes | str | dict) -> JobList:
+    """
+    ### Description:
+        - Parses a GraphQL search response into a JobList.
+        - Raw bytes are validated straight from JSON by pydantic-core,
+          skipping the intermediate python dict of `response.json()`.
+
+    ### Args:
+        - `raw_feed`: bytes | str | dict
+            The response body, or an already decoded response.
+
+    ### Returns:
+        - `JobList`
+            The parsed jobs.
+
+    ### Raises:
+        - `TokenRejected`:
+            If the response is a GraphQL authentication error.
+        - `pydantic.ValidationError`:
+            If the response is not a feed for any other reason.
+    """
+
+    with METRICS.span("parse"):
+        try:
+            if isinstance(raw_feed, dict):
+                return JOB_LIST_ADAPTER.validate_python(raw_feed)
+            return JOB_LIST_ADAPTER.validate_json(raw_feed)
+        except ValidationError:
+            if is_auth_error(raw_feed):
+                raise TokenRejected("GraphQL authentication error") from None
+            raise
+
+
+def fetch_token_from_authorizer(rejected: str | None = None) -> CachedToken:
+    """
+    ### Description:
+        - Asks the authorizer lambda to mint and publish a new token.
+
+    ### Args:
+        - `rejected`: str | None
+            The token Upwork just rejected, so the authorizer doesn't
+            hand it back as a recently published one.
+
+    ### Returns:
+        - `CachedToken`
+            The new token. If the authorizer doesn't report an expiry,
+            `DEFAULT_TOKEN_TTL` seconds are assumed.
 
     ### Raises:
         - `ValueError`:
             If unable to retrieve the token.
     """
 
-    if use_authorizer:
-        print("Using authorizer to get a token")
-        res = httpx.post(
-            os.getenv("AUTHORIZER_URL"),
-            json={"secret": os.getenv("AUTH_SECRET")},
-            timeout=60,
-        )
-        if res.status_code != 200:
-            raise ValueError("Unable to get token via authorizer")
-        return res.json().get("token")
+    print("Using authorizer to get a token")
+    payload = {"secret": os.getenv("AUTH_SECRET")}
+    if rejected:
+        payload["rejected_token"] = rejected
+    res = httpx.post(os.getenv("AUTHORIZER_URL"), json=payload, timeout=60)
+    if res.status_code != 200:
+        raise ValueError("Unable to get token via authorizer")
+
+    data = res.json()
+    if isinstance(data, str):
+        data = json.loads(data)
+    if not data.get("token"):
+        raise ValueError("Authorizer returned no token")
+
+    return CachedToken(
+        token_name="UniversalSearch",
+        token_value=data["token"],
+        expires=data.get("expires")
+        or time.time() + float(os.getenv("DEFAULT_TOKEN_TTL", "1800")),
+    )
+
+
+def fetch_token_from_postgres() -> CachedToken | None:
+    """
+    ### Description:
+        - Reads the newest published token and its expiry from postgres.
+
+    ### Returns:
+        - `CachedToken | None`
+            The newest token, or None if it couldn't be read.
+    """
 
     print("Getting Auth token from postgres")
     anon_key = os.getenv("SUPABASE_CLIENT_ANON_KEY")
@@ -161,7 +283,7 @@ def get_auth_token(use_authorizer=False) -> str:
             "Prefer": "return=minimal",
         }
         params = {
-            "select": "token_value",
+            "select": "token_name,token_value,expires",
             "token_name": "eq.UniversalSearch",
             "order": "created_at.desc",
             "limit": 1,
@@ -169,46 +291,77 @@ def get_auth_token(use_authorizer=False) -> str:
 
         response = httpx.get(url, headers=headers, params=params, timeout=3)
 
-        return response.json()[0]["token_value"]
+        return CachedToken(**response.json()[0])
     except Exception as error:
         print("Error fetching token from postgres", error)
 
 
-def download_proxies() -> list[str]:
-    res = httpx.get(os.getenv("PROXY_URL"), timeout=5)
-    return res.text.split()
+def load_token() -> CachedToken:
+    """
+    ### Description:
+        - Loads a token with enough life left for the cache.
+        - Postgres is checked first, since another worker may already
+          have published a fresh token. The authorizer is only called
+          when that token is missing or about to expire.
 
+    ### Returns:
+        - `CachedToken`
+            A token that is not close to expiring.
+    """
 
-def get_proxy(proxies: list[str]) -> str:
-    """"""
+    token = fetch_token_from_postgres()
+    if token and token.seconds_left() > TOKEN_CACHE.refresh_margin:
+        return token
 
-    print("Getting a new proxy")
+    return fetch_token_from_authorizer()
 
-    proxy = random.choice(proxies)
-    ip, port, user, password = proxy.split(":")
 
-    return "http://" + user + ":" + password + "@" + ip + ":" + port
+TOKEN_CACHE = TokenCache("UniversalSearch", load_token)
 
 
-def collect_jobs(auth_token: str, proxies: list[str]) -> dict | None:
+def get_auth_token(use_authorizer=False) -> str:
     """
     ### Description:
-        - Collects job postings from the Upwork API using the provided authorization token.
-        - Makes a GraphQL request to fetch job details.
+        - Retrieves an authorization token to access the job API.
+        - Tokens are served from the token cache until shortly before
+          they expire.
+        - Can optionally force a new token from the authorizer server,
+          e.g. after the cached one was rejected.
 
     ### Args:
-        - `auth_token`: str
-            The authorization token to include in the API request.
+        - `use_authorizer`: bool
+            Indicates whether to use the authorizer service.
 
     ### Returns:
-        - `dict | None`
-            A dictionary containing job postings or None if unsuccessful.
+        - `str`
+            The retrieved authorization token.
+
+    ### Raises:
+        - `ValueError`:
+            If unable to retrieve the token.
     """
 
-    url = "https://www.upwork.com/api/graphql/v1"
+    if use_authorizer:
+        rejected = TOKEN_CACHE.token
+        TOKEN_CACHE.invalidate()
+        token = fetch_token_from_authorizer(rejected and rejected.token_value)
+        TOKEN_CACHE.put(token)
+        return token.token_value
+
+    return TOKEN_CACHE.get()
+
 
-    payload = {
-        "query": """
+def download_proxies() -> list[str]:
+    res = httpx.get(os.getenv("PROXY_URL"), timeout=5)
+    res.raise_for_status()
+    return res.text.split()
+
+
+PROXY_LIST = ProxyListCache(download_proxies)
+
+
+GRAPHQL_URL = "https://www.upwork.com/api/graphql/v1"
+SEARCH_QUERY = """
             query VisitorJobSearch($requestVariables: VisitorJobSearchV1Request!) {
                 search {
                 universalSearchNuxt {
@@ -239,16 +392,47 @@ def collect_jobs(auth_token: str, proxies: list[str]) -> dict | None:
                 }
                 }
             }
-    """,
+    """
+
+
+def search_payload(
+    offset: int = 0, count: int = 50, filters: dict | None = None
+) -> dict:
+    """
+    ### Description:
+        - Builds the GraphQL body for one page of the recency feed.
+
+    ### Args:
+        - `offset`: int
+            Position in the recency-sorted results to start from.
+        - `count`: int
+            Number of jobs to request in this page.
+        - `filters`: dict | None
+            Extra `VisitorJobSearchV1Request` fields narrowing the
+            search, e.g. `{"userQuery": "python"}`.
+
+    ### Returns:
+        - `dict`
+            The request body.
+    """
+
+    return {
+        "query": SEARCH_QUERY,
         "variables": {
             "requestVariables": {
+                **(filters or {}),
                 "sort": "recency",
                 "highlight": True,
-                "paging": {"offset": 0, "count": 50},
+                "paging": {"offset": offset, "count": count},
             }
         },
     }
-    headers = {
+
+
+def search_headers(auth_token: str) -> dict:
+    """Browser like headers for the GraphQL api"""
+
+    return {
         "User-Agent": str(ua_generator.generate()),
         "Accept": "*/*",
         "Accept-Language": "en-GB,en;q=0.7,en-US;q=0.3",
@@ -262,39 +446,99 @@ def collect_jobs(auth_token: str, proxies: list[str]) -> dict | None:
         "Connection": "keep-alive",
     }
 
-    retries = 0
-    while retries < 10:
+
+def collect_jobs(
+    auth_token: str, proxies: ProxyPool, offset: int = 0, count: int = 50
+) -> bytes:
+    """
+    ### Description:
+        - Collects job postings from the Upwork API using the provided authorization token.
+        - Makes a GraphQL request to fetch job details.
+
+    ### Args:
+        - `auth_token`: str
+            The authorization token to include in the API request.
+        - `proxies`: ProxyPool
+            The proxy pool to route the request through.
+        - `offset`: int
+            Position in the recency-sorted results to start from.
+        - `count`: int
+            Number of jobs to request in this page.
+
+    ### Returns:
+        - `bytes`
+            The raw response body, to be parsed with `parse_feed`.
+
+    ### Raises:
+        - `RuntimeError`:
+            If every retry failed on a proxy error.
+        - `TokenRejected`:
+            If Upwork refused the auth token.
+    """
+
+    url = GRAPHQL_URL
+    payload = search_payload(offset, count)
+    headers = search_headers(auth_token)
+
+    for _ in range(10):
+        proxy = proxies.get()
+        METRICS.count("graphql_requests")
+        start = time.monotonic()
         try:
-            response = httpx.post(
-                url, json=payload, headers=headers, proxy=get_proxy(proxies)
-            )
+            with METRICS.span("graphql"):
+                response = httpx.post(url, json=payload, headers=headers, proxy=proxy)
 
             if response.status_code == 407:
                 raise RuntimeError("Invalid Proxy")
-            if response.status_code != 200:
+            if response.status_code in (401, 403):
+                raise TokenRejected(f"Upwork answered {response.status_code}")
+            if response.status_code == 200:
+                proxies.report_success(proxy, time.monotonic() - start)
+            else:
                 print(response.text)
-            break
-        except (RuntimeError, httpx.ProxyError):
+            return response.content
+        except (RuntimeError, httpx.TransportError) as e:
             print("Error on proxy. Retrying")
-            retries += 1
-            continue
+            METRICS.count(
+                "proxy_407" if isinstance(e, RuntimeError) else "proxy_errors"
+            )
+            proxies.report_failure(proxy)
 
-    return response.json()
+    raise RuntimeError("Ran out of proxy retries")
 
 
-async def upload_to_db(job: Job, client: httpx.Client):
+class HighWaterMark(BaseModel):
     """
     ### Description:
-        - Asynchronously uploads a single Job instance to the database.
-        - Handles exceptions while inserting jobs into the database.
+    - Represents the newest job already stored in the database.
+    - Used as the cursor where paging through the recency feed stops.
+    """
 
-    ### Args:
-        - `job`: Job
-            The Job instance to upload.
-        - `client`: httpx.Client
-            The HTTP client for making requests.
+    link: str
+    published_date: datetime
+
+    @field_validator("published_date", mode="after")
+    @classmethod
+    def _assume_utc(cls, value: datetime):
+
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+
+def get_high_water_mark() -> HighWaterMark | None:
+    """
+    ### Description:
+        - Retrieves the newest stored job from `upwork_jobs_streaming`.
+        - The jobs table itself acts as the crawler state, so the cursor
+          is always in step with what was actually saved.
+
+    ### Returns:
+        - `HighWaterMark | None`
+            The newest stored job, or None if it couldn't be fetched.
     """
 
+    print("Getting high water mark from postgres")
     anon_key = os.getenv("SUPABASE_CLIENT_ANON_KEY")
     base_url = os.getenv("POSTGREST_URL")
     try:
@@ -303,45 +547,641 @@ async def upload_to_db(job: Job, client: httpx.Client):
             "apikey": anon_key,
             "Authorization": f"Bearer {anon_key}",
             "Content-Type": "application/json",
-            "Prefer": "return=minimal",
         }
+        params = {
+            "select": "link,published_date",
+            "order": "published_date.desc",
+            "limit": 1,
+        }
+
+        response = httpx.get(url, headers=headers, params=params, timeout=3)
+        rows = response.json()
+        if not rows:
+            return None
+        return HighWaterMark(**rows[0])
+    except Exception as error:
+        print("Error fetching high water mark from postgres", error)
+
+
+def crawl_jobs(
+    auth_token: str,
+    proxies: ProxyPool,
+    high_water_mark: HighWaterMark | None,
+    max_pages: int | None = None,
+    page_size: int = 50,
+) -> JobList:
+    """
+    ### Description:
+        - Pages forward through the recency feed until the previous
+          high water mark is reached.
+        - Without a high water mark only the first page is fetched.
+        - Jobs are deduped by link, since new postings shift offsets
+          while we page.
+
+    ### Args:
+        - `auth_token`: str
+            The authorization token to include in the API request.
+        - `proxies`: ProxyPool
+            The proxy pool to route the requests through.
+        - `high_water_mark`: HighWaterMark | None
+            The newest job saved by a previous run.
+        - `max_pages`: int | None
+            Upper bound on pages per run. Defaults to the
+            `CRAWL_MAX_PAGES` env var, or 10.
+        - `page_size`: int
+            Number of jobs requested per page.
+
+    ### Returns:
+        - `JobList`
+            All jobs newer than or as new as the high water mark, and
+            the links of every job fetched on the way.
+    """
+
+    if max_pages is None:
+        max_pages = int(os.getenv("CRAWL_MAX_PAGES", "10"))
+    if not high_water_mark:
+        max_pages = 1
+
+    seen_links = set()
+    collected: list[Job] = []
+    crawled: list[str] = []
+    for page in range(max_pages):
+        raw_feed = collect_jobs(auth_token, proxies, page * page_size, page_size)
+        jobs = parse_feed(raw_feed)
+        crawled.extend(x.link for x in jobs.jobs)
+
+        reached_mark = False
+        for job in jobs.jobs:
+            if high_water_mark and (
+                job.link == high_water_mark.link
+                or job.published_date < high_water_mark.published_date
+            ):
+                reached_mark = True
+                continue
+            if job.link in seen_links:
+                continue
+            seen_links.add(job.link)
+            collected.append(job)
+
+        print(f"Page {page + 1}: {len(jobs.jobs)} jobs, {len(collected)} new so far")
+        if reached_mark or len(jobs.jobs) < page_size:
+            break
+    else:
+        if high_water_mark:
+            print(f"Stopped after {max_pages} pages before reaching high water mark")
+
+    return JobList.model_construct(jobs=collected, crawled_links=crawled)
+
+
+class SearchVariant(BaseModel):
+    """
+    ### Description:
+    - A named search narrowing the recency feed, e.g. by category,
+      query term, job type or contractor tier.
+    - `filters` is merged into the GraphQL `requestVariables`.
+    """
+
+    name: str
+    filters: dict = {}
+
+
+def get_search_variants() -> list[SearchVariant]:
+    """
+    ### Description:
+        - Reads the search variants from the `SEARCH_VARIANTS` env var,
+          a JSON list of `{"name": ..., "filters": {...}}` objects.
+
+    ### Returns:
+        - `list[SearchVariant]`
+            The configured variants, or an empty list to use the single
+            unfiltered crawl.
+    """
+
+    raw = os.getenv("SEARCH_VARIANTS")
+    if not raw:
+        return []
+
+    try:
+        return [SearchVariant(**x) for x in json.loads(raw)]
+    except (ValueError, TypeError) as error:
+        print("Invalid SEARCH_VARIANTS. Using the unfiltered crawl", error)
+        return []
+
+
+class ProxyClients:
+    """
+    ### Description:
+    - Keeps one async client per proxy, since httpx binds proxies to
+      clients. Connections are reused by every request through the
+      same proxy within a fan-out.
+    """
+
+    def __init__(self) -> None:
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    def get(self, proxy: str) -> httpx.AsyncClient:
+        """Returns the client for a proxy, creating it on first use"""
+
+        if proxy not in self.clients:
+            self.clients[proxy] = httpx.AsyncClient(proxy=proxy, timeout=10)
+        return self.clients[proxy]
+
+    async def aclose(self):
+        """Closes every client"""
+
+        await asyncio.gather(*(x.aclose() for x in self.clients.values()))
+        self.clients = {}
+
+
+async def collect_jobs_async(
+    auth_token: str,
+    proxies: ProxyPool,
+    clients: ProxyClients,
+    filters: dict | None = None,
+    offset: int = 0,
+    count: int = 50,
+) -> bytes:
+    """
+    ### Description:
+        - Async version of `collect_jobs` for a filtered search.
+        - Each retry picks a fresh proxy from the pool.
+
+    ### Args:
+        - `auth_token`: str
+            The authorization token to include in the API request.
+        - `proxies`: ProxyPool
+            The proxy pool to route the request through.
+        - `clients`: ProxyClients
+            The per proxy clients of this fan-out.
+        - `filters`: dict | None
+            Extra search fields for this variant.
+        - `offset`: int
+            Position in the recency-sorted results to start from.
+        - `count`: int
+            Number of jobs to request in this page.
+
+    ### Returns:
+        - `bytes`
+            The raw GraphQL response body.
+
+    ### Raises:
+        - `RuntimeError`:
+            If every retry failed on a proxy error.
+        - `TokenRejected`:
+            If Upwork refused the auth token.
+    """
+
+    payload = search_payload(offset, count, filters)
+    headers = search_headers(auth_token)
+
+    for _ in range(10):
+        proxy = proxies.get()
+        METRICS.count("graphql_requests")
+        start = time.monotonic()
+        try:
+            with METRICS.span("graphql"):
+                response = await clients.get(proxy).post(
+                    GRAPHQL_URL, json=payload, headers=headers
+                )
+
+            if response.status_code == 407:
+                raise RuntimeError("Invalid Proxy")
+            if response.status_code in (401, 403):
+                raise TokenRejected(f"Upwork answered {response.status_code}")
+            if response.status_code == 200:
+                proxies.report_success(proxy, time.monotonic() - start)
+            else:
+                print(response.text[:250])
+            return response.content
+        except (RuntimeError, httpx.TransportError) as e:
+            print("Error on proxy. Retrying")
+            METRICS.count(
+                "proxy_407" if isinstance(e, RuntimeError) else "proxy_errors"
+            )
+            proxies.report_failure(proxy)
+
+    raise RuntimeError("Ran out of proxy retries")
+
+
+async def crawl_variant(
+    auth_token: str,
+    proxies: ProxyPool,
+    clients: ProxyClients,
+    variant: SearchVariant,
+    high_water_mark: HighWaterMark | None,
+    max_pages: int,
+    page_size: int,
+) -> JobList:
+    """
+    ### Description:
+        - Pages through one search variant until a job older than the
+          high water mark shows up, like `crawl_jobs` does for the
+          unfiltered feed.
+
+    ### Returns:
+        - `JobList`
+            The new jobs found by this variant, and the links of every
+            job fetched on the way.
+    """
+
+    collected: list[Job] = []
+    crawled: list[str] = []
+    for page in range(max_pages):
+        raw_feed = await collect_jobs_async(
+            auth_token, proxies, clients, variant.filters, page * page_size, page_size
+        )
+        jobs = parse_feed(raw_feed)
+        crawled.extend(x.link for x in jobs.jobs)
+
+        reached_mark = False
+        for job in jobs.jobs:
+            if high_water_mark and (
+                job.link == high_water_mark.link
+                or job.published_date < high_water_mark.published_date
+            ):
+                reached_mark = True
+                continue
+            collected.append(job)
+
+        if reached_mark or len(jobs.jobs) < page_size:
+            break
+
+    print(f"Variant {variant.name}: {len(collected)} new jobs")
+    return JobList.model_construct(jobs=collected, crawled_links=crawled)
+
+
+async def fan_out_jobs(
+    auth_token: str,
+    proxies: ProxyPool,
+    variants: list[SearchVariant],
+    high_water_mark: HighWaterMark | None,
+    max_pages: int | None = None,
+    page_size: int = 50,
+    concurrency: int | None = None,
+) -> JobList:
+    """
+    ### Description:
+        - Crawls several search variants concurrently, spread over the
+          proxy pool, and merges them into one list deduped by link.
+        - A failing variant is logged and skipped. Only when every
+          variant fails is the error raised, so the caller can retry
+          with a new token.
+
+    ### Args:
+        - `auth_token`: str
+            The authorization token to include in the API requests.
+        - `proxies`: ProxyPool
+            The proxy pool to route the requests through.
+        - `variants`: list[SearchVariant]
+            The searches to run.
+        - `high_water_mark`: HighWaterMark | None
+            The newest job saved by a previous run.
+        - `max_pages`: int | None
+            Upper bound on pages per variant. Defaults to the
+            `CRAWL_MAX_PAGES` env var, or 10.
+        - `page_size`: int
+            Number of jobs requested per page.
+        - `concurrency`: int | None
+            Variants crawled at once. Defaults to the
+            `FANOUT_CONCURRENCY` env var, or 5.
+
+    ### Returns:
+        - `JobList`
+            The merged new jobs, newest first, and the links of every
+            job fetched by any variant.
+    """
+
+    if max_pages is None:
+        max_pages = int(os.getenv("CRAWL_MAX_PAGES", "10"))
+    if not high_water_mark:
+        max_pages = 1
+    if concurrency is None:
+        concurrency = int(os.getenv("FANOUT_CONCURRENCY", "5"))
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    clients = ProxyClients()
+
+    async def run(variant: SearchVariant) -> JobList:
+        async with semaphore:
+            return await crawl_variant(
+                auth_token,
+                proxies,
+                clients,
+                variant,
+                high_water_mark,
+                max_pages,
+                page_size,
+            )
+
+    try:
+        results = await asyncio.gather(
+            *(run(x) for x in variants), return_exceptions=True
+        )
+    finally:
+        await clients.aclose()
+
+    merged: dict[str, Job] = {}
+    crawled: dict[str, None] = {}
+    failures = 0
+    for variant, result in zip(variants, results):
+        if isinstance(result, Exception):
+            print(f"Variant {variant.name} failed", type(result).__name__, result)
+            failures += 1
+            continue
+        for job in result.jobs:
+            merged.setdefault(job.link, job)
+        crawled.update(dict.fromkeys(result.crawled_links))
+
+    if variants and failures == len(variants):
+        rejected = [x for x in results if isinstance(x, TokenRejected)]
+        raise (rejected or results)[0]
 
+    jobs = sorted(merged.values(), key=lambda x: x.published_date, reverse=True)
+    print(f"Fan-out over {len(variants)} variants: {len(jobs)} unique jobs")
+    return JobList.model_construct(jobs=jobs, crawled_links=list(crawled))
+
+
+def serialize_jobs(jobs: list[Job]) -> bytes:
+    """
+    ### Description:
+        - Serializes a list of jobs into a single JSON array body
+          accepted by PostgREST bulk inserts.
+        - The whole batch is written in one pass by pydantic-core.
+
+    ### Args:
+        - `jobs`: list[Job]
+            The jobs to serialize.
+
+    ### Returns:
+        - `bytes`
+            A JSON array with one object per job.
+    """
+
+    return JOBS_ADAPTER.dump_json(jobs, exclude={"__all__": {"job_type"}})
+
+
+async def upload_batch_to_db(jobs: list[Job], client: httpx.AsyncClient) -> list[Job]:
+    """
+    ### Description:
+        - Uploads a chunk of jobs to the database as one JSON array insert.
+        - Duplicate links are ignored by PostgREST via `on_conflict`.
+        - If the batch is rejected, it is split in half and each half is
+          retried, so a single bad row doesn't drop the whole chunk.
+
+    ### Args:
+        - `jobs`: list[Job]
+            The jobs to upload in a single request.
+        - `client`: httpx.AsyncClient
+            The HTTP client for making requests.
+
+    ### Returns:
+        - `list[Job]`
+            The jobs that were accepted by the database.
+    """
+
+    if not jobs:
+        return []
+
+    anon_key = os.getenv("SUPABASE_CLIENT_ANON_KEY")
+    base_url = os.getenv("POSTGREST_URL")
+    url = base_url + "upwork_jobs_streaming"
+    headers = {
+        "apikey": anon_key,
+        "Authorization": f"Bearer {anon_key}",
+        "Content-Type": "application/json",
+        "Prefer": "return=minimal,resolution=ignore-duplicates",
+    }
+    params = {"on_conflict": "link"}
+
+    try:
+        with METRICS.span("serialize"):
+            body = serialize_jobs(jobs)
+        METRICS.count("upload_requests")
+        METRICS.count("upload_bytes", len(body))
         response = await client.post(
             url,
             headers=headers,
-            data=job.model_dump_json(exclude="job_type"),
-            timeout=3,
+            params=params,
+            content=body,
+            timeout=10,
         )
-        print(response.status_code)
+        print(f"Batch of {len(jobs)} jobs: {response.status_code}")
+        if response.status_code < 400:
+            return jobs
+        print(response.text[:250])
     except Exception as error:
-        print("Error inserting to postgres", error)
+        print("Error inserting batch to postgres", type(error).__name__, error)
+    METRICS.count("upload_failures")
 
+    if len(jobs) == 1:
+        return []
 
-async def handle_load(jobs: JobList):
+    middle = len(jobs) // 2
+    results = await asyncio.gather(
+        upload_batch_to_db(jobs[:middle], client),
+        upload_batch_to_db(jobs[middle:], client),
+    )
+    return results[0] + results[1]
+
+
+async def handle_load(jobs: JobList, batch_size: int | None = None) -> list[Job]:
     """
     ### Description:
-        - Handles the parallel uploading of multiple job postings to the database.
-        - Uses asyncio to manage concurrent uploads.
+        - Handles the uploading of multiple job postings to the database.
+        - Jobs are sent in chunks of `batch_size` as bulk inserts, and
+          the chunks are uploaded concurrently.
 
     ### Args:
         - `jobs`: JobList
             The JobList instance containing multiple Job objects.
+        - `batch_size`: int | None
+            Number of jobs per insert request. Defaults to the
+            `UPLOAD_BATCH_SIZE` env var, or 50.
+
+    ### Returns:
+        - `list[Job]`
+            The jobs accepted by the database.
+    """
+
+    if batch_size is None:
+        batch_size = int(os.getenv("UPLOAD_BATCH_SIZE", "50"))
+    batch_size = max(batch_size, 1)
+
+    async with httpx.AsyncClient() as client:
+        tasks = []
+        for i in range(0, len(jobs.jobs), batch_size):
+            tasks.append(upload_batch_to_db(jobs.jobs[i : i + batch_size], client))
+
+        results = await asyncio.gather(*tasks)
+
+    uploaded = [job for batch in results for job in batch]
+    print(f"Uploaded {len(uploaded)} of {len(jobs.jobs)} jobs")
+    return uploaded
+
+
+class SeenCache:
     """
+    ### Description:
+    - A bounded, time expiring set of job links that were already
+      saved to the database.
+    - Backed by SQLite in the temp folder, so it survives between warm
+      lambda invocations and lets us skip jobs before uploading them.
+    - Any SQLite error disables the cache instead of failing the run.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        ttl_seconds: int | None = None,
+        max_size: int | None = None,
+    ) -> None:
+
+        self.path = path or os.getenv(
+            "SEEN_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "upwork_seen_jobs.sqlite3"),
+        )
+        if ttl_seconds is None:
+            ttl_seconds = int(os.getenv("SEEN_CACHE_TTL", "86400"))
+        if max_size is None:
+            max_size = int(os.getenv("SEEN_CACHE_MAX_SIZE", "20000"))
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.connection = None
+
+        try:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS seen_jobs "
+                "(link TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS seen_jobs_seen_at ON seen_jobs (seen_at)"
+            )
+            self.connection.commit()
+        except sqlite3.Error as error:
+            print("Seen cache disabled", type(error).__name__, error)
+            self.connection = None
+
+    def filter_new(self, jobs: JobList) -> JobList:
+        """
+        ### Description:
+            - Drops jobs whose links were seen within the TTL.
+
+        ### Args:
+            - `jobs`: JobList
+                The freshly collected jobs.
+
+        ### Returns:
+            - `JobList`
+                Only the jobs that weren't seen recently.
+        """
+
+        if not self.connection or not jobs.jobs:
+            return jobs
+
+        links = [x.link for x in jobs.jobs]
+        placeholders = ",".join("?" * len(links))
+        try:
+            rows = self.connection.execute(
+                f"SELECT link FROM seen_jobs WHERE seen_at >= ? "
+                f"AND link IN ({placeholders})",
+                [time.time() - self.ttl_seconds, *links],
+            ).fetchall()
+        except sqlite3.Error as error:
+            print("Error reading seen cache", type(error).__name__, error)
+            return jobs
+
+        seen = {x[0] for x in rows}
+        new_jobs = [x for x in jobs.jobs if x.link not in seen]
+        print(f"Seen cache skipped {len(jobs.jobs) - len(new_jobs)} jobs")
+        return JobList.model_construct(jobs=new_jobs)
+
+    def add(self, links: list[str]):
+        """
+        ### Description:
+            - Records links as seen and prunes expired or excess entries.
+
+        ### Args:
+            - `links`: list[str]
+                The links that were saved to the database.
+        """
+
+        if not self.connection or not links:
+            return
+
+        now = time.time()
+        try:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO seen_jobs (link, seen_at) VALUES (?, ?)",
+                [(x, now) for x in links],
+            )
+            self.connection.execute(
+                "DELETE FROM seen_jobs WHERE seen_at < ?", (now - self.ttl_seconds,)
+            )
+            self.connection.execute(
+                "DELETE FROM seen_jobs WHERE link NOT IN "
+                "(SELECT link FROM seen_jobs ORDER BY seen_at DESC LIMIT ?)",
+                (self.max_size,),
+            )
+            self.connection.commit()
+        except sqlite3.Error as error:
+            print("Error writing seen cache", type(error).__name__, error)
 
-    client = httpx.AsyncClient()
 
-    tasks = []
-    for job in jobs.jobs:
-        tasks.append(upload_to_db(job, client))
+SEEN_CACHE: SeenCache | None = None
 
-    await asyncio.gather(*tasks)
 
+def get_seen_cache() -> SeenCache:
+    """
+    ### Description:
+        - Returns the process wide seen cache, creating it on first use.
 
+    ### Returns:
+        - `SeenCache`
+            The shared seen cache.
+    """
+
+    global SEEN_CACHE  # pylint:disable=global-statement
+    if SEEN_CACHE is None:
+        SEEN_CACHE = SeenCache()
+    return SEEN_CACHE
+
+
+SCHEDULER = PollScheduler()
+
+
+def crawl_capacity(
+    high_water_mark: HighWaterMark | None, variants: list[SearchVariant]
+) -> int:
+    """
+    ### Description:
+        - The most jobs a single crawl can return, i.e. the size at
+          which the crawl was cut off rather than complete.
+
+    ### Returns:
+        - `int`
+            Max jobs per crawl with the current settings.
+    """
+
+    pages = int(os.getenv("CRAWL_MAX_PAGES", "10")) if high_water_mark else 1
+    return 50 * pages * max(len(variants), 1)
+
+
+@METRICS.instrument
 def lambda_handler(event, context):
     """
     ### Description:
         - Main handler function for the lambda execution.
         - Fetches jobs with retries, collects them, and uploads to the database.
+        - Only a rejected token is dropped and replaced through the
+          authorizer. Other errors are retried with the cached token.
+        - Pages through the feed until the newest stored job is reached.
+        - With `SEARCH_VARIANTS` set, the variants are crawled
+          concurrently instead of the single unfiltered feed.
+        - Runs that aren't due according to the poll scheduler are
+          skipped, unless the event asks to `force` the run.
+        - Stage timings and counters are emitted as one EMF line.
+        - Skips jobs that were uploaded by a recent invocation.
 
     ### Args:
         - `event`: any
@@ -357,30 +1197,75 @@ def lambda_handler(event, context):
         - `ValueError`:
             If no jobs could be fetched after retries.
     """
+    if not (isinstance(event, dict) and event.get("force")) and not SCHEDULER.is_due():
+        print(f"Next poll due in {SCHEDULER.seconds_until_due():.0f}s. Skipping")
+        METRICS.set_property("skipped", "not due")
+        return {"statusCode": 200, "body": json.dumps("Not due yet")}
+
+    with METRICS.span("high_water_mark"):
+        high_water_mark = get_high_water_mark()
+    variants = get_search_variants()
+
     retries = 0
+    token_rejected = False
     while retries < 2:
         try:
-            use_authorizor = retries > 0
-            auth_token = get_auth_token(use_authorizor)
-            proxies = download_proxies()
-            raw_feed = collect_jobs(auth_token, proxies)
-            jobs = JobList(**raw_feed)
+            with METRICS.span("token"):
+                auth_token = get_auth_token(token_rejected)
+            with METRICS.span("proxy_list"):
+                PROXY_POOL.update(PROXY_LIST.get())
+            with METRICS.span("crawl"):
+                if variants:
+                    jobs = asyncio.run(
+                        fan_out_jobs(auth_token, PROXY_POOL, variants, high_water_mark)
+                    )
+                else:
+                    jobs = crawl_jobs(auth_token, PROXY_POOL, high_water_mark)
             break
+        except TokenRejected as e:
+            print("Upwork rejected the token. Trying again with a new one", e)
+            METRICS.count("token_retries")
+            token_rejected = True
+            retries += 1
         except Exception as e:
             print(
-                "Error fetching jobs. Trying again with a new token",
+                "Error fetching jobs. Trying again",
                 type(e).__name__,
                 {str(e)[:250]},
             )
+            METRICS.count("crawl_retries")
+            token_rejected = False
             retries += 1
     else:
+        print("Proxy pool", PROXY_POOL.summary())
         return {"statusCode": 500, "body": json.dumps("Unable to extract from upwork")}
+    print("Proxy pool", PROXY_POOL.summary())
+    # the jobs past the high water mark are what overlaps the previous
+    # crawl, so the scheduler looks at everything the crawl fetched
+    log_decision(
+        SCHEDULER.observe(jobs.crawled_links, crawl_capacity(high_water_mark, variants))
+    )
+
+    METRICS.count("jobs_crawled", len(jobs.jobs))
+
+    with METRICS.span("seen_cache"):
+        seen_cache = get_seen_cache()
+        jobs = seen_cache.filter_new(jobs)
+    METRICS.count("jobs_new", len(jobs.jobs))
+    if not jobs.jobs:
+        print("No new jobs this round")
+        return {"statusCode": 200, "body": json.dumps("No new jobs")}
 
-    asyncio.run(handle_load(jobs))
+    with METRICS.span("upload"):
+        uploaded = asyncio.run(handle_load(jobs))
+    METRICS.count("rows_written", len(uploaded))
+    seen_cache.add([x.link for x in uploaded])
     print("All good. We Done!")
     return {"statusCode": 200, "body": json.dumps("All Good")}
 
 
 if __name__ == "__main__":
+    if "--loop" in sys.argv:
+        SCHEDULER.run_forever(lambda: print(lambda_handler({"force": True}, None)))
     data = lambda_handler(1, 1)
     print(data)
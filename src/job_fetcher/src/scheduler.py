@@ -0,0 +1,223 @@
+"""
+### Description:
+- Decides how often the job fetcher polls Upwork, based on how many
+  new jobs showed up since the previous poll.
+- Works as a long running local loop, or inside a lambda that is
+  triggered more often than needed and skips the runs that aren't due.
+"""
+
+import os
+import json
+import tempfile
+import time
+from typing import Callable, Iterable
+
+from pydantic import BaseModel
+
+
+class PollDecision(BaseModel):
+    """
+    ### Description:
+    - One scheduling decision and the observations that led to it.
+    """
+
+    polled_at: float
+    elapsed: float | None
+    jobs: int
+    new_jobs: int
+    overlap: float
+    rate_per_minute: float | None
+    interval: float
+    next_poll_at: float
+    reason: str
+
+
+class SchedulerState(BaseModel):
+    """
+    ### Description:
+    - What the scheduler remembers between polls.
+    """
+
+    last_poll_at: float | None = None
+    next_poll_at: float = 0
+    interval: float | None = None
+    rate: float | None = None
+    links: list[str] = []
+
+
+class PollScheduler:
+    """
+    ### Description:
+    - Estimates the posting rate from the overlap between consecutive
+      job lists, and picks the next interval so a poll sees roughly
+      `target_new` new jobs.
+    - A list that is mostly new means jobs may have been missed, so the
+      interval is at least halved. A list that is mostly known backs
+      off towards `max_interval`.
+    - State is kept in the temp folder, so warm lambda invocations
+      share it.
+    """
+
+    def __init__(
+        self,
+        min_interval: float | None = None,
+        max_interval: float | None = None,
+        target_new: float | None = None,
+        smoothing: float | None = None,
+        path: str | None = None,
+    ) -> None:
+
+        self.min_interval = min_interval or float(os.getenv("POLL_MIN_INTERVAL", "60"))
+        self.max_interval = max_interval or float(os.getenv("POLL_MAX_INTERVAL", "900"))
+        self.target_new = target_new or float(os.getenv("POLL_TARGET_NEW", "25"))
+        self.smoothing = smoothing or float(os.getenv("POLL_RATE_SMOOTHING", "0.5"))
+        self.path = path or os.getenv(
+            "SCHEDULER_STATE_PATH",
+            os.path.join(tempfile.gettempdir(), "upwork_poll_scheduler.json"),
+        )
+        self.state: SchedulerState | None = None
+
+    def _load(self) -> SchedulerState:
+
+        if self.state is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as rf:
+                    self.state = SchedulerState(**json.load(rf))
+            except (OSError, ValueError):
+                self.state = SchedulerState()
+        return self.state
+
+    def _save(self):
+
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as wf:
+                wf.write(self.state.model_dump_json())
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            print("Unable to save scheduler state", type(error).__name__, error)
+
+    def seconds_until_due(self, now: float | None = None) -> float:
+        """Seconds until the next poll is due, 0 if it is due already"""
+
+        now = time.time() if now is None else now
+        return max(self._load().next_poll_at - now, 0)
+
+    def is_due(self, now: float | None = None) -> bool:
+        """Whether a poll should run now"""
+
+        return self.seconds_until_due(now) <= 0
+
+    def _clamp(self, interval: float) -> float:
+
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def observe(
+        self,
+        links: Iterable[str],
+        capacity: int | None = None,
+        now: float | None = None,
+    ) -> PollDecision:
+        """
+        ### Description:
+            - Records the job links returned by a poll and schedules the
+              next one.
+
+        ### Args:
+            - `links`: Iterable[str]
+                Links of every job the poll fetched, including the
+                ones a high water mark or seen cache filters out later.
+                Only those overlap the previous poll.
+            - `capacity`: int | None
+                Most jobs a poll can return. When given, a mostly new
+                list only counts as missed jobs if it is also full.
+            - `now`: float | None
+                Unix time of the poll. Defaults to the current time.
+
+        ### Returns:
+            - `PollDecision`
+                The chosen interval and the numbers behind it.
+        """
+
+        now = time.time() if now is None else now
+        state = self._load()
+        links = list(dict.fromkeys(links))
+
+        previous = set(state.links)
+        new_jobs = sum(x not in previous for x in links)
+        overlap = (len(links) - new_jobs) / len(links) if links else 1.0
+        elapsed = now - state.last_poll_at if state.last_poll_at is not None else None
+
+        if elapsed:
+            observed = new_jobs / elapsed
+            if state.rate is None:
+                state.rate = observed
+            else:
+                state.rate += self.smoothing * (observed - state.rate)
+
+        last_interval = state.interval or self.min_interval
+        if state.rate is None:
+            interval, reason = self.min_interval, "no rate yet"
+        elif links and overlap < 0.1 and len(links) >= (capacity or 0):
+            interval = min(self.target_new / max(state.rate, 1e-6), last_interval / 2)
+            reason = "mostly new, speeding up"
+        elif state.rate <= 0:
+            interval, reason = last_interval * 2, "nothing new, backing off"
+        else:
+            interval, reason = self.target_new / state.rate, "matching posting rate"
+        interval = self._clamp(interval)
+
+        state.last_poll_at = now
+        state.interval = interval
+        state.next_poll_at = now + interval
+        state.links = links or state.links
+        self._save()
+
+        return PollDecision(
+            polled_at=now,
+            elapsed=elapsed,
+            jobs=len(links),
+            new_jobs=new_jobs,
+            overlap=round(overlap, 3),
+            rate_per_minute=(
+                round(state.rate * 60, 3) if state.rate is not None else None
+            ),
+            interval=round(interval, 1),
+            next_poll_at=state.next_poll_at,
+            reason=reason,
+        )
+
+    def run_forever(
+        self, poll: Callable[[], None], sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        ### Description:
+            - Local loop. Calls `poll` whenever a poll is due. `poll` is
+              expected to report its jobs through `observe`. If it
+              doesn't, the loop waits `min_interval` before retrying.
+
+        ### Args:
+            - `poll`: Callable[[], None]
+                Runs one poll.
+            - `sleep`: Callable[[float], None]
+                Sleep function, replaceable in tests.
+        """
+
+        while True:
+            wait = self.seconds_until_due()
+            if wait > 0:
+                sleep(wait)
+                continue
+            try:
+                poll()
+            except Exception as error:
+                print("Poll failed", type(error).__name__, error)
+            if self.is_due():
+                # the poll failed before reporting, don't hammer upwork
+                sleep(self.min_interval)
+
+
+def log_decision(decision: PollDecision):
+    """Prints the decision as one JSON line for log based metrics"""
+
+    print(json.dumps({"metric": "poll_decision", **decision.model_dump()}))
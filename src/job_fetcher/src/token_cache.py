@@ -0,0 +1,172 @@
+"""
+### Description:
+- Caches auth tokens in memory and in the temp folder, keyed by
+  token name, so warm and cold runs can skip the token lookup.
+- Tokens are refreshed shortly before they expire.
+"""
+
+import os
+import json
+import tempfile
+import threading
+import time
+from typing import Callable
+
+from pydantic import BaseModel, field_validator
+
+
+class CachedToken(BaseModel):
+    """
+    ### Description:
+    - Represents a token and the unix time it expires at.
+    """
+
+    token_name: str
+    token_value: str
+    expires: float
+
+    @field_validator("expires", mode="after")
+    @classmethod
+    def _ms2s(cls, value: float):
+
+        # cookie expiries sometimes come in milliseconds
+        if value > 1e11:
+            return value / 1000
+        return value
+
+    def seconds_left(self) -> float:
+        """Seconds until the token expires"""
+
+        return self.expires - time.time()
+
+
+class TokenCache:
+    """
+    ### Description:
+    - Hands out a cached token until shortly before it expires.
+    - Once the token is inside `refresh_margin` seconds of expiring, a
+      new one is fetched inline, and the current token is kept if that
+      fails. Inside `expiry_margin` the token is considered dead and
+      nothing is returned without a new one.
+    - There is no background refresh: Lambda freezes threads as soon
+      as the handler returns, so a refresh thread would only make
+      progress during later runs and could write the cache file in
+      the middle of one.
+    """
+
+    def __init__(
+        self,
+        token_name: str,
+        fetch: Callable[[], CachedToken | None],
+        refresh_margin: float | None = None,
+        expiry_margin: float | None = None,
+        folder: str | None = None,
+    ) -> None:
+
+        self.token_name = token_name
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin or float(
+            os.getenv("TOKEN_REFRESH_MARGIN", "600")
+        )
+        self.expiry_margin = expiry_margin or float(
+            os.getenv("TOKEN_EXPIRY_MARGIN", "60")
+        )
+        self.path = os.path.join(
+            folder or os.getenv("TOKEN_CACHE_DIR", tempfile.gettempdir()),
+            f"upwork_token_{token_name}.json",
+        )
+        self.token: CachedToken | None = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as rf:
+                self.token = CachedToken(**json.load(rf))
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as wf:
+                wf.write(self.token.model_dump_json())
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            print("Unable to save token", type(error).__name__, error)
+
+    def put(self, token: CachedToken):
+        """
+        ### Description:
+            - Stores a token in memory and on disk.
+
+        ### Args:
+            - `token`: CachedToken
+                The token to cache.
+        """
+
+        with self.lock:
+            self.token = token
+            self._save()
+
+    def invalidate(self):
+        """
+        ### Description:
+            - Drops the cached token, e.g. after Upwork rejected it.
+        """
+
+        with self.lock:
+            self.token = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def refresh(self) -> CachedToken | None:
+        """
+        ### Description:
+            - Fetches a new token and caches it. On failure the current
+              token is kept.
+
+        ### Returns:
+            - `CachedToken | None`
+                The new token, or None if fetching failed.
+        """
+
+        try:
+            token = self.fetch()
+        except Exception as error:
+            print("Error refreshing token", type(error).__name__, error)
+            return None
+
+        if token:
+            self.put(token)
+        return token
+
+    def get(self) -> str | None:
+        """
+        ### Description:
+            - Returns a usable token, fetching one only when there is no
+              cached token or it is about to expire.
+
+        ### Returns:
+            - `str | None`
+                The token value, or None if no token could be found.
+        """
+
+        if not self.token:
+            self._load()
+
+        if not self.token or self.token.seconds_left() < self.expiry_margin:
+            print(f"No usable {self.token_name} token cached. Fetching one")
+            token = self.refresh()
+            return token.token_value if token else None
+
+        if self.token.seconds_left() < self.refresh_margin:
+            print(f"{self.token_name} token expires soon. Refreshing it")
+            token = self.refresh()
+            if token:
+                return token.token_value
+
+        return self.token.token_value
@@ -0,0 +1,43 @@
+"""Tests for the offline benchmark harness"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from benchmarks.bench_lambda import run, compare
+from benchmarks.mock_servers import MockConfig
+
+
+class TestBenchLambda(TestCase):
+
+    def test_handler_runs_against_mock_servers(self):
+
+        config = MockConfig(graphql_latency=0, postgrest_latency=0, new_jobs=30)
+
+        report = run(config, iterations=2)
+
+        self.assertEqual([x["status_code"] for x in report["runs"]], [200, 200])
+        warm = report["runs"][1]["by_route"]
+        self.assertEqual(warm["POST /api/graphql/v1"]["requests"], 1)
+        self.assertEqual(warm["POST /rest/upwork_jobs_streaming"]["requests"], 1)
+        self.assertNotIn("GET /proxies", warm)
+        self.assertGreater(report["summary"]["peak_memory_max"], 0)
+        metrics = report["runs"][1]["metrics"]
+        self.assertEqual(metrics["rows_written"], metrics["jobs_new"])
+        self.assertEqual(metrics["graphql_requests"], 1)
+        self.assertIn("crawl_ms", metrics)
+
+    def test_compare(self):
+
+        report = {"summary": {"warm_requests_median": 6, "cold_wall_time": 1}}
+        baseline = {"summary": {"warm_requests_median": 4}}
+
+        self.assertEqual(compare(report, baseline), {"warm_requests_median": 0.5})
+
+
+if __name__ == "__main__":
+    main()
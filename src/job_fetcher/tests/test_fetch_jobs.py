@@ -3,14 +3,61 @@
 # pylint: disable=wrong-import-position
 
 from unittest import TestCase, main
+from unittest.mock import MagicMock, patch
+import asyncio
+import json
+import os
+import tempfile
 
+import httpx
+from pydantic import ValidationError
 from wrapworks import cwdtoenv
 from dotenv import load_dotenv
 
 cwdtoenv()
 load_dotenv()
 
-from src.fetch_jobs import lambda_handler
+from src.fetch_jobs import (
+    lambda_handler,
+    upload_batch_to_db,
+    crawl_jobs,
+    collect_jobs,
+    get_auth_token,
+    CachedToken,
+    Job,
+    JobList,
+    HighWaterMark,
+    SeenCache,
+    SearchVariant,
+    ProxyClients,
+    fan_out_jobs,
+    get_search_variants,
+    parse_feed,
+    serialize_jobs,
+    TokenRejected,
+)
+from src.proxy_pool import ProxyPool
+from src.scheduler import PollScheduler
+
+
+def make_raw_job(cipher: str, publish_time: str = "2024-08-01T10:00:00.000Z") -> dict:
+    """Builds a job the way the GraphQL search returns it"""
+
+    return {
+        "title": "Test job " + cipher,
+        "description": "Test description",
+        "ontologySkills": [{"prefLabel": "Python"}],
+        "jobTile": {
+            "job": {
+                "ciphertext": cipher,
+                "jobType": "HOURLY",
+                "hourlyBudgetMin": "10.0",
+                "hourlyBudgetMax": "25.0",
+                "publishTime": publish_time,
+                "fixedPriceAmount": None,
+            }
+        },
+    }
 
 
 class TestCollectJobs(TestCase):
@@ -18,10 +65,415 @@ class TestCollectJobs(TestCase):
     def test_collect_jobs_status_code(self):
         """Test that collect_jobs returns status code 200."""
 
-        response = lambda_handler({}, {})
+        response = lambda_handler({"force": True}, {})
         self.assertEqual(response["statusCode"], 200)
 
 
+class TestCollectRetries(TestCase):
+
+    def proxies(self) -> MagicMock:
+        proxies = MagicMock()
+        proxies.get.return_value = "http://proxy.test:8080"
+        return proxies
+
+    @patch("src.fetch_jobs.httpx.post")
+    def test_only_200_is_reported_as_success(self, mock_post):
+        """A non-200 answer is returned, but doesn't reward the proxy"""
+
+        mock_post.return_value = httpx.Response(
+            500, content=b"oops", request=httpx.Request("POST", "http://x")
+        )
+        proxies = self.proxies()
+
+        self.assertEqual(collect_jobs("token", proxies), b"oops")
+        proxies.report_success.assert_not_called()
+
+    @patch("src.fetch_jobs.httpx.post")
+    def test_refused_token_raises(self, mock_post):
+
+        mock_post.return_value = httpx.Response(
+            401, content=b"denied", request=httpx.Request("POST", "http://x")
+        )
+
+        with self.assertRaises(TokenRejected):
+            collect_jobs("token", self.proxies())
+
+    @patch("src.fetch_jobs.httpx.post")
+    def test_running_out_of_retries_raises(self, mock_post):
+        """Ten proxy errors in a row raise instead of an unbound response"""
+
+        mock_post.side_effect = httpx.ConnectError("refused")
+        proxies = self.proxies()
+
+        with self.assertRaises(RuntimeError):
+            collect_jobs("token", proxies)
+        self.assertEqual(proxies.report_failure.call_count, 10)
+
+    @patch("src.fetch_jobs.httpx.post")
+    def test_timeouts_are_proxy_failures(self, mock_post):
+        """A slow proxy is cooled down like a dead one"""
+
+        mock_post.side_effect = [
+            httpx.ConnectTimeout("slow"),
+            httpx.ReadTimeout("slow"),
+            httpx.Response(
+                200, content=b"{}", request=httpx.Request("POST", "http://x")
+            ),
+        ]
+        proxies = self.proxies()
+
+        self.assertEqual(collect_jobs("token", proxies), b"{}")
+        self.assertEqual(proxies.report_failure.call_count, 2)
+
+
+@patch("src.fetch_jobs.get_high_water_mark", MagicMock(return_value=None))
+@patch("src.fetch_jobs.get_search_variants", MagicMock(return_value=[]))
+@patch("src.fetch_jobs.PROXY_LIST", MagicMock())
+@patch("src.fetch_jobs.PROXY_POOL", MagicMock())
+@patch("src.fetch_jobs.get_auth_token")
+@patch("src.fetch_jobs.crawl_jobs")
+class TestHandlerRetries(TestCase):
+
+    def test_other_errors_keep_the_token(self, mock_crawl, mock_token):
+        """A proxy or parse error is retried with the cached token"""
+
+        mock_crawl.side_effect = RuntimeError("Ran out of proxy retries")
+
+        response = lambda_handler({"force": True}, {})
+
+        self.assertEqual(response["statusCode"], 500)
+        self.assertEqual(
+            [x.args for x in mock_token.call_args_list], [(False,), (False,)]
+        )
+
+    def test_rejected_token_is_replaced(self, mock_crawl, mock_token):
+
+        mock_crawl.side_effect = [
+            TokenRejected("Upwork answered 401"),
+            RuntimeError("Ran out of proxy retries"),
+        ]
+
+        lambda_handler({"force": True}, {})
+
+        self.assertEqual(
+            [x.args for x in mock_token.call_args_list], [(False,), (True,)]
+        )
+
+
+class TestForcedToken(TestCase):
+
+    @patch.dict("os.environ", {"AUTHORIZER_URL": "http://authorizer.test/"})
+    @patch("src.fetch_jobs.TOKEN_CACHE")
+    @patch("src.fetch_jobs.httpx.post")
+    def test_rejected_token_is_sent(self, mock_post, mock_cache):
+        """The authorizer is told which token Upwork just rejected"""
+
+        mock_cache.token = CachedToken(
+            token_name="UniversalSearch", token_value="oauth2v2_old", expires=1
+        )
+        mock_post.return_value = httpx.Response(
+            200, json={"token": "oauth2v2_new", "expires": 1725000000}
+        )
+
+        self.assertEqual(get_auth_token(use_authorizer=True), "oauth2v2_new")
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["rejected_token"], "oauth2v2_old")
+        mock_cache.invalidate.assert_called_once()
+
+
+@patch.dict(
+    "os.environ",
+    {"POSTGREST_URL": "http://postgrest.test/", "SUPABASE_CLIENT_ANON_KEY": "key"},
+)
+class TestBatchUpload(TestCase):
+
+    def upload(self, jobs: list[Job], handler) -> int:
+        """Runs a batch upload against a mocked PostgREST"""
+
+        async def runner():
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await upload_batch_to_db(jobs, client)
+
+        return asyncio.run(runner())
+
+    def test_single_request_per_batch(self):
+        """A healthy batch is sent as one array insert ignoring duplicates"""
+
+        requests = []
+
+        def handler(request: httpx.Request):
+            requests.append(request)
+            return httpx.Response(201)
+
+        jobs = [Job(**make_raw_job(f"~0{x}")) for x in range(5)]
+        uploaded = self.upload(jobs, handler)
+
+        self.assertEqual(len(uploaded), 5)
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0].url.params["on_conflict"], "link")
+        self.assertIn("resolution=ignore-duplicates", requests[0].headers["Prefer"])
+        body = json.loads(requests[0].content)
+        self.assertEqual(len(body), 5)
+        self.assertNotIn("job_type", body[0])
+
+    def test_failed_batch_is_split(self):
+        """Only the bad row is dropped when a batch is rejected"""
+
+        def handler(request: httpx.Request):
+            body = json.loads(request.content)
+            if any(x["link"].endswith("~03") for x in body):
+                return httpx.Response(400, json={"message": "bad row"})
+            return httpx.Response(201)
+
+        jobs = [Job(**make_raw_job(f"~0{x}")) for x in range(6)]
+        uploaded = self.upload(jobs, handler)
+
+        self.assertEqual(len(uploaded), 5)
+        self.assertNotIn("https://www.upwork.com/jobs/~03", [x.link for x in uploaded])
+
+
+def make_feed(jobs: list[dict]) -> dict:
+    """Wraps raw jobs in the GraphQL response envelope"""
+
+    return {
+        "data": {
+            "search": {"universalSearchNuxt": {"visitorJobSearchV1": {"results": jobs}}}
+        }
+    }
+
+
+class TestCrawlJobs(TestCase):
+
+    def setUp(self) -> None:
+        # newest first, one job per minute
+        self.feed = [
+            make_raw_job(f"~{x:03}", f"2024-08-01T10:{59 - x:02}:00.000Z")
+            for x in range(60)
+        ]
+
+    def collect_jobs(self, auth_token, proxies, offset=0, count=50):
+        """sideeffect serving pages from the recorded feed"""
+
+        return make_feed(self.feed[offset : offset + count])
+
+    @patch("src.fetch_jobs.collect_jobs")
+    def test_stops_at_high_water_mark(self, mock_collect):
+        """Paging stops on the page that contains the previous newest job"""
+
+        mock_collect.side_effect = self.collect_jobs
+        mark = HighWaterMark(
+            link="https://www.upwork.com/jobs/~012",
+            published_date="2024-08-01T10:47:00Z",
+        )
+
+        jobs = crawl_jobs("token", [], mark, max_pages=10, page_size=5)
+
+        self.assertEqual(len(jobs.jobs), 12)
+        self.assertEqual(mock_collect.call_count, 3)
+
+    @patch("src.fetch_jobs.collect_jobs")
+    def test_without_mark_fetches_one_page(self, mock_collect):
+        """With no stored jobs only the first page is fetched"""
+
+        mock_collect.side_effect = self.collect_jobs
+
+        jobs = crawl_jobs("token", [], None, max_pages=10, page_size=50)
+
+        self.assertEqual(len(jobs.jobs), 50)
+        self.assertEqual(mock_collect.call_count, 1)
+
+    @patch("src.fetch_jobs.collect_jobs")
+    def test_scheduler_sees_jobs_past_the_mark(self, mock_collect):
+        """The overlap comes from the fetched pages, not the filtered jobs"""
+
+        mock_collect.side_effect = self.collect_jobs
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        scheduler = PollScheduler(path=os.path.join(folder.name, "scheduler.json"))
+        mark = HighWaterMark(
+            link="https://www.upwork.com/jobs/~012",
+            published_date="2024-08-01T10:47:00Z",
+        )
+        jobs = crawl_jobs("token", [], mark, max_pages=10, page_size=5)
+        scheduler.observe(jobs.crawled_links, capacity=50, now=0)
+
+        # ten jobs are posted before the next poll
+        self.feed = [
+            make_raw_job(f"~{100 + x:03}", f"2024-08-01T11:{10 - x:02}:00.000Z")
+            for x in range(10)
+        ] + self.feed
+        mark = HighWaterMark(
+            link="https://www.upwork.com/jobs/~000",
+            published_date="2024-08-01T10:59:00Z",
+        )
+        jobs = crawl_jobs("token", [], mark, max_pages=10, page_size=5)
+        decision = scheduler.observe(jobs.crawled_links, capacity=50, now=600)
+
+        self.assertEqual(len(jobs.jobs), 10)
+        self.assertEqual(decision.new_jobs, 10)
+        self.assertEqual(decision.overlap, 0.333)
+        self.assertEqual(decision.reason, "matching posting rate")
+
+
+class TestSeenCache(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "seen.sqlite3")
+        self.jobs = JobList.model_construct(
+            jobs=[Job(**make_raw_job(f"~0{x}")) for x in range(4)]
+        )
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_seen_jobs_are_skipped_across_instances(self):
+        """Links recorded by one invocation are skipped by the next"""
+
+        SeenCache(self.path).add([x.link for x in self.jobs.jobs[:3]])
+
+        new_jobs = SeenCache(self.path).filter_new(self.jobs)
+
+        self.assertEqual([x.link for x in new_jobs.jobs], [self.jobs.jobs[3].link])
+
+    def test_cache_is_bounded(self):
+        """Oldest links are evicted once the cache is full"""
+
+        cache = SeenCache(self.path, max_size=2)
+        for job in self.jobs.jobs:
+            cache.add([job.link])
+
+        new_jobs = cache.filter_new(self.jobs)
+
+        self.assertEqual(len(new_jobs.jobs), 2)
+
+    def test_expired_links_are_new_again(self):
+        """Links older than the TTL are no longer skipped"""
+
+        cache = SeenCache(self.path, ttl_seconds=60)
+        with patch("src.fetch_jobs.time.time", return_value=0):
+            cache.add([x.link for x in self.jobs.jobs])
+
+        new_jobs = cache.filter_new(self.jobs)
+
+        self.assertEqual(len(new_jobs.jobs), 4)
+
+    @patch.dict("os.environ", {"SEEN_CACHE_TTL": "86400"})
+    def test_explicit_zero_ttl_is_kept(self):
+        """A TTL of 0 expires links at once instead of using the env default"""
+
+        cache = SeenCache(self.path, ttl_seconds=0, max_size=0)
+        cache.add([x.link for x in self.jobs.jobs])
+
+        self.assertEqual((cache.ttl_seconds, cache.max_size), (0, 0))
+        self.assertEqual(len(cache.filter_new(self.jobs).jobs), 4)
+
+
+class TestFanOut(TestCase):
+
+    def setUp(self) -> None:
+        self.feeds = {
+            "python": [make_raw_job(f"~{x:03}") for x in range(0, 6)],
+            "django": [make_raw_job(f"~{x:03}") for x in range(4, 10)],
+        }
+        self.pool = ProxyPool(["10.0.0.1:8000:user:pass"])
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        """Serves a feed per userQuery. Unknown queries get 407s"""
+
+        variables = json.loads(request.content)["variables"]["requestVariables"]
+        feed = self.feeds.get(variables["userQuery"])
+        if feed is None:
+            return httpx.Response(407)
+        return httpx.Response(200, json=make_feed(feed))
+
+    def fan_out(self, queries: list[str]) -> JobList:
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        variants = [SearchVariant(name=x, filters={"userQuery": x}) for x in queries]
+        with patch.object(ProxyClients, "get", return_value=client):
+            return asyncio.run(fan_out_jobs("token", self.pool, variants, None))
+
+    def test_variants_are_merged_and_deduped(self):
+        """Jobs found by several variants show up once"""
+
+        jobs = self.fan_out(["python", "django"])
+
+        self.assertEqual(len(jobs.jobs), 10)
+        self.assertEqual(len({x.link for x in jobs.jobs}), 10)
+        self.assertEqual(len(jobs.crawled_links), 10)
+
+    def test_failing_variant_is_skipped(self):
+
+        jobs = self.fan_out(["python", "broken"])
+
+        self.assertEqual(len(jobs.jobs), 6)
+
+    def test_all_variants_failing_raises(self):
+
+        with self.assertRaises(RuntimeError):
+            self.fan_out(["broken"])
+
+    @patch.dict(
+        "os.environ",
+        {"SEARCH_VARIANTS": '[{"name": "py", "filters": {"userQuery": "python"}}]'},
+    )
+    def test_variants_from_env(self):
+
+        self.assertEqual(get_search_variants()[0].filters, {"userQuery": "python"})
+
+
+class TestParsing(TestCase):
+
+    def setUp(self) -> None:
+        fixture = os.path.join(
+            os.path.dirname(__file__),
+            "..",
+            "benchmarks",
+            "fixtures",
+            "graphql_search_page.json",
+        )
+        with open(fixture, "rb") as rf:
+            self.raw = rf.read()
+
+    def test_graphql_auth_error(self):
+        """An authentication error is told apart from a broken feed"""
+
+        auth_error = {"errors": [{"message": "Requested oAuth2 token is invalid"}]}
+        other_error = {"errors": [{"message": "Field 'jobTile' is undefined"}]}
+
+        with self.assertRaises(TokenRejected):
+            parse_feed(json.dumps(auth_error).encode())
+        with self.assertRaises(ValidationError):
+            parse_feed(json.dumps(other_error).encode())
+
+    def test_bytes_and_dict_parse_the_same(self):
+
+        from_bytes = parse_feed(self.raw)
+        from_dict = parse_feed(json.loads(self.raw))
+
+        self.assertEqual(len(from_bytes.jobs), 50)
+        self.assertEqual(from_bytes, from_dict)
+
+    def test_budgets_are_ints(self):
+
+        jobs = parse_feed(self.raw).jobs
+        fixed = [x for x in jobs if x.is_hourly is False]
+
+        self.assertTrue(fixed)
+        self.assertTrue(all(isinstance(x.budget, int) for x in fixed))
+
+    def test_batch_body_matches_per_job_dump(self):
+        """The one pass serializer writes the same body as dumping each job"""
+
+        jobs = parse_feed(self.raw).jobs
+        expected = [json.loads(x.model_dump_json(exclude="job_type")) for x in jobs]
+
+        self.assertEqual(json.loads(serialize_jobs(jobs)), expected)
+        self.assertNotIn(b"job_type", serialize_jobs(jobs))
+
+
 # Run the tests
 if __name__ == "__main__":
     main()
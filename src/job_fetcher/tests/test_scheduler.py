@@ -0,0 +1,96 @@
+"""Tests for the adaptive poll scheduler"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import Mock
+import os
+import tempfile
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from src.scheduler import PollScheduler
+
+
+def links(start: int, stop: int) -> list[str]:
+    return [f"https://www.upwork.com/jobs/~{x:03}" for x in range(start, stop)]
+
+
+class TestPollScheduler(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "scheduler.json")
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def scheduler(self) -> PollScheduler:
+        return PollScheduler(
+            min_interval=60, max_interval=900, target_new=25, path=self.path
+        )
+
+    def test_first_poll_uses_min_interval(self):
+
+        decision = self.scheduler().observe(links(0, 50), now=1000)
+
+        self.assertEqual(decision.interval, 60)
+        self.assertFalse(self.scheduler().is_due(now=1030))
+        self.assertTrue(self.scheduler().is_due(now=1060))
+
+    def test_matches_posting_rate(self):
+        """10 new jobs per minute means a 25 job target every 150s"""
+
+        scheduler = self.scheduler()
+        scheduler.observe(links(0, 50), now=0)
+        decision = scheduler.observe(links(10, 60), now=60)
+
+        self.assertEqual(decision.new_jobs, 10)
+        self.assertEqual(decision.overlap, 0.8)
+        self.assertEqual(decision.interval, 150)
+
+    def test_backs_off_when_nothing_is_new(self):
+
+        scheduler = self.scheduler()
+        scheduler.observe(links(0, 50), now=0)
+        intervals = [
+            scheduler.observe(links(0, 50), now=x * 1000).interval for x in range(1, 4)
+        ]
+
+        self.assertEqual(intervals, [120, 240, 480])
+
+    def test_speeds_up_when_list_is_full_of_new_jobs(self):
+        """A full page with no known jobs means jobs were likely missed"""
+
+        scheduler = self.scheduler()
+        scheduler.observe(links(0, 50), now=0)
+        scheduler.observe(links(0, 50), now=500)
+        decision = scheduler.observe(links(100, 150), now=1000, capacity=50)
+
+        self.assertEqual(decision.reason, "mostly new, speeding up")
+        self.assertLess(decision.interval, 500)
+
+    def test_partial_new_list_is_not_a_miss(self):
+
+        scheduler = self.scheduler()
+        scheduler.observe(links(0, 50), now=0)
+        decision = scheduler.observe(links(100, 105), now=600, capacity=50)
+
+        self.assertEqual(decision.reason, "matching posting rate")
+
+    def test_loop_waits_after_failed_poll(self):
+        """A poll that never reports doesn't turn into a busy loop"""
+
+        scheduler = self.scheduler()
+        sleep = Mock(side_effect=[None, StopIteration])
+
+        with self.assertRaises(StopIteration):
+            scheduler.run_forever(Mock(side_effect=ValueError("boom")), sleep)
+
+        sleep.assert_called_with(60)
+
+
+if __name__ == "__main__":
+    main()
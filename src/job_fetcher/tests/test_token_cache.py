@@ -0,0 +1,103 @@
+"""Tests for the token cache"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import Mock
+import tempfile
+import time
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from src.token_cache import TokenCache, CachedToken
+
+
+def make_token(value: str, seconds_left: float) -> CachedToken:
+    """Builds a token expiring in `seconds_left` seconds"""
+
+    return CachedToken(
+        token_name="UniversalSearch",
+        token_value=value,
+        expires=time.time() + seconds_left,
+    )
+
+
+class TestTokenCache(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.fetch = Mock(return_value=make_token("fresh", 3600))
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def make_cache(self) -> TokenCache:
+        """Cache writing to the temp folder of the test"""
+
+        return TokenCache(
+            "UniversalSearch",
+            self.fetch,
+            refresh_margin=600,
+            expiry_margin=60,
+            folder=self.folder.name,
+        )
+
+    def test_token_is_reused_until_expiry(self):
+        """A valid token is only fetched once, even across cold starts"""
+
+        self.assertEqual(self.make_cache().get(), "fresh")
+        self.assertEqual(self.make_cache().get(), "fresh")
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_expired_token_is_replaced_before_use(self):
+        """A token inside the expiry margin is never handed out"""
+
+        cache = self.make_cache()
+        cache.put(make_token("stale", 30))
+
+        self.assertEqual(cache.get(), "fresh")
+
+    def test_expiring_token_is_refreshed_inline(self):
+        """A token close to expiry is replaced before the run uses it"""
+
+        cache = self.make_cache()
+        cache.put(make_token("old", 300))
+
+        self.assertEqual(cache.get(), "fresh")
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_failed_refresh_keeps_expiring_token(self):
+        """A token close to expiry is still used if no new one comes"""
+
+        cache = self.make_cache()
+        cache.put(make_token("old", 300))
+        self.fetch.side_effect = ValueError("Unable to get token via authorizer")
+
+        self.assertEqual(cache.get(), "old")
+
+    def test_invalidate_forces_fetch(self):
+        """An invalidated token is fetched again"""
+
+        cache = self.make_cache()
+        cache.get()
+        cache.invalidate()
+
+        self.assertEqual(self.make_cache().get(), "fresh")
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_millisecond_expiry(self):
+        """Expiries given in milliseconds are converted to seconds"""
+
+        token = CachedToken(
+            token_name="UniversalSearch",
+            token_value="x",
+            expires=(time.time() + 100) * 1000,
+        )
+
+        self.assertAlmostEqual(token.seconds_left(), 100, delta=5)
+
+
+if __name__ == "__main__":
+    main()
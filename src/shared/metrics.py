@@ -0,0 +1,164 @@
+"""
+### Description:
+- Collects per stage timings and counters for one lambda invocation
+  and emits them as a single CloudWatch Embedded Metric Format line.
+- Lives in `src/shared` and is copied into every lambda by
+  `shared/vendor.py` at build time.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable
+
+
+class MemorySink:
+    """
+    ### Description:
+    - Keeps emitted lines in memory instead of printing them, for tests.
+    """
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    def __call__(self, line: str):
+        self.lines.append(line)
+
+    def records(self) -> list[dict]:
+        """The emitted lines, parsed"""
+
+        return [json.loads(x) for x in self.lines]
+
+
+class Metrics:
+    """
+    ### Description:
+    - Spans add their duration in milliseconds to a `<name>_ms` metric,
+      so a stage that runs many times reports its total time.
+    - Counters add up. Counters ending in `_bytes` are reported in bytes.
+    - Properties are written alongside the metrics without becoming
+      metrics themselves, e.g. which tier served a token.
+    - Safe to use from background threads and concurrent tasks.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        service: str,
+        sink: Callable[[str], None] = print,
+    ) -> None:
+
+        self.namespace = namespace
+        self.service = service
+        self.sink = sink
+        self.lock = threading.Lock()
+        self.timings: dict[str, float] = {}
+        self.counters: dict[str, float] = {}
+        self.properties: dict = {}
+
+    def reset(self):
+        """Drops everything recorded so far"""
+
+        with self.lock:
+            self.timings = {}
+            self.counters = {}
+            self.properties = {}
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        ### Description:
+            - Times the wrapped block, including any awaits inside it.
+
+        ### Args:
+            - `name`: str
+                The stage name.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self.lock:
+                self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def count(self, name: str, value: float = 1):
+        """Adds `value` to a counter"""
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_property(self, name: str, value):
+        """Records a value that is logged but not aggregated"""
+
+        with self.lock:
+            self.properties[name] = value
+
+    def snapshot(self) -> dict:
+        """
+        ### Description:
+            - Builds the EMF record of everything recorded so far.
+
+        ### Returns:
+            - `dict`
+                The record, with the metric values as top level keys.
+        """
+
+        with self.lock:
+            values = {f"{x}_ms": round(y, 2) for x, y in self.timings.items()}
+            units = {f"{x}_ms": "Milliseconds" for x in self.timings}
+            for name, value in self.counters.items():
+                values[name] = value
+                units[name] = "Bytes" if name.endswith("_bytes") else "Count"
+            properties = dict(self.properties)
+
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Service"]],
+                        "Metrics": [
+                            {"Name": x, "Unit": y} for x, y in sorted(units.items())
+                        ],
+                    }
+                ],
+            },
+            "Service": self.service,
+            **properties,
+            **values,
+        }
+
+    def emit(self):
+        """Writes the record as one JSON line to the sink"""
+
+        try:
+            self.sink(json.dumps(self.snapshot(), default=str))
+        except Exception as error:
+            print("Unable to emit metrics", type(error).__name__, error)
+
+    def instrument(self, func: Callable) -> Callable:
+        """
+        ### Description:
+            - Decorator for a lambda handler. Resets the metrics, times
+              the whole invocation and emits the record when it ends,
+              whether it succeeded or not.
+        """
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            self.reset()
+            try:
+                with self.span("invocation"):
+                    return func(*args, **kwargs)
+            except Exception as error:
+                self.set_property("error", type(error).__name__)
+                raise
+            finally:
+                self.emit()
+
+        return wrapper
@@ -0,0 +1,342 @@
+"""
+### Description:
+- Keeps track of proxy health so requests are routed through the
+  proxies that are currently working and fast.
+- Lives in `src/shared` and is copied into every lambda that talks
+  to Upwork by `shared/vendor.py` at build time.
+"""
+
+import os
+import json
+import random
+import tempfile
+import threading
+import time
+from typing import Callable
+
+from pydantic import BaseModel
+
+
+def format_proxy(proxy: str) -> str:
+    """
+    ### Description:
+        - Converts a raw `ip:port:user:password` proxy into a proxy url.
+
+    ### Args:
+        - `proxy`: str
+            The proxy as listed by the proxy provider.
+
+    ### Returns:
+        - `str`
+            The proxy url usable by httpx.
+    """
+
+    ip, port, user, password = proxy.split(":")
+
+    return "http://" + user + ":" + password + "@" + ip + ":" + port
+
+
+class ProxyStats(BaseModel):
+    """
+    ### Description:
+    - Holds the observed health of a single proxy.
+    """
+
+    proxy: str
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    avg_latency: float | None = None
+    cooldown_until: float = 0
+
+    def is_available(self, now: float) -> bool:
+        """Whether the proxy is out of cooldown"""
+
+        return self.cooldown_until <= now
+
+
+class ProxyPool:
+    """
+    ### Description:
+    - Hands out proxies weighted by their observed latency.
+    - Failing proxies are quarantined with an exponential cooldown, so
+      retries move on to healthy proxies instead of hammering bad ones.
+    - Stats are kept per proxy url and survive list refreshes.
+    """
+
+    def __init__(
+        self,
+        proxies: list[str] | None = None,
+        base_cooldown: float = 30,
+        max_cooldown: float = 900,
+        latency_smoothing: float = 0.3,
+    ) -> None:
+
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.latency_smoothing = latency_smoothing
+        self.proxies: dict[str, ProxyStats] = {}
+        self.source: list[str] | None = None
+        self.update(proxies or [])
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def update(self, proxies: list[str]):
+        """
+        ### Description:
+            - Replaces the proxy list, keeping stats of known proxies.
+            - Passing the same list object again is a no-op.
+
+        ### Args:
+            - `proxies`: list[str]
+                Raw `ip:port:user:password` proxies.
+        """
+
+        if proxies is self.source:
+            return
+        self.source = proxies
+
+        urls = [format_proxy(x) for x in proxies]
+        self.proxies = {
+            x: self.proxies.get(x) or ProxyStats(proxy=x) for x in dict.fromkeys(urls)
+        }
+
+    def _weight(self, stats: ProxyStats, default_latency: float) -> float:
+
+        latency = stats.avg_latency or default_latency
+        return 1 / max(latency, 0.05)
+
+    def get(self) -> str:
+        """
+        ### Description:
+            - Picks a proxy, favouring fast ones.
+            - Proxies without measurements get the average latency, so
+              they still get tried.
+            - If every proxy is cooling down, the one closest to coming
+              back is returned.
+
+        ### Returns:
+            - `str`
+                The proxy url to use.
+
+        ### Raises:
+            - `RuntimeError`:
+                If the pool is empty.
+        """
+
+        if not self.proxies:
+            raise RuntimeError("No proxies available")
+
+        now = time.monotonic()
+        available = [x for x in self.proxies.values() if x.is_available(now)]
+        if not available:
+            return min(self.proxies.values(), key=lambda x: x.cooldown_until).proxy
+
+        latencies = [x.avg_latency for x in available if x.avg_latency]
+        default_latency = sum(latencies) / len(latencies) if latencies else 1
+        weights = [self._weight(x, default_latency) for x in available]
+
+        return random.choices(available, weights=weights)[0].proxy
+
+    def report_success(self, proxy: str, latency: float):
+        """
+        ### Description:
+            - Records a successful request through a proxy.
+
+        ### Args:
+            - `proxy`: str
+                The proxy url that was used.
+            - `latency`: float
+                Seconds the request took.
+        """
+
+        stats = self.proxies.get(proxy)
+        if not stats:
+            return
+
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        stats.cooldown_until = 0
+        if stats.avg_latency is None:
+            stats.avg_latency = latency
+        else:
+            stats.avg_latency += self.latency_smoothing * (latency - stats.avg_latency)
+
+    def report_failure(self, proxy: str, soft: bool = False):
+        """
+        ### Description:
+            - Records a failed request and quarantines the proxy. Each
+              consecutive failure doubles the cooldown.
+            - A soft failure (the proxy got through but was blocked or
+              rate limited) only rests the proxy for the base cooldown
+              and doesn't count towards the doubling.
+
+        ### Args:
+            - `proxy`: str
+                The proxy url that failed.
+            - `soft`: bool
+                Whether the failure was a block rather than a dead proxy.
+        """
+
+        stats = self.proxies.get(proxy)
+        if not stats:
+            return
+
+        stats.failures += 1
+        if soft:
+            stats.cooldown_until = max(
+                stats.cooldown_until, time.monotonic() + self.base_cooldown
+            )
+            return
+
+        stats.consecutive_failures += 1
+        cooldown = min(
+            self.base_cooldown * 2 ** (stats.consecutive_failures - 1),
+            self.max_cooldown,
+        )
+        stats.cooldown_until = time.monotonic() + cooldown
+
+    def stats(self) -> list[dict]:
+        """
+        ### Description:
+            - Returns the stats of every proxy that has been used.
+
+        ### Returns:
+            - `list[dict]`
+                Per proxy counters, without credentials.
+        """
+
+        return [
+            {**x.model_dump(exclude={"proxy"}), "proxy": x.proxy.split("@")[-1]}
+            for x in self.proxies.values()
+            if x.successes or x.failures
+        ]
+
+    def summary(self) -> dict:
+        """
+        ### Description:
+            - Aggregates the pool stats into a few headline numbers.
+
+        ### Returns:
+            - `dict`
+                Pool size, proxies in cooldown, totals and mean latency.
+        """
+
+        now = time.monotonic()
+        values = list(self.proxies.values())
+        latencies = [x.avg_latency for x in values if x.avg_latency]
+
+        return {
+            "proxies": len(values),
+            "cooling_down": sum(not x.is_available(now) for x in values),
+            "successes": sum(x.successes for x in values),
+            "failures": sum(x.failures for x in values),
+            "avg_latency": (sum(latencies) / len(latencies) if latencies else None),
+        }
+
+
+class ProxyListCache:
+    """
+    ### Description:
+    - Caches the downloaded proxy list in memory and in the temp folder.
+    - A fresh list is returned straight from memory. A stale list is
+      still returned, while a background thread downloads a new one.
+    - Cold starts reuse the last good list from disk, so only the very
+      first run has to wait for the download.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], list[str]],
+        ttl: float | None = None,
+        path: str | None = None,
+    ) -> None:
+
+        self.fetch = fetch
+        self.ttl = ttl or float(os.getenv("PROXY_CACHE_TTL", "3600"))
+        self.path = path or os.getenv(
+            "PROXY_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "upwork_proxies.json"),
+        )
+        self.proxies: list[str] = []
+        self.fetched_at: float = 0
+        self.refreshing: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as rf:
+                data = json.load(rf)
+            self.proxies = data["proxies"]
+            self.fetched_at = data["fetched_at"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as wf:
+                json.dump({"proxies": self.proxies, "fetched_at": self.fetched_at}, wf)
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            print("Unable to save proxy list", type(error).__name__, error)
+
+    def refresh(self) -> bool:
+        """
+        ### Description:
+            - Downloads the proxy list and stores it. On failure the
+              previous list is kept.
+
+        ### Returns:
+            - `bool`
+                True if a new list was stored.
+        """
+
+        try:
+            proxies = self.fetch()
+        except Exception as error:
+            print("Error downloading proxies", type(error).__name__, error)
+            return False
+
+        if not proxies:
+            print("Downloaded proxy list is empty. Keeping the old one")
+            return False
+
+        with self.lock:
+            self.proxies = proxies
+            self.fetched_at = time.time()
+            self._save()
+        return True
+
+    def _refresh_in_background(self):
+
+        with self.lock:
+            if self.refreshing and self.refreshing.is_alive():
+                return
+            self.refreshing = threading.Thread(target=self.refresh, daemon=True)
+            self.refreshing.start()
+
+    def get(self) -> list[str]:
+        """
+        ### Description:
+            - Returns the proxy list, downloading it only when nothing
+              is cached at all.
+
+        ### Returns:
+            - `list[str]`
+                Raw `ip:port:user:password` proxies.
+        """
+
+        if not self.proxies:
+            self._load()
+
+        if not self.proxies:
+            self.refresh()
+        elif time.time() - self.fetched_at > self.ttl:
+            print("Proxy list is stale. Refreshing in the background")
+            self._refresh_in_background()
+
+        return self.proxies
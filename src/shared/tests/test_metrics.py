@@ -0,0 +1,118 @@
+"""Tests for the EMF metrics"""
+
+# pylint: disable=wrong-import-position
+
+from unittest import TestCase, main
+from unittest.mock import patch
+import asyncio
+import json
+
+from wrapworks import cwdtoenv
+
+cwdtoenv()
+
+from metrics import Metrics, MemorySink
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self) -> None:
+        self.sink = MemorySink()
+        self.metrics = Metrics("Test", "svc", sink=self.sink)
+
+    def test_spans_add_up(self):
+        with patch("metrics.time.perf_counter", side_effect=[0, 0.1, 1, 1.3]):
+            with self.metrics.span("fetch"):
+                pass
+            with self.metrics.span("fetch"):
+                pass
+
+        self.assertAlmostEqual(self.metrics.snapshot()["fetch_ms"], 400)
+
+    def test_span_records_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.span("fetch"):
+                raise ValueError("boom")
+        self.assertIn("fetch_ms", self.metrics.snapshot())
+
+    def test_concurrent_spans(self):
+        async def stage():
+            with self.metrics.span("stage"):
+                await asyncio.sleep(0.01)
+            self.metrics.count("calls")
+
+        async def run():
+            await asyncio.gather(*[stage() for _ in range(5)])
+
+        asyncio.run(run())
+        record = self.metrics.snapshot()
+        self.assertEqual(record["calls"], 5)
+        self.assertGreaterEqual(record["stage_ms"], 50)
+
+    def test_emf_format(self):
+        self.metrics.count("rows")
+        self.metrics.count("rows", 2)
+        self.metrics.count("upload_bytes", 100)
+        self.metrics.set_property("tier", "direct")
+        with self.metrics.span("upload"):
+            pass
+        self.metrics.emit()
+
+        self.assertEqual(len(self.sink.lines), 1)
+        record = self.sink.records()[0]
+        directive = record["_aws"]["CloudWatchMetrics"][0]
+        self.assertEqual(directive["Namespace"], "Test")
+        self.assertEqual(directive["Dimensions"], [["Service"]])
+        units = {x["Name"]: x["Unit"] for x in directive["Metrics"]}
+        self.assertEqual(
+            units,
+            {"rows": "Count", "upload_bytes": "Bytes", "upload_ms": "Milliseconds"},
+        )
+        self.assertEqual(record["Service"], "svc")
+        self.assertEqual(record["rows"], 3)
+        self.assertEqual(record["tier"], "direct")
+        self.assertNotIn("tier", units)
+
+    def test_instrument_emits_once_per_call(self):
+        @self.metrics.instrument
+        def handler(rows):
+            self.metrics.count("rows", rows)
+            return rows
+
+        self.assertEqual(handler(2), 2)
+        self.assertEqual(handler(3), 3)
+
+        records = self.sink.records()
+        self.assertEqual([x["rows"] for x in records], [2, 3])
+        self.assertTrue(all("invocation_ms" in x for x in records))
+
+    def test_instrument_emits_on_error(self):
+        @self.metrics.instrument
+        def handler():
+            self.metrics.count("rows")
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            handler()
+
+        record = self.sink.records()[0]
+        self.assertEqual(record["error"], "RuntimeError")
+        self.assertEqual(record["rows"], 1)
+
+    def test_broken_sink_does_not_fail_the_handler(self):
+        def sink(line):
+            raise OSError("closed")
+
+        metrics = Metrics("Test", "svc", sink=sink)
+        self.assertEqual(metrics.instrument(lambda: 1)(), 1)
+
+    def test_lines_are_single_json_objects(self):
+        self.metrics.set_property("note", "multi\nline")
+        self.metrics.emit()
+        self.assertNotIn("\n", self.sink.lines[0])
+        self.assertEqual(json.loads(self.sink.lines[0])["note"], "multi\nline")
+
+
+# Run the tests
+if __name__ == "__main__":
+    main()
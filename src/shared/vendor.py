@@ -0,0 +1,59 @@
+"""
+### Description:
+- Copies the shared modules into the source folder of every lambda
+  that uses them. Each lambda ships as a flat zip of its source folder,
+  so the modules have to sit next to the code that imports them.
+- The copies are build output and ignored by git. Edit the modules
+  here and re-run this before testing or packaging a lambda.
+
+### Usage (from src):
+    python shared/vendor.py [lambda ...]
+"""
+
+import argparse
+import shutil
+from pathlib import Path
+
+SHARED = Path(__file__).resolve().parent
+
+# lambda -> (its source folder, the shared modules it imports)
+TARGETS = {
+    "job_fetcher": ("job_fetcher/src", ["proxy_pool.py", "metrics.py"]),
+    "data_enricher": ("data_enricher/v2/src", ["proxy_pool.py", "metrics.py"]),
+    "authorizer": ("authorizer/src", ["proxy_pool.py", "metrics.py"]),
+}
+
+
+def vendor(names: list[str] | None = None) -> list[Path]:
+    """
+    ### Description:
+        - Copies the shared modules into the given lambdas.
+
+    ### Args:
+        - `names`: list[str] | None
+            Keys of `TARGETS`. Defaults to every lambda.
+
+    ### Returns:
+        - `list[Path]`
+            The copies that were written.
+    """
+
+    written = []
+    for name in names or TARGETS:
+        folder, modules = TARGETS[name]
+        for module in modules:
+            target = SHARED.parent / folder / module
+            shutil.copyfile(SHARED / module, target)
+            written.append(target)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("lambdas", nargs="*", help=", ".join(TARGETS))
+    args = parser.parse_args()
+    for unknown in set(args.lambdas) - set(TARGETS):
+        parser.error(f"unknown lambda {unknown}")
+
+    for path in vendor(args.lambdas):
+        print("Vendored", path)